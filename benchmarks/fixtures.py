@@ -0,0 +1,116 @@
+"""
+Market-data fixtures for the offline benchmarks.
+
+Fixtures are written as `{ticker}.parquet` files that
+`services.market_data.LocalFileProvider` can read, so the benchmarks never
+touch the network.
+
+- `record`: download real histories once with yfinance and save them.
+- `generate`: create synthetic OHLCV histories (geometric random walk) for any
+  number of tickers, for use when recording is not possible.
+
+Usage:
+    python benchmarks/fixtures.py record --out benchmarks/fixtures VT KO 7203.T
+    python benchmarks/fixtures.py generate --out benchmarks/fixtures --tickers 500
+"""
+
+import argparse
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+# us_stock_page のデフォルトのウォッチリストと、Japan ページ用の銘柄
+DEFAULT_TICKERS = ["VT", "VTI", "VEA", "VWO", "NET", "KO", "TSM", "7203.T"]
+
+
+def fixture_tickers(n_tickers: int) -> List[str]:
+    """ベンチマークで使うティッカー (デフォルトの銘柄 + 合成銘柄)"""
+    n_synthetic = max(0, n_tickers - len(DEFAULT_TICKERS))
+    synthetic = [f"SYN{i:03d}" for i in range(n_synthetic)]
+    return (DEFAULT_TICKERS + synthetic)[:n_tickers]
+
+
+def record_fixtures(tickers: List[str], out_dir: str, period: str = "max") -> None:
+    """yfinance から履歴を取得してフィクスチャとして保存する"""
+    import yfinance as yf
+
+    os.makedirs(out_dir, exist_ok=True)
+    for ticker in tickers:
+        hist = yf.Ticker(ticker).history(period=period)
+        if hist.empty:
+            print(f"No data for {ticker}, skipping...")
+            continue
+        hist.to_parquet(os.path.join(out_dir, f"{ticker}.parquet"))
+        print(f"Recorded: {ticker} ({len(hist)} rows)")
+
+
+def synthetic_history(
+    ticker: str, years: int, end: pd.Timestamp, rng: np.random.Generator
+) -> pd.DataFrame:
+    """幾何ランダムウォークで OHLCV の履歴を作る"""
+    tz = "Asia/Tokyo" if ticker.endswith(".T") else "America/New_York"
+    dates = pd.bdate_range(end=end, periods=years * 252, tz=tz, name="Date")
+
+    returns = rng.normal(0.0003, 0.015, len(dates))
+    close = 100 * np.exp(np.cumsum(returns))
+    spread = np.abs(rng.normal(0, 0.01, len(dates))) * close
+    open_ = close * (1 + rng.normal(0, 0.005, len(dates)))
+
+    return pd.DataFrame(
+        {
+            "Open": open_,
+            "High": np.maximum(open_, close) + spread,
+            "Low": np.minimum(open_, close) - spread,
+            "Close": close,
+            "Volume": rng.integers(1e5, 1e7, len(dates)).astype(np.int64),
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        },
+        index=dates,
+    )
+
+
+def generate_fixtures(
+    n_tickers: int, out_dir: str, years: int = 30, seed: int = 0
+) -> List[str]:
+    """合成した履歴をフィクスチャとして保存し、ティッカーのリストを返す"""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.today().normalize()
+    # ページのデフォルトの銘柄は常に用意する
+    tickers = fixture_tickers(max(n_tickers, len(DEFAULT_TICKERS)))
+
+    for ticker in tickers:
+        path = os.path.join(out_dir, f"{ticker}.parquet")
+        if os.path.exists(path):
+            continue
+        synthetic_history(ticker, years, end, rng).to_parquet(path)
+    return tickers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="record fixtures with yfinance")
+    record.add_argument("tickers", nargs="+")
+    record.add_argument("--out", required=True)
+    record.add_argument("--period", default="max")
+
+    generate = subparsers.add_parser("generate", help="generate synthetic fixtures")
+    generate.add_argument("--out", required=True)
+    generate.add_argument("--tickers", type=int, default=500)
+    generate.add_argument("--years", type=int, default=30)
+    generate.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_fixtures(args.tickers, args.out, args.period)
+    else:
+        generate_fixtures(args.tickers, args.out, args.years, args.seed)
+
+
+if __name__ == "__main__":
+    main()
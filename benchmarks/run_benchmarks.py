@@ -0,0 +1,430 @@
+"""
+Offline benchmark suite.
+
+Every run swaps yfinance for recorded (or synthetic) fixture data through
+`LocalFileProvider`, then measures at several sizes:
+
+- page rerun latency: each page in `views/` driven through Streamlit's AppTest
+- fetch-layer time: `get_price_histories` with a cold and a warm price store,
+  and building the shared price panel
+- figure-build time: Plotly figures with downsampled traces
+- volatility time: the batch volatility engine
+- correlation time: full-period and rolling matrices, cold and incremental
+- Prophet fit time
+- forecast engines: fit latency and holdout error (MAPE) of the fast engine and
+  Prophet side by side, fitting on all but the last bars of each series
+- peak memory (tracemalloc) for each measurement, in a second pass so that
+  tracing does not distort the timings
+
+Results are written as JSON so runs can be compared.
+
+Usage:
+    python benchmarks/run_benchmarks.py --tickers 1,10,100,500 --periods 1y,5y,max
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, List
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCHMARK_DIR, "..", "src")
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+from fixtures import fixture_tickers, generate_fixtures  # noqa: E402
+
+PAGES = {
+    "us_stock_page": "us_stock_page",
+    "japan_stock_page": "japan_stock_page",
+    "custom_stock_list_page": "custom_stock_list_page",
+    "data_viewer_page": "data_viewer_page",
+    "qrcode_page": "qrcode_page",
+    "contact_me_page": "contact_me_page",
+}
+
+PAGE_SCRIPT = """
+import sys
+sys.path.insert(0, {src_dir!r})
+import streamlit as st
+from streamlit_cookies_controller import CookieController
+
+# ベンチマークではクッキーの代わりにウォッチリストと期間を渡す
+CookieController.getAll = lambda self: {{
+    "ticker_list": {tickers!r},
+    "stock_price_period": {period!r},
+}}
+
+from config import initialize_setting
+
+initialize_setting()
+
+if {page!r} == "japan_stock_page" and st.session_state.get("stock_data") is None:
+    # 「株価情報を取得」ボタンを押した後の状態から再実行を計測する
+    from services.price_store import get_price_history
+
+    st.session_state["stock_data"] = get_price_history({japan_ticker!r}, {period!r})
+    st.session_state["ticker"] = {japan_ticker!r}
+    st.session_state["period"] = {period!r}
+
+# 米国株ページの初回のトースト (と 1.5 秒の待ち) は計測に含めない
+st.session_state.setdefault("toast_flag", True)
+
+from views.{page} import {page}
+
+{page}()
+"""
+
+
+# Prophet は1銘柄に数秒かかるため、予測エンジンの比較はこの銘柄数までにする
+PROPHET_MAX_TICKERS = 10
+# 予測エンジンの比較で、学習に使わずに誤差を測る直近の営業日数
+FORECAST_HOLDOUT = 60
+
+# tracemalloc は処理を遅くするため、時間とメモリは別々のパスで計測する
+TRACE_MEMORY = False
+
+
+@contextmanager
+def measure(results: list, name: str, **params):
+    """経過時間 (またはピークメモリ) を計測して results に追加する"""
+    entry = {"name": name, **params}
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield entry
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        entry["seconds"] = time.perf_counter() - start
+        if TRACE_MEMORY:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            entry["peak_mb"] = peak / 1024 / 1024
+        results.append(entry)
+        status = entry.get("error", "ok")
+        print(f"{name:<28} {params} {entry['seconds']:.3f}s {status}")
+
+
+def configure_environment(fixture_dir: str, work_dir: str) -> None:
+    """アプリのモジュールを読み込む前に、ローカルのデータを使うように設定する"""
+    os.environ["MARKET_DATA_PROVIDER"] = "local"
+    os.environ["MARKET_DATA_PATH"] = fixture_dir
+    os.environ["DATA_PATH"] = work_dir
+    os.environ["PRICE_STORE_PATH"] = os.path.join(work_dir, "prices")
+    os.environ["FORECAST_MODEL_PATH"] = os.path.join(work_dir, "models")
+    os.environ["DB_PATH"] = os.path.join(work_dir, "file_data.db")
+    os.environ["SQLITE_DB_PATH"] = os.path.join(work_dir, "file_data.sqlite3")
+    # ベンチマーク中は取得のレートリミットで待たない
+    os.environ["FETCH_RATE_PER_SEC"] = "1000000"
+    os.environ["FETCH_BURST"] = "1000000"
+
+
+def reset_price_layers() -> None:
+    """価格ストアとキャッシュを空にして、コールドスタートの状態に戻す"""
+    from services import price_store
+    from services.price_cache import get_price_cache
+    from services.price_panel import get_price_panel_cache
+
+    store_dir = os.environ["PRICE_STORE_PATH"]
+    shutil.rmtree(store_dir, ignore_errors=True)
+    price_store._price_store = None
+    get_price_cache().clear()
+    get_price_panel_cache().clear()
+
+
+def bench_fetch(results: list, tickers: List[str], period: str) -> None:
+    from services.price_cache import get_price_cache
+    from services.price_panel import get_price_panel, get_price_panel_cache
+    from services.price_store import get_price_histories
+
+    reset_price_layers()
+    params = {"tickers": len(tickers), "period": period}
+    with measure(results, "fetch_cold_store", **params):
+        get_price_histories(tickers, period)
+
+    get_price_cache().clear()
+    with measure(results, "fetch_warm_store", **params):
+        get_price_histories(tickers, period)
+
+    with measure(results, "fetch_cached", **params):
+        get_price_histories(tickers, period)
+
+    get_price_panel_cache().clear()
+    with measure(results, "price_panel_build", **params):
+        get_price_panel(tickers, period)
+
+
+def bench_volatility(results: list, tickers: List[str]) -> None:
+    from services.price_panel import get_price_panel
+    from services.volatility import compute_volatility_table
+
+    close = get_price_panel(tickers, "1y").frame()
+    with measure(results, "volatility_table", tickers=len(tickers), period="1y"):
+        compute_volatility_table(close)
+
+
+def bench_correlation(results: list, tickers: List[str], period: str) -> None:
+    from services.correlation import (
+        get_correlation_cache,
+        rolling_matrices,
+        watchlist_returns,
+    )
+
+    returns = watchlist_returns(tickers, period)
+    get_correlation_cache().clear()
+    params = {"tickers": len(tickers), "period": period}
+    with measure(results, "correlation_rolling_cold", **params):
+        previous = rolling_matrices(returns.iloc[:-1], 60)
+    with measure(results, "correlation_rolling_append", **params):
+        rolling_matrices(returns, 60, previous)
+
+
+def bench_figure(results: list, tickers: List[str], period: str) -> None:
+    import plotly.graph_objects as go
+
+    from services.downsample import downsample_series, point_budget
+    from services.price_panel import get_price_panel
+
+    close = get_price_panel(tickers, period).frame()
+    with measure(results, "figure_build", tickers=len(tickers), period=period):
+        fig = go.Figure()
+        for ticker in close.columns:
+            x, y = downsample_series(close.index, close[ticker], point_budget(950))
+            fig.add_trace(go.Scatter(x=x, y=y, name=ticker))
+        fig.to_json()
+
+
+def bench_prophet(results: list, ticker: str, period: str) -> None:
+    from services.forecast_jobs import _fit_and_predict, to_prophet_frame
+    from services.price_store import get_price_history
+
+    hist = get_price_history(ticker, period)
+    history = to_prophet_frame(hist.index, hist["Close"])
+    shutil.rmtree(os.environ["FORECAST_MODEL_PATH"], ignore_errors=True)
+
+    params = {"tickers": 1, "period": period, "rows": len(history)}
+    with measure(results, "prophet_fit_cold", **params):
+        _fit_and_predict(ticker, history, 60)
+    with measure(results, "prophet_fit_stored", **params):
+        _fit_and_predict(ticker, history, 60)
+
+
+def holdout_mape(forecasts: dict, actual: dict) -> float:
+    """予測と実績の日付が重なる部分の平均絶対パーセント誤差 (銘柄の平均)"""
+    errors = []
+    for ticker, truth in actual.items():
+        merged = truth.merge(forecasts[ticker], on="ds")
+        errors.append((abs(merged["yhat"] - merged["y"]) / merged["y"]).mean())
+    return float(sum(errors) / len(errors)) if errors else float("nan")
+
+
+def bench_forecast_engines(
+    results: list, tickers: List[str], period: str, engines: List[str]
+) -> None:
+    from services.forecast_engine import get_forecast_engine
+    from services.forecast_jobs import to_prophet_frame
+    from services.price_panel import get_price_panel
+
+    panel = get_price_panel(tickers, period)
+    train, actual = {}, {}
+    for ticker in panel.available_tickers:
+        history = to_prophet_frame(panel.dates, panel.series(ticker))
+        if len(history) > 2 * FORECAST_HOLDOUT:
+            train[ticker] = history.iloc[:-FORECAST_HOLDOUT]
+            actual[ticker] = history.iloc[-FORECAST_HOLDOUT:]
+    if not train:
+        return
+    periods = max(
+        (actual[t]["ds"].iloc[-1] - train[t]["ds"].iloc[-1]).days for t in train
+    )
+
+    params = {"tickers": len(train), "period": period, "holdout": FORECAST_HOLDOUT}
+    for name in engines:
+        engine = get_forecast_engine(name)
+        if name == "prophet":
+            # ワーカープロセスの起動と prophet の読み込みは計測に含めない
+            engine.forecast(train[next(iter(train))].iloc[:-1], periods=1)
+            shutil.rmtree(os.environ["FORECAST_MODEL_PATH"], ignore_errors=True)
+        with measure(results, f"forecast_{name}", **params) as entry:
+            forecasts = engine.forecast_many(train, periods, include_history=False)
+        if "error" not in entry:
+            entry["mape"] = holdout_mape(forecasts, actual)
+            print(f"{'':<28} mape={entry['mape']:.4f}")
+
+
+def select_unset_pills(at, period: str) -> None:
+    """
+    AppTest は未選択 (None) の st.pills を再実行で送り返せないため、値を入れておく。
+
+    計測する期間が選択肢にあればそれを、なければ空の選択にする。
+    """
+    for group in at.button_group:
+        if group.value is None:
+            group.set_value([period] if period in group.options else [])
+
+
+def bench_pages(
+    results: list, pages: List[str], tickers: List[str], period: str
+) -> None:
+    from streamlit.testing.v1 import AppTest
+
+    for page in pages:
+        script = PAGE_SCRIPT.format(
+            src_dir=os.path.abspath(SRC_DIR),
+            tickers=tickers,
+            period=period,
+            page=page,
+            japan_ticker="7203.T",
+        )
+        params = {"page": page, "tickers": len(tickers), "period": period}
+
+        reset_price_layers()
+        at = AppTest.from_string(script, default_timeout=600)
+        with measure(results, "page_first_run", **params) as entry:
+            at.run()
+            if at.exception:
+                entry["error"] = at.exception[0].message
+        select_unset_pills(at, period)
+        with measure(results, "page_rerun", **params) as entry:
+            at.run()
+            if at.exception:
+                entry["error"] = at.exception[0].message
+
+        # 新しいセッションで、プロセス内のキャッシュが温まった状態を計測する
+        at = AppTest.from_string(script, default_timeout=600)
+        with measure(results, "page_warm_session", **params) as entry:
+            at.run()
+            if at.exception:
+                entry["error"] = at.exception[0].message
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=BENCHMARK_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--tickers", default="1,10,100,500")
+    parser.add_argument("--periods", default="1y,5y,max")
+    parser.add_argument("--pages", default=",".join(PAGES))
+    parser.add_argument(
+        "--fixtures",
+        default=os.path.join(BENCHMARK_DIR, "fixtures"),
+        help="directory of {ticker}.parquet fixtures (generated if missing)",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join(
+            BENCHMARK_DIR,
+            "results",
+            f"{datetime.now():%Y%m%d_%H%M%S}_benchmark.json",
+        ),
+    )
+    parser.add_argument("--skip-prophet", action="store_true")
+    parser.add_argument("--skip-pages", action="store_true")
+    parser.add_argument(
+        "--skip-memory", action="store_true", help="skip the peak-memory pass"
+    )
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in parse_list(args.tickers)]
+    periods = parse_list(args.periods)
+    pages = parse_list(args.pages)
+
+    generate_fixtures(max(sizes), args.fixtures)
+    work_dir = tempfile.mkdtemp(prefix="stockprice-bench-")
+    configure_environment(os.path.abspath(args.fixtures), work_dir)
+
+    def build_benchmarks(results: list) -> List[Callable[[], None]]:
+        benchmarks: List[Callable[[], None]] = []
+        for period in periods:
+            for size in sizes:
+                tickers = fixture_tickers(size)
+                benchmarks.append(lambda t=tickers, p=period: bench_fetch(results, t, p))
+                benchmarks.append(lambda t=tickers, p=period: bench_figure(results, t, p))
+                benchmarks.append(
+                    lambda t=tickers, p=period: bench_correlation(results, t, p)
+                )
+                if not args.skip_pages:
+                    benchmarks.append(
+                        lambda t=tickers, p=period: bench_pages(results, pages, t, p)
+                    )
+            if not args.skip_prophet:
+                benchmarks.append(lambda p=period: bench_prophet(results, "VT", p))
+            for size in sizes:
+                engines = ["fast"]
+                if not args.skip_prophet and size <= PROPHET_MAX_TICKERS:
+                    engines.append("prophet")
+                benchmarks.append(
+                    lambda t=fixture_tickers(size), p=period, e=engines: (
+                        bench_forecast_engines(results, t, p, e)
+                    )
+                )
+        for size in sizes:
+            benchmarks.append(
+                lambda t=fixture_tickers(size): bench_volatility(results, t)
+            )
+        return benchmarks
+
+    global TRACE_MEMORY
+    results: list = []
+    memory_results: list = []
+    try:
+        for benchmark in build_benchmarks(results):
+            benchmark()
+        if not args.skip_memory:
+            TRACE_MEMORY = True
+            for benchmark in build_benchmarks(memory_results):
+                benchmark()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for entry, memory_entry in zip(results, memory_results):
+        entry["peak_mb"] = memory_entry.get("peak_mb")
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tickers": sizes,
+            "periods": periods,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    # 失敗した計測があれば、結果を書き出した上で失敗として終了する
+    errors = [entry for entry in results + memory_results if "error" in entry]
+    for entry in errors:
+        print(f"FAILED {entry['name']}: {entry['error']}", file=sys.stderr)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,9 @@ import streamlit as st
 
 from config import initialize_setting
 from components.sidebar import sidebar_component
-from router import router_mappings
+from router import router_mappings, start_page_warmup
+from services.metrics import export_metrics, span, start_metrics_server
+from services.startup import load_startup_snapshot, start_background_services
 
 
 st.set_page_config(
@@ -18,10 +20,20 @@ style_path = os.path.join(os.path.dirname(__file__), "style.css")
 st.markdown("<style>" + open(style_path).read() + "</style>", unsafe_allow_html=True)
 
 initialize_setting()
+start_metrics_server()
+# DATA_PATH にスナップショットがあれば、最初の描画の前に読み込む
+load_startup_snapshot()
 
 # SiderBar
 router = sidebar_component()
 
 # routing
 if router in router_mappings:
-    router_mappings[router]()
+    with span("page_render", page=router):
+        router_mappings[router]()
+    export_metrics()
+
+# 最初の描画が終わってから、他のページの依存を読み込んでおく
+start_page_warmup()
+# 人気のティッカーの先読みと、送信待ちの問い合わせ (再起動前の分を含む) の送信を始める
+start_background_services()
@@ -0,0 +1,169 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+from plotly.subplots import make_subplots
+from yfinance.exceptions import YFRateLimitError
+
+from services.backtest import (
+    REBALANCE_FREQUENCIES,
+    BacktestPanel,
+    load_panel,
+    random_weights,
+    run_backtest,
+    sweep,
+)
+from services.market_data import normalize_ticker
+from services.metrics import span
+
+PERIOD_OPTIONS = ["1y", "2y", "5y", "10y", "max"]
+METRIC_LABELS = {
+    "total_return": "トータルリターン",
+    "cagr": "年率リターン",
+    "volatility": "ボラティリティ",
+    "sharpe": "シャープレシオ",
+    "max_drawdown": "最大ドローダウン",
+    "turnover": "年間売買回転率",
+}
+
+
+def _equity_figure(equity: pd.Series, drawdown: pd.Series) -> go.Figure:
+    fig = make_subplots(
+        rows=2, cols=1, shared_xaxes=True, row_heights=[0.7, 0.3], vertical_spacing=0.05
+    )
+    fig.add_trace(go.Scatter(x=equity.index, y=equity, name="資産推移"), row=1, col=1)
+    fig.add_trace(
+        go.Scatter(x=drawdown.index, y=drawdown, name="ドローダウン", fill="tozeroy"),
+        row=2,
+        col=1,
+    )
+    fig.update_yaxes(tickformat=".0%", row=2, col=1)
+    fig.update_layout(height=600, hovermode="x unified")
+    return fig
+
+
+def _sweep_section(
+    panel: BacktestPanel, weights: np.ndarray, cost_bps: float, key: str
+) -> None:
+    n_sets = st.number_input(
+        "比較する配分の数",
+        min_value=100,
+        max_value=100_000,
+        value=2_000,
+        step=100,
+        key=f"{key}_n_sets",
+    )
+    if not st.button(
+        "ランダムな配分と比較", key=f"{key}_sweep", icon=":material/shuffle:"
+    ):
+        return
+
+    weight_sets = np.vstack(
+        [weights, random_weights(len(panel.tickers), int(n_sets), seed=0)]
+    )
+    with st.spinner("バックテスト中..."):
+        metrics = sweep(panel, weight_sets, cost_bps)
+
+    with span("figure_build", chart="backtest_sweep"):
+        fig = go.Figure(
+            go.Scattergl(
+                x=metrics["volatility"],
+                y=metrics["cagr"],
+                mode="markers",
+                marker={
+                    "color": metrics["sharpe"],
+                    "colorscale": "Viridis",
+                    "showscale": True,
+                    "size": 5,
+                },
+                name="ランダムな配分",
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=metrics["volatility"].iloc[:1],
+                y=metrics["cagr"].iloc[:1],
+                mode="markers",
+                marker={"color": "red", "size": 14, "symbol": "star"},
+                name="現在の配分",
+            )
+        )
+        fig.update_layout(
+            xaxis={"title": "ボラティリティ", "tickformat": ".0%"},
+            yaxis={"title": "年率リターン", "tickformat": ".0%"},
+        )
+    st.plotly_chart(fig)
+
+    table = pd.concat(
+        [
+            metrics.rename(columns=METRIC_LABELS),
+            pd.DataFrame(weight_sets, columns=panel.tickers),
+        ],
+        axis=1,
+    )
+    table.index = ["現在の配分", *range(1, len(table))]
+    st.dataframe(
+        table.sort_values(METRIC_LABELS["sharpe"], ascending=False).head(20),
+        use_container_width=True,
+    )
+
+
+def backtest_component(ticker_list: List[str], key: str = "backtest") -> None:
+    """
+    ティッカーリストのポートフォリオをバックテストし、資産推移と指標を表示する。
+
+    Args:
+        ticker_list (List[str]): ティッカーまたは証券コードのリスト。
+        key (str, optional): ウィジェットのキーの接頭辞。Defaults to "backtest".
+    """
+    col1, col2, col3 = st.columns(3)
+    period = col1.selectbox("期間", PERIOD_OPTIONS, index=2, key=f"{key}_period")
+    rebalance = col2.selectbox(
+        "リバランス", list(REBALANCE_FREQUENCIES), index=2, key=f"{key}_rebalance"
+    )
+    cost_bps = col3.number_input(
+        "取引コスト (bp)", min_value=0.0, value=0.0, step=1.0, key=f"{key}_cost"
+    )
+
+    try:
+        panel = load_panel(ticker_list, period, REBALANCE_FREQUENCIES[rebalance])
+    except YFRateLimitError:
+        st.error("Yahoo Finance のレートリミットに達しました。後ほど再試行してください。")
+        return
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    missing = {normalize_ticker(t) for t in ticker_list} - set(panel.tickers)
+    weights_df = st.data_editor(
+        pd.DataFrame(
+            {"配分": np.full(len(panel.tickers), 1.0 / len(panel.tickers))},
+            index=pd.Index(panel.tickers, name="ティッカー"),
+        ),
+        column_config={"配分": st.column_config.NumberColumn(min_value=0.0, step=0.01)},
+        key=f"{key}_weights_{'_'.join(panel.tickers)}",
+    )
+    if missing:
+        st.caption(f"価格を取得できなかった銘柄: {', '.join(sorted(missing))}")
+
+    weights = weights_df["配分"].fillna(0.0).to_numpy()
+    try:
+        result = run_backtest(panel, weights, cost_bps)
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    columns = st.columns(len(METRIC_LABELS))
+    for column, (name, label) in zip(columns, METRIC_LABELS.items()):
+        value = result.metrics[name]
+        text = f"{value:.2f}" if name == "sharpe" else f"{value:.1%}"
+        column.metric(label, "-" if np.isnan(value) else text)
+
+    with span("figure_build", chart="backtest"):
+        fig = _equity_figure(result.equity, result.drawdown)
+    st.plotly_chart(fig)
+
+    st.markdown("#### 配分の比較")
+    _sweep_section(panel, weights / weights.sum(), cost_bps, key)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+def date_range_component(dates: pd.Series | pd.Index, key: str) -> np.ndarray:
+    """
+    グラフの表示期間を選ぶスライダーを表示し、期間内の行を示すマスクを返す。
+
+    グラフは点数を間引いて描画するため、期間を狭めると
+    間引かれていた点が戻り、全データの解像度で表示される。
+
+    Args:
+        dates (pd.Series | pd.Index): x 軸の日付。
+        key (str): スライダーのキー。
+
+    Returns:
+        np.ndarray: 選択された期間に含まれる行は True の bool 配列。
+    """
+    parsed = pd.Series(dates)
+    if not pd.api.types.is_datetime64_any_dtype(parsed):
+        parsed = pd.to_datetime(parsed, format="mixed")
+    if parsed.dt.tz is not None:
+        parsed = parsed.dt.tz_localize(None)
+    local_dates = parsed.dt.date
+
+    first, last = local_dates.min(), local_dates.max()
+    if pd.isna(first) or first == last:
+        return np.ones(len(parsed), dtype=bool)
+
+    start, end = st.slider(
+        ":mag: 表示期間 (狭めると全データの解像度で表示します)",
+        min_value=first,
+        max_value=last,
+        value=(first, last),
+        format="YYYY/MM/DD",
+        key=key,
+    )
+    return ((local_dates >= start) & (local_dates <= end)).to_numpy()
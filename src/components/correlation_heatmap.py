@@ -0,0 +1,80 @@
+from typing import List
+
+import pandas as pd
+import plotly.graph_objects as go
+import streamlit as st
+
+from services.correlation import get_correlation, get_rolling_correlation
+from services.metrics import span
+
+WINDOW_OPTIONS = [20, 60, 120, 250]
+
+
+def _heatmap(matrix: pd.DataFrame, title: str, is_corr: bool) -> go.Figure:
+    fig = go.Figure(
+        go.Heatmap(
+            z=matrix.to_numpy(),
+            x=list(matrix.columns),
+            y=list(matrix.index),
+            colorscale="RdBu_r" if is_corr else "Viridis",
+            zmin=-1 if is_corr else None,
+            zmax=1 if is_corr else None,
+            hovertemplate="%{y} × %{x}: %{z:.3f}<extra></extra>",
+        )
+    )
+    size = min(900, 250 + 30 * len(matrix))
+    fig.update_layout(
+        title=title, width=size, height=size, yaxis={"autorange": "reversed"}
+    )
+    return fig
+
+
+def correlation_component(ticker_list: List[str], period: str, key: str) -> None:
+    """
+    対数リターンの相関 (または共分散) のヒートマップを、全期間とローリングウィンドウで表示する。
+
+    ローリングウィンドウの行列は (銘柄, 期間, ウィンドウ) ごとに全日分をまとめて計算して
+    キャッシュするため、日付のスライダーを動かしても再計算しない。
+
+    Args:
+        ticker_list (List[str]): ティッカーシンボルのリスト。
+        period (str): yfinance の period 表記。
+        key (str): ウィジェットのキーの接頭辞。
+    """
+    if len(ticker_list) < 2:
+        st.info("相関を表示するには2銘柄以上を選択してください。")
+        return
+
+    col1, col2 = st.columns(2)
+    kind = col1.radio("指標", ["相関", "共分散"], horizontal=True, key=f"{key}_kind")
+    window = col2.selectbox(
+        "ローリングウィンドウ (日)", WINDOW_OPTIONS, index=1, key=f"{key}_window"
+    )
+    is_corr = kind == "相関"
+
+    cov, corr = get_correlation(ticker_list, period)
+    rolling = get_rolling_correlation(ticker_list, period, window)
+
+    full_tab, rolling_tab = st.tabs(["全期間", f"ローリング ({window}日)"])
+    with full_tab:
+        with span("figure_build", chart="correlation"):
+            fig = _heatmap(corr if is_corr else cov, f"{kind} (全期間)", is_corr)
+        st.plotly_chart(fig)
+
+    with rolling_tab:
+        if not len(rolling.dates):
+            st.info(f"{window}日分のデータがありません。")
+            return
+        dates = list(rolling.dates)
+        end_date = st.select_slider(
+            ":mag: ウィンドウの最終日",
+            options=dates,
+            value=dates[-1],
+            format_func=lambda d: pd.Timestamp(d).strftime("%Y/%m/%d"),
+            key=f"{key}_end_date",
+        )
+        rolling_cov, rolling_corr = rolling.at(end_date)
+        title = f"{kind} ({window}日, {pd.Timestamp(end_date):%Y/%m/%d} まで)"
+        with span("figure_build", chart="rolling_correlation"):
+            fig = _heatmap(rolling_corr if is_corr else rolling_cov, title, is_corr)
+        st.plotly_chart(fig)
@@ -0,0 +1,86 @@
+import os
+from typing import Callable, Dict
+
+import streamlit as st
+
+from services.export import DOWNLOAD_MAX_BYTES, ExportFile
+
+
+def export_download_button(
+    export: ExportFile, key: str, label: str | None = None
+) -> None:
+    """
+    作成済みのエクスポートのダウンロードボタンを表示する。
+
+    ダウンロードボタンは再実行のたびにファイル全体を読み込むため、
+    `DOWNLOAD_MAX_BYTES` を超えるファイルはボタンを表示せずに案内だけを表示する。
+
+    Args:
+        export (ExportFile): 作成済みのエクスポート。
+        key (str): ウィジェットのキー。
+        label (str | None, optional): ボタンの表示名。Defaults to ファイル名。
+    """
+    size = export.size
+    if size > DOWNLOAD_MAX_BYTES:
+        st.warning(
+            f"ファイルが大きすぎるためダウンロードできません "
+            f"({size / 1024**2:.1f} MB / 上限 {DOWNLOAD_MAX_BYTES / 1024**2:.0f} MB)。"
+            "期間を短くするか、圧縮された形式を選んでください。"
+        )
+        return
+    with export.open() as f:
+        st.download_button(
+            label=label or f"📥 {export.file_name}",
+            data=f,
+            file_name=export.file_name,
+            mime=export.mime,
+            key=key,
+            on_click="ignore",
+            type="secondary",
+        )
+
+
+def export_component(
+    content_digest: str,
+    build: Callable[[str], ExportFile],
+    formats: Dict[str, str],
+    key: str,
+) -> None:
+    """
+    形式を選んでボタンを押したときだけエクスポートを作成し、ダウンロードボタンを表示する。
+
+    作成したエクスポートはセッションに残すため、データが変わらない限り
+    再実行のたびに作り直さない。
+
+    Args:
+        content_digest (str): エクスポートするデータのハッシュ。
+        build (Callable[[str], ExportFile]): 形式を受け取ってエクスポートを作成する関数。
+        formats (Dict[str, str]): 形式と表示名。
+        key (str): ウィジェットのキーの接頭辞。
+    """
+    col1, col2 = st.columns([2, 1])
+    fmt = col1.radio(
+        "形式",
+        list(formats),
+        format_func=formats.get,
+        horizontal=True,
+        key=f"{key}_format",
+    )
+    state_key = f"{key}_export"
+    prepared = st.session_state.get(state_key)
+    if prepared is not None and (
+        prepared[:2] != (content_digest, fmt) or not os.path.exists(prepared[2].path)
+    ):
+        prepared = None
+
+    with col2:
+        st.write("")
+        if prepared is None and st.button(
+            "ファイルを作成", key=f"{key}_prepare", icon=":material/build:"
+        ):
+            with st.spinner("ファイルを作成中..."):
+                prepared = (content_digest, fmt, build(fmt))
+            st.session_state[state_key] = prepared
+
+        if prepared is not None:
+            export_download_button(prepared[2], key=f"{key}_download")
@@ -0,0 +1,93 @@
+from typing import List
+
+import streamlit as st
+
+from services.forecast_batch import (
+    BatchForecast,
+    batch_progress,
+    batch_table,
+    submit_batch,
+)
+from services.forecast_engine import ENGINES
+
+COLUMN_CONFIG = {
+    "status": st.column_config.TextColumn("状態"),
+    "last_date": st.column_config.DateColumn("最終日"),
+    "last_close": st.column_config.NumberColumn("最終終値", format="%.2f"),
+    "forecast_close": st.column_config.NumberColumn("予測値", format="%.2f"),
+    "forecast_lower": st.column_config.NumberColumn("予測の下限", format="%.2f"),
+    "forecast_upper": st.column_config.NumberColumn("予測の上限", format="%.2f"),
+    "expected_return": st.column_config.NumberColumn(
+        "予測リターン", format="percent"
+    ),
+}
+
+
+def _render_batch(batch: BatchForecast) -> bool:
+    """進捗と予測テーブルを表示し、全ジョブが終わっていれば True を返す"""
+    finished, total = batch_progress(batch)
+    st.progress(
+        finished / total if total else 1.0,
+        text=f"予測済み {finished} / {total} 銘柄",
+    )
+    st.dataframe(
+        batch_table(batch), column_config=COLUMN_CONFIG, use_container_width=True
+    )
+    if batch.skipped:
+        st.caption(f"価格を取得できなかった銘柄: {', '.join(batch.skipped)}")
+    return finished == total
+
+
+@st.fragment(run_every=1)
+def _poll_batch(state_key: str) -> None:
+    """1秒ごとに進捗を更新し、全ジョブが終わったらページ全体を再実行する"""
+    batch = st.session_state.get(state_key)
+    if batch is None or _render_batch(batch):
+        st.rerun()
+
+
+def forecast_batch_component(
+    ticker_list: List[str], period: str, key: str, periods: int = 60
+) -> None:
+    """
+    ウォッチリストの全銘柄を予測し、進捗と結果を表示する。
+
+    Prophet はワーカープロセスで並列に学習し、高速エンジンは全銘柄をまとめて
+    その場で予測する。
+
+    結果は予測期間の最後の日の予測リターンの高い順に並べる。
+
+    Args:
+        ticker_list (List[str]): ティッカーまたは証券コードのリスト。
+        period (str): 学習に使う yfinance の period 表記。
+        key (str): ウィジェットのキーの接頭辞。
+        periods (int, optional): 予測する日数。Defaults to 60.
+    """
+    state_key = f"{key}_batch"
+    engine = st.radio(
+        "予測エンジン",
+        list(ENGINES),
+        format_func=lambda name: ENGINES[name].label,
+        horizontal=True,
+        key=f"{key}_engine",
+    )
+    if st.button(
+        f"{len(ticker_list)} 銘柄をまとめて予測",
+        key=f"{key}_submit",
+        icon=":material/batch_prediction:",
+        disabled=not ticker_list,
+    ):
+        with st.spinner("予測中..."):
+            st.session_state[state_key] = submit_batch(
+                ticker_list, period, periods, engine=engine
+            )
+
+    batch = st.session_state.get(state_key)
+    if batch is None:
+        return
+
+    finished, total = batch_progress(batch)
+    if finished == total:
+        _render_batch(batch)
+    else:
+        _poll_batch(state_key)
@@ -0,0 +1,72 @@
+import pandas as pd
+import plotly.graph_objects as go
+
+from services.downsample import downsample_series, point_budget
+
+
+def forecast_figure(history: pd.DataFrame, forecast: pd.DataFrame) -> go.Figure:
+    """
+    実績値と予測値 (予測期間は予測区間つき) のグラフを作成する。
+
+    Args:
+        history (pd.DataFrame): 学習に使った ds / y の DataFrame。
+        forecast (pd.DataFrame): ds / yhat / yhat_lower / yhat_upper の DataFrame。
+
+    Returns:
+        go.Figure: 予測のグラフ。
+    """
+    future = forecast[forecast["ds"] > history["ds"].iloc[-1]]
+    history_x, history_y = downsample_series(
+        history["ds"], history["y"], point_budget(1200)
+    )
+    fitted_x, fitted_y = downsample_series(
+        forecast["ds"], forecast["yhat"], point_budget(1200)
+    )
+
+    fig = go.Figure()
+    fig.add_trace(
+        go.Scatter(
+            x=history_x,
+            y=history_y,
+            mode="markers",
+            name="Actual",
+            marker={"color": "black", "size": 4},
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=future["ds"],
+            y=future["yhat_upper"],
+            mode="lines",
+            line={"width": 0},
+            hoverinfo="skip",
+            showlegend=False,
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=future["ds"],
+            y=future["yhat_lower"],
+            mode="lines",
+            line={"width": 0},
+            fill="tonexty",
+            fillcolor="rgba(0, 114, 178, 0.2)",
+            name="Interval",
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=fitted_x,
+            y=fitted_y,
+            mode="lines",
+            name="Predicted",
+            line={"color": "#0072B2", "width": 2},
+        )
+    )
+    fig.update_layout(
+        height=600,
+        xaxis={"title": "ds", "rangeslider": {"visible": True}},
+        yaxis={"title": "y"},
+        showlegend=True,
+    )
+    return fig
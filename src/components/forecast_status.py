@@ -0,0 +1,46 @@
+import streamlit as st
+
+from services.forecast_jobs import (
+    ForecastResult,
+    get_forecast_error,
+    get_forecast_result,
+    get_forecast_status,
+)
+
+
+@st.fragment(run_every=1)
+def _poll_forecast_job(job_id: str) -> None:
+    """ジョブが終わるまで1秒ごとに状態を確認し、終わったらページ全体を再実行する"""
+    status = get_forecast_status(job_id)
+    if status in ("done", "error", "unknown"):
+        st.rerun()
+
+    st.info("⏳ 予測モデルを学習中です。完了すると自動で表示されます。")
+
+
+def forecast_job_component(job_id: str) -> ForecastResult | None:
+    """
+    予測ジョブの状態を表示し、完了していれば予測結果を返す。
+
+    未完了の間はフラグメントでジョブをポーリングするため、
+    学習中もスクリプトの実行はブロックされない。
+
+    Args:
+        job_id (str): `submit_forecast` が返したジョブID。
+
+    Returns:
+        ForecastResult | None: 完了していれば予測結果、それ以外は None。
+    """
+    status = get_forecast_status(job_id)
+
+    if status == "done":
+        return get_forecast_result(job_id)
+    if status == "error":
+        st.error(f"予測中にエラーが発生しました: {get_forecast_error(job_id)}")
+        return None
+    if status == "unknown":
+        st.warning("予測ジョブが見つかりませんでした。もう一度実行してください。")
+        return None
+
+    _poll_forecast_job(job_id)
+    return None
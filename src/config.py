@@ -1,27 +1,50 @@
+import importlib
+import logging
 import os
 import streamlit as st
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, Callable
 from dotenv import load_dotenv
 
 
-# import your streamlit page
-from views import (
-    us_stock_page,
-    japan_stock_page,
-    login_page,
-    custom_stock_list_page,
-    data_viewer_page,
-    qrcode_page,
-    contact_me_page,
-)
+logger = logging.getLogger(__name__)
 
 
 @dataclass
 class RouterMapping:
+    """
+    サイドバーのタブとページの対応。
+
+    ページのモジュールは初めて表示するときに読み込むため、起動時に
+    prophet や plotly などの重い依存をまとめて読み込まない。
+
+    Args:
+        routing_name (str): サイドバーに表示する名前。
+        icon (str): Google Fonts のアイコン名。
+        module_path (str): ページのモジュール ("views.us_stock_page" など)。
+        page_name (str | None): ページ関数の名前。省略時はモジュール名と同じ。
+    """
+
     routing_name: str
     icon: str
-    streamlit_page: Callable[[], None]
+    module_path: str
+    page_name: str | None = None
+    _page: Callable[[], None] | None = field(default=None, init=False, repr=False)
+
+    def load(self) -> Callable[[], None]:
+        """ページのモジュールを読み込み、ページ関数を返す"""
+        if self._page is None:
+            module = importlib.import_module(self.module_path)
+            page_name = self.page_name or self.module_path.rsplit(".", 1)[-1]
+            self._page = getattr(module, page_name)
+        return self._page
+
+    @property
+    def streamlit_page(self) -> Callable[[], None]:
+        return self.load()
+
+    def __call__(self) -> None:
+        self.load()()
 
 
 # router mapping
@@ -32,29 +55,29 @@ class RouterMapping:
 """
 routers: Dict[str, RouterMapping] = {
     "router_1": RouterMapping(
-        routing_name="main", icon="home", streamlit_page=us_stock_page
+        routing_name="main", icon="home", module_path="views.us_stock_page"
     ),
     "router_2": RouterMapping(
         routing_name="JapanStock",
         icon="radio_button_checked",
-        streamlit_page=japan_stock_page,
+        module_path="views.japan_stock_page",
     ),
     "router_3": RouterMapping(
-        routing_name="Login", icon="login", streamlit_page=login_page
+        routing_name="Login", icon="login", module_path="views.login_page"
     ),
     "router_4": RouterMapping(
-        routing_name="Settings", icon="settings", streamlit_page=custom_stock_list_page
+        routing_name="Settings", icon="settings", module_path="views.custom_stock_list_page"
     ),
     "router_5": RouterMapping(
         routing_name="Data-Viewer",
         icon="query_stats",
-        streamlit_page=data_viewer_page,
+        module_path="views.data_viewer_page",
     ),
     "router_6": RouterMapping(
-        routing_name="QR", icon="qr_code", streamlit_page=qrcode_page
+        routing_name="QR", icon="qr_code", module_path="views.qrcode_page"
     ),
     "router_7": RouterMapping(
-        routing_name="Contact", icon="send", streamlit_page=contact_me_page
+        routing_name="Contact", icon="send", module_path="views.contact_me_page"
     ),
 }
 
@@ -85,9 +108,9 @@ def initialize_setting():
 
         if DATA_PATH and not os.path.exists(DATA_PATH):
             os.makedirs(DATA_PATH)
-            print(f"Directory created.")
+            logger.info("Directory created: %s", DATA_PATH)
         else:
-            print(f"Directory already exists or DIR_PATH is not set in .env file.")
+            logger.info("Directory already exists or DATA_PATH is not set in .env file.")
 
         # session_stateの設定
         if "db_path" not in st.session_state:
@@ -1,50 +1,302 @@
 import os
-from tinydb import TinyDB, Query
-from datetime import datetime
+import json
+import threading
 from contextlib import contextmanager
 from dotenv import load_dotenv
+from sqlalchemy import (
+    Column,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.engine import Engine
+
+from services.metrics import timed
 
 load_dotenv()
+# 旧 TinyDB (JSON) のファイル。SQLite への移行元として使う
 DB_PATH = os.getenv("DB_PATH")
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH") or (
+    f"{DB_PATH}.sqlite3" if DB_PATH else "file_data.sqlite3"
+)
+
+metadata = MetaData()
+
+file_data_table = Table(
+    "file_data",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("file_name", String, nullable=False),
+    Column("category", String, index=True),
+    Column("ticker_code", String, index=True),
+    Column("file_path", String),
+    Column("row_count", Integer),
+    Column("start_date", String),
+    Column("end_date", String),
+    sqlite_autoincrement=True,
+)
+
+# 問い合わせフォームの送信待ち (送信できるまでワーカーが再送する)
+contact_outbox_table = Table(
+    "contact_outbox",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String, nullable=False),
+    Column("email", String, nullable=False),
+    Column("body", Text, nullable=False),
+    Column("from_site", String, nullable=False),
+    # pending: 送信待ち / sent: 送信済み / failed: 再送をあきらめた
+    Column("status", String, nullable=False, index=True, default="pending"),
+    Column("attempts", Integer, nullable=False, default=0),
+    # 次に送信してよい時刻 (UNIX 時間)
+    Column("next_attempt_at", Float, nullable=False, index=True),
+    Column("last_error", String),
+    Column("created_at", Float, nullable=False),
+    Column("sent_at", Float),
+    sqlite_autoincrement=True,
+)
+
+_engine: Engine | None = None
+_engine_pid: int | None = None
+_engine_lock = threading.Lock()
+
+
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def get_engine() -> Engine:
+    """プロセスごとに1つのコネクションプールを持つ Engine を返す"""
+    global _engine, _engine_pid
+    with _engine_lock:
+        # fork 後の子プロセスでは親のコネクションを使い回さない
+        if _engine is None or _engine_pid != os.getpid():
+            engine = create_engine(f"sqlite:///{SQLITE_DB_PATH}")
+            event.listen(engine, "connect", _set_sqlite_pragma)
+            metadata.create_all(engine)
+            _add_missing_columns(engine)
+            _engine, _engine_pid = engine, os.getpid()
+            if DB_PATH and os.path.abspath(DB_PATH) != os.path.abspath(
+                SQLITE_DB_PATH
+            ):
+                migrate_from_tinydb(DB_PATH, engine)
+        return _engine
+
+
+def _add_missing_columns(engine: Engine) -> None:
+    """既存のテーブルに後から追加された列を足す"""
+    existing = {col["name"] for col in inspect(engine).get_columns("file_data")}
+    with engine.begin() as conn:
+        for column in file_data_table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(engine.dialect)
+                conn.execute(
+                    text(f"ALTER TABLE file_data ADD COLUMN {column.name} {column_type}")
+                )
 
 
 @contextmanager
 def open_db():
-    """TinyDBのコンテキストマネージャ"""
-    db = TinyDB(DB_PATH)
+    """トランザクション付きのコネクションのコンテキストマネージャ"""
+    with get_engine().begin() as conn:
+        yield conn
+
+
+def migrate_from_tinydb(json_path: str, engine: Engine | None = None) -> int:
+    """
+    旧 TinyDB の JSON ファイルからエントリを一度だけ移行する。
+
+    SQLite 側にデータがない場合のみ移行し、移行後の JSON ファイルは
+    `.migrated` を付けた名前に変更する。
+
+    Args:
+        json_path (str): TinyDB の JSON ファイルのパス。
+        engine (Engine | None, optional): 移行先の Engine。
+
+    Returns:
+        int: 移行したエントリの数。
+    """
+    if not os.path.exists(json_path):
+        return 0
+
     try:
-        yield db
-    finally:
-        db.close()
+        with open(json_path, encoding="utf-8") as f:
+            tables = json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return 0
+
+    entries = [
+        {
+            "id": doc.get("id", int(doc_id)),
+            "file_name": doc.get("file_name"),
+            "category": doc.get("category"),
+            "ticker_code": doc.get("ticker_code"),
+            "file_path": doc.get("file_path"),
+        }
+        for doc_id, doc in tables.get("_default", {}).items()
+    ]
 
+    engine = engine or get_engine()
+    with engine.begin() as conn:
+        count = conn.execute(select(func.count()).select_from(file_data_table))
+        if count.scalar_one() > 0:
+            return 0
+        if entries:
+            conn.execute(insert(file_data_table), entries)
 
-def create_file_data(entry: dict):
-    """新しいエントリを追加する"""
-    with open_db() as db:
-        db.insert(entry)
+    os.replace(json_path, f"{json_path}.migrated")
+    return len(entries)
 
 
-def get_all_file_data():
+def _to_dict(row) -> dict:
+    return dict(row._mapping)
+
+
+@timed("db_query")
+def create_file_data(entry: dict) -> int:
+    """新しいエントリを追加し、採番された ID を返す"""
+    values = {key: value for key, value in entry.items() if value is not None}
+    with open_db() as conn:
+        result = conn.execute(insert(file_data_table).values(**values))
+        return result.inserted_primary_key[0]
+
+
+@timed("db_query")
+def get_all_file_data() -> list[dict]:
     """すべてのエントリを取得する"""
-    with open_db() as db:
-        return db.all()
+    with open_db() as conn:
+        rows = conn.execute(select(file_data_table).order_by(file_data_table.c.id))
+        return [_to_dict(row) for row in rows]
 
 
-def get_file_data_by_id(record_id: int):
+@timed("db_query")
+def get_file_data_by_id(record_id: int) -> dict | None:
     """IDをキーにデータを取得する関数"""
-    query = Query()
-    with open_db() as db:
-        result = db.get(query.id == record_id)
-        return result
+    with open_db() as conn:
+        row = conn.execute(
+            select(file_data_table).where(file_data_table.c.id == int(record_id))
+        ).first()
+        return _to_dict(row) if row is not None else None
 
 
+@timed("db_query")
 def delete_file_data(record_id: int):
     """指定されたIDのエントリを削除する"""
-    query = Query()
-    with open_db() as db:
-        db.remove(query.id == record_id)
+    with open_db() as conn:
+        conn.execute(
+            delete(file_data_table).where(file_data_table.c.id == int(record_id))
+        )
 
 
+@timed("db_query")
 def clear_db():
-    with open_db() as db:
-        db.truncate()
+    with open_db() as conn:
+        conn.execute(delete(file_data_table))
+
+
+@timed("db_query")
+def enqueue_contact(entry: dict, now: float) -> int:
+    """問い合わせを送信待ちに追加し、採番された ID を返す"""
+    with open_db() as conn:
+        result = conn.execute(
+            insert(contact_outbox_table).values(
+                **entry,
+                status="pending",
+                attempts=0,
+                next_attempt_at=now,
+                created_at=now,
+            )
+        )
+        return result.inserted_primary_key[0]
+
+
+@timed("db_query")
+def claim_due_contacts(now: float, lease: float, limit: int = 20) -> list[dict]:
+    """
+    送信してよい問い合わせを取り出し、lease 秒の間は他から取り出されないようにする。
+
+    送信中にプロセスが終了しても、lease 秒後には再び取り出される。
+
+    Args:
+        now (float): 現在の UNIX 時間。
+        lease (float): 送信にかかる最大の秒数。
+        limit (int, optional): 取り出す最大の数。Defaults to 20.
+
+    Returns:
+        list[dict]: 取り出した問い合わせ。
+    """
+    table = contact_outbox_table
+    claimed = []
+    with open_db() as conn:
+        rows = conn.execute(
+            select(table)
+            .where(table.c.status == "pending", table.c.next_attempt_at <= now)
+            .order_by(table.c.next_attempt_at, table.c.id)
+            .limit(limit)
+        ).all()
+        for row in rows:
+            result = conn.execute(
+                update(table)
+                .where(table.c.id == row.id, table.c.next_attempt_at <= now)
+                .values(next_attempt_at=now + lease)
+            )
+            if result.rowcount == 1:
+                claimed.append(_to_dict(row))
+    return claimed
+
+
+@timed("db_query")
+def mark_contact_sent(record_id: int, now: float) -> None:
+    """問い合わせを送信済みにする"""
+    table = contact_outbox_table
+    with open_db() as conn:
+        conn.execute(
+            update(table)
+            .where(table.c.id == record_id)
+            .values(
+                status="sent",
+                attempts=table.c.attempts + 1,
+                last_error=None,
+                sent_at=now,
+            )
+        )
+
+
+@timed("db_query")
+def mark_contact_failed(
+    record_id: int, error: str, next_attempt_at: float | None
+) -> None:
+    """送信の失敗を記録する。next_attempt_at が None なら再送をあきらめる"""
+    table = contact_outbox_table
+    values = {"attempts": table.c.attempts + 1, "last_error": error[:500]}
+    if next_attempt_at is None:
+        values["status"] = "failed"
+    else:
+        values["next_attempt_at"] = next_attempt_at
+    with open_db() as conn:
+        conn.execute(update(table).where(table.c.id == record_id).values(**values))
+
+
+@timed("db_query")
+def next_contact_due() -> float | None:
+    """次に送信してよい問い合わせの時刻 (送信待ちがなければ None)"""
+    table = contact_outbox_table
+    with open_db() as conn:
+        return conn.execute(
+            select(func.min(table.c.next_attempt_at)).where(table.c.status == "pending")
+        ).scalar_one()
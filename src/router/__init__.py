@@ -1 +1 @@
-from .router import router_mappings
+from .router import router_mappings, start_page_warmup
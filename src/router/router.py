@@ -1,5 +1,47 @@
+import importlib
+import logging
+import os
+import threading
+
 from config import routers
 
+logger = logging.getLogger(__name__)
+
+# ページ以外に、最初の描画後に読み込んでおく重いモジュール
+WARMUP_MODULES = ["prophet", "prophet.plot", "prophet.serialize"]
+
 router_mappings = {}
 for _, router in routers.items():
-    router_mappings[router.routing_name] = router.streamlit_page
+    router_mappings[router.routing_name] = router
+
+_warmup_started = False
+_warmup_lock = threading.Lock()
+
+
+def _warm_up() -> None:
+    for router in routers.values():
+        try:
+            router.load()
+        except Exception:
+            logger.exception("Failed to warm up page: %s", router.module_path)
+    for module_name in WARMUP_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            logger.exception("Failed to warm up module: %s", module_name)
+
+
+def start_page_warmup() -> None:
+    """
+    まだ読み込んでいないページと重いモジュールを、バックグラウンドで1度だけ読み込む。
+
+    最初のページを描画した後に呼ぶ。ROUTER_WARMUP=false で無効にできる。
+    """
+    global _warmup_started
+    if os.getenv("ROUTER_WARMUP", "true").lower() not in ("1", "true", "yes"):
+        return
+    with _warmup_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+    threading.Thread(target=_warm_up, name="page-warmup", daemon=True).start()
@@ -1,10 +1,14 @@
-import time
+import math
+import pandas as pd
 import streamlit as st
-import yfinance as yf
 from streamlit_extras.metric_cards import style_metric_cards
 from dataclasses import dataclass
+from typing import List
 from yfinance.exceptions import YFRateLimitError
 
+from services.price_panel import get_price_panel
+from services.volatility import compute_volatility_table
+
 
 @dataclass
 class StockVolatility:
@@ -15,81 +19,71 @@ class StockVolatility:
     yearly_change_value: float | None
     yearly_change_percent: float | None
 
+    @classmethod
+    def from_row(cls, row: pd.Series | None) -> "StockVolatility":
+        """変化量テーブルの1行から作成する (NaN は None に変換)"""
+        if row is None:
+            return cls(None, None, None, None, None, None)
+        return cls(
+            **{
+                key: None if value is None or math.isnan(value) else float(value)
+                for key, value in row.items()
+            }
+        )
+
 
-class StockAnalyzer:
-    """株価データを取得し、変化量と変化率を計算し、Streamlitで表示するクラス"""
-
-    def __init__(self, ticker: str):
-        self.ticker = ticker
-        self.data = self._get_stock_volatility_with_cache(ticker)
-
-    @st.cache_data(show_spinner="📈 株価データを取得中...")
-    def _get_stock_volatility_with_cache(self, ticker: str) -> StockVolatility:
-        """キャッシュ付き株価データ取得＆変化率計算"""
-        retries = 3
-        delay = 1
-
-        for i in range(retries):
-            try:
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="1y")
-                break
-            except YFRateLimitError:
-                if i < retries - 1:
-                    time.sleep(delay)
-                    delay *= 2
-                else:
-                    st.error(
-                        "❌ Yahoo Finance のレートリミットに達しました。後ほど再試行してください。"
-                    )
-                    return StockVolatility(None, None, None, None, None, None)
-
-        if hist.empty:
-            return StockVolatility(None, None, None, None, None, None)
-
-        latest_price = hist["Close"].iloc[-1]
-        week_ago_price = hist["Close"].iloc[-6] if len(hist) > 6 else None
-        month_ago_price = hist["Close"].iloc[-21] if len(hist) > 21 else None
-        year_ago_price = hist["Close"].iloc[0] if len(hist) > 1 else None
-
-        def calc_change(new, old):
-            return round(new - old, 2) if old else None
-
-        def calc_change_percent(new, old):
-            return round(((new - old) / old) * 100, 2) if old else None
-
-        return StockVolatility(
-            weekly_change_value=calc_change(latest_price, week_ago_price),
-            weekly_change_percent=calc_change_percent(latest_price, week_ago_price),
-            monthly_change_value=calc_change(latest_price, month_ago_price),
-            monthly_change_percent=calc_change_percent(latest_price, month_ago_price),
-            yearly_change_value=calc_change(latest_price, year_ago_price),
-            yearly_change_percent=calc_change_percent(latest_price, year_ago_price),
+def get_volatility_table(ticker_list: List[str]) -> pd.DataFrame:
+    """共有の価格パネルから全ティッカーの変化率を一括で計算する (計算は数ミリ秒)"""
+    try:
+        # レートリミット時の再試行は取得スケジューラが行い、再試行しても
+        # 取得できなかった場合は YFRateLimitError が送出される
+        panel = get_price_panel(ticker_list, "1y")
+    except YFRateLimitError:
+        st.error(
+            "❌ Yahoo Finance のレートリミットに達しました。後ほど再試行してください。"
         )
+        return compute_volatility_table(pd.DataFrame())
+
+    return compute_volatility_table(panel.frame())
+
+
+def _currency(ticker: str) -> str:
+    return "JPY" if ticker.endswith(".T") else "USD"
 
-    def display(self, title: str):
-        """Streamlit で株価カードを表示"""
-        st.write(f"##### {title}: {self.ticker}")
 
-        if self.data.weekly_change_value is None:
+def _display_metrics(ticker: str, data: StockVolatility) -> None:
+    currency = _currency(ticker)
+    col1, col2, col3 = st.columns(3)
+
+    col1.metric(
+        "1週間の変化",
+        f"{data.weekly_change_value} {currency}",
+        delta=f"{data.weekly_change_percent}%",
+    )
+    col2.metric(
+        "1か月の変化",
+        f"{data.monthly_change_value} {currency}",
+        delta=f"{data.monthly_change_percent}%",
+    )
+    col3.metric(
+        "1年間の変化",
+        f"{data.yearly_change_value} {currency}",
+        delta=f"{data.yearly_change_percent}%",
+    )
+
+
+def display_volatility_dashboard(ticker_list: List[str]) -> None:
+    """複数ティッカーの株価カードを、1回の一括計算の結果から表示する"""
+    table = get_volatility_table(ticker_list)
+
+    for ticker in ticker_list:
+        st.write(f"##### {ticker}")
+        row = table.loc[ticker] if ticker in table.index else None
+        data = StockVolatility.from_row(row)
+        if data.weekly_change_value is None:
             st.error("❌ 無効なティッカー or データ取得に失敗")
         else:
-            col1, col2, col3 = st.columns(3)
-
-            col1.metric(
-                "1週間の変化",
-                f"{self.data.weekly_change_value} USD",
-                delta=f"{self.data.weekly_change_percent}%",
-            )
-            col2.metric(
-                "1か月の変化",
-                f"{self.data.monthly_change_value} USD",
-                delta=f"{self.data.monthly_change_percent}%",
-            )
-            col3.metric(
-                "1年間の変化",
-                f"{self.data.yearly_change_value} USD",
-                delta=f"{self.data.yearly_change_percent}%",
-            )
-
-            style_metric_cards(border_left_color="#6761A8", background_color="#F0F0F0")
+            _display_metrics(ticker, data)
+
+    style_metric_cards(border_left_color="#6761A8", background_color="#F0F0F0")
+
@@ -0,0 +1,338 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from services.market_data import normalize_ticker
+from services.metrics import span
+from services.price_panel import get_price_panel
+
+load_dotenv()
+
+TRADING_DAYS = 252
+# リバランスの頻度 (pandas の期間の表記)。None は購入後に保有し続ける
+REBALANCE_FREQUENCIES: Dict[str, str | None] = {
+    "なし": None,
+    "毎週": "W",
+    "毎月": "M",
+    "四半期": "Q",
+    "毎年": "Y",
+}
+# 一度に計算する (日数 × 配分の数) の要素数の上限
+CHUNK_ELEMENTS = 2_000_000
+# この数以上の配分を比較する場合はワーカープロセスに分けて計算する
+PARALLEL_MIN_SETS = int(os.getenv("BACKTEST_PARALLEL_MIN_SETS", "20000"))
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+
+METRIC_COLUMNS = [
+    "total_return",
+    "cagr",
+    "volatility",
+    "sharpe",
+    "max_drawdown",
+    "turnover",
+]
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+@dataclass
+class BacktestPanel:
+    """
+    バックテスト用に整えた価格のパネル。
+
+    Args:
+        dates (pd.DatetimeIndex): 価格の日付 (先頭は開始時点)。
+        tickers (List[str]): 列のティッカー。
+        growth (np.ndarray): (日数 - 1, 銘柄数) の、各リバランス期間の開始時点からの値上がり倍率。
+        segment (np.ndarray): 各日が属するリバランス期間の番号。
+        segment_ends (np.ndarray): 各リバランス期間の最後の日の位置。
+    """
+
+    dates: pd.DatetimeIndex
+    tickers: List[str]
+    growth: np.ndarray
+    segment: np.ndarray
+    segment_ends: np.ndarray
+
+
+def prepare_panel(close: pd.DataFrame, rebalance: str | None) -> BacktestPanel:
+    """
+    日付×ティッカーの終値から、リバランス期間ごとの値上がり倍率を作る。
+
+    リバランスは各期間の最後の営業日の終値で行う。上場前の期間は現金
+    (リターン 0) として扱う。
+
+    Args:
+        close (pd.DataFrame): index が日付、列がティッカーの終値。
+        rebalance (str | None): リバランスの頻度 ("M" など)。None はリバランスしない。
+
+    Returns:
+        BacktestPanel: バックテスト用のパネル。
+    """
+    close = close.sort_index().ffill().bfill().dropna(axis=1, how="all")
+    if len(close) < 2 or close.shape[1] == 0:
+        raise ValueError("バックテストには2日分以上の価格が必要です。")
+
+    dates = pd.DatetimeIndex(close.index)
+    prices = close.to_numpy(dtype=np.float64)
+    n_returns = len(dates) - 1
+
+    # i 行目のリターン (dates[i] → dates[i+1]) は dates[i+1] の期間に属する
+    if rebalance is None:
+        segment = np.zeros(n_returns, dtype=np.int64)
+    else:
+        periods = dates[1:].to_period(rebalance).asi8
+        segment = np.concatenate([[0], np.cumsum(periods[1:] != periods[:-1])])
+    starts = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1]])
+    segment_ends = np.r_[starts[1:] - 1, n_returns - 1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = prices[1:] / prices[starts[segment]]
+    growth = np.where(np.isfinite(growth), growth, 1.0)
+
+    return BacktestPanel(
+        dates=dates,
+        tickers=list(close.columns),
+        growth=growth,
+        segment=segment,
+        segment_ends=segment_ends,
+    )
+
+
+def normalize_weights(weights: np.ndarray) -> np.ndarray:
+    """配分を (配分の数, 銘柄数) にそろえ、合計が1になるように正規化する"""
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    if (weights < 0).any():
+        raise ValueError("配分に負の値は指定できません。")
+    totals = weights.sum(axis=1, keepdims=True)
+    if (totals <= 0).any():
+        raise ValueError("配分の合計は0より大きくしてください。")
+    return weights / totals
+
+
+def random_weights(n_assets: int, n_sets: int, seed: int | None = None) -> np.ndarray:
+    """ディリクレ分布から (n_sets, n_assets) のランダムな配分を作る"""
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.ones(n_assets), size=n_sets)
+
+
+def _equity_chunk(
+    growth: np.ndarray,
+    segment: np.ndarray,
+    segment_ends: np.ndarray,
+    weights: np.ndarray,
+    cost: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """(日数, 配分の数) の資産推移と、配分ごとの片道売買回転の合計を計算する"""
+    # 各リバランス期間の開始時点を1としたポートフォリオの価値
+    value = growth @ weights.T
+    end_values = value[segment_ends]
+
+    # リバランス直前の配分と目標の配分の差 (最後の期間の後はリバランスしない)
+    end_growth = growth[segment_ends[:-1]]
+    drift = end_growth[:, None, :] / end_values[:-1, :, None]
+    traded = (weights[None, :, :] * np.abs(1.0 - drift)).sum(axis=2)
+
+    multipliers = end_values.copy()
+    multipliers[:-1] *= 1.0 - cost * traded
+    starts = np.vstack(
+        [np.ones((1, weights.shape[0])), np.cumprod(multipliers, axis=0)]
+    )
+    equity = starts[segment] * value
+    return equity, traded.sum(axis=0) / 2
+
+
+def _metrics_chunk(
+    growth: np.ndarray,
+    segment: np.ndarray,
+    segment_ends: np.ndarray,
+    weights: np.ndarray,
+    cost: float,
+    years: float,
+    risk_free: float,
+) -> np.ndarray:
+    """配分ごとの指標を (配分の数, len(METRIC_COLUMNS)) で返す"""
+    equity, turnover = _equity_chunk(growth, segment, segment_ends, weights, cost)
+    equity = np.vstack([np.ones((1, weights.shape[0])), equity])
+
+    daily = equity[1:] / equity[:-1] - 1.0
+    mean = daily.mean(axis=0)
+    std = daily.std(axis=0, ddof=1) if len(daily) > 1 else np.full(len(mean), np.nan)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = (mean - risk_free / TRADING_DAYS) / std * np.sqrt(TRADING_DAYS)
+        cagr = equity[-1] ** (1.0 / years) - 1.0 if years > 0 else np.nan
+    return np.column_stack(
+        [
+            equity[-1] - 1.0,
+            np.broadcast_to(cagr, mean.shape),
+            std * np.sqrt(TRADING_DAYS),
+            np.where(std > 0, sharpe, np.nan),
+            drawdown.min(axis=0),
+            turnover / years if years > 0 else np.full(len(mean), np.nan),
+        ]
+    )
+
+
+def _chunk_size(panel: BacktestPanel) -> int:
+    n_rows, n_assets = panel.growth.shape
+    per_set = max(n_rows, len(panel.segment_ends) * n_assets)
+    return max(1, CHUNK_ELEMENTS // per_set)
+
+
+def _years(panel: BacktestPanel) -> float:
+    return (panel.dates[-1] - panel.dates[0]).days / 365.25
+
+
+@dataclass
+class BacktestResult:
+    """
+    1つの配分のバックテスト結果。
+
+    Args:
+        equity (pd.Series): 開始時点を1とした資産の推移。
+        drawdown (pd.Series): 直近の高値からの下落率。
+        metrics (Dict[str, float]): `METRIC_COLUMNS` の指標。
+    """
+
+    equity: pd.Series
+    drawdown: pd.Series
+    metrics: Dict[str, float]
+
+
+def run_backtest(
+    panel: BacktestPanel,
+    weights: np.ndarray,
+    cost_bps: float = 0.0,
+    risk_free: float = 0.0,
+) -> BacktestResult:
+    """
+    1つの配分でバックテストを行い、資産推移・ドローダウン・指標を返す。
+
+    Args:
+        panel (BacktestPanel): `prepare_panel` で作ったパネル。
+        weights (np.ndarray): 銘柄ごとの配分 (合計は1に正規化する)。
+        cost_bps (float, optional): 売買代金に対する取引コスト (bp)。Defaults to 0.
+        risk_free (float, optional): シャープレシオの無リスク金利 (年率)。Defaults to 0.
+
+    Returns:
+        BacktestResult: バックテスト結果。
+    """
+    weights = normalize_weights(weights)[:1]
+    cost = cost_bps / 10_000
+    with span("backtest", kind="single"):
+        equity, _ = _equity_chunk(
+            panel.growth, panel.segment, panel.segment_ends, weights, cost
+        )
+        metrics = _metrics_chunk(
+            panel.growth,
+            panel.segment,
+            panel.segment_ends,
+            weights,
+            cost,
+            _years(panel),
+            risk_free,
+        )[0]
+
+    equity = pd.Series(np.r_[1.0, equity[:, 0]], index=panel.dates, name="equity")
+    drawdown = (equity / equity.cummax() - 1.0).rename("drawdown")
+    return BacktestResult(
+        equity=equity,
+        drawdown=drawdown,
+        metrics=dict(zip(METRIC_COLUMNS, metrics.tolist())),
+    )
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Streamlit のサーバースレッドを fork しないように spawn で起動する
+            _executor = ProcessPoolExecutor(
+                max_workers=BACKTEST_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def sweep(
+    panel: BacktestPanel,
+    weight_sets: np.ndarray,
+    cost_bps: float = 0.0,
+    risk_free: float = 0.0,
+    parallel: bool | None = None,
+) -> pd.DataFrame:
+    """
+    多数の配分をまとめてバックテストし、配分ごとの指標を返す。
+
+    配分は (日数 × 配分の数) の行列積でまとめて計算する。配分の数が
+    `PARALLEL_MIN_SETS` 以上の場合は、ワーカープロセスに分けて計算する。
+
+    Args:
+        panel (BacktestPanel): `prepare_panel` で作ったパネル。
+        weight_sets (np.ndarray): (配分の数, 銘柄数) の配分。
+        cost_bps (float, optional): 売買代金に対する取引コスト (bp)。Defaults to 0.
+        risk_free (float, optional): シャープレシオの無リスク金利 (年率)。Defaults to 0.
+        parallel (bool | None, optional): ワーカープロセスを使うか。None は配分の数で決める。
+
+    Returns:
+        pd.DataFrame: 列が `METRIC_COLUMNS` の DataFrame (行は配分の順)。
+    """
+    weight_sets = normalize_weights(weight_sets)
+    n_sets = len(weight_sets)
+    if parallel is None:
+        parallel = n_sets >= PARALLEL_MIN_SETS and BACKTEST_WORKERS > 1
+
+    args = (
+        panel.growth,
+        panel.segment,
+        panel.segment_ends,
+    )
+    options = (cost_bps / 10_000, _years(panel), risk_free)
+    size = _chunk_size(panel)
+    if parallel:
+        # ワーカーごとに少なくとも1つの塊が行き渡るようにする
+        size = min(size, -(-n_sets // BACKTEST_WORKERS))
+    chunks = [weight_sets[i : i + size] for i in range(0, n_sets, size)]
+
+    with span("backtest", kind="parallel" if parallel else "sweep"):
+        if parallel:
+            executor = _get_executor()
+            futures = [
+                executor.submit(_metrics_chunk, *args, chunk, *options)
+                for chunk in chunks
+            ]
+            results = [future.result() for future in futures]
+        else:
+            results = [_metrics_chunk(*args, chunk, *options) for chunk in chunks]
+
+    values = np.vstack(results) if results else np.empty((0, len(METRIC_COLUMNS)))
+    return pd.DataFrame(values, columns=METRIC_COLUMNS)
+
+
+def load_panel(
+    ticker_list: List[str], period: str = "5y", rebalance: str | None = "M"
+) -> BacktestPanel:
+    """
+    ウォッチリストの価格を取得し、バックテスト用のパネルを作る。
+
+    Args:
+        ticker_list (List[str]): ティッカーまたは証券コードのリスト。
+        period (str, optional): yfinance の period 表記。Defaults to "5y".
+        rebalance (str | None, optional): リバランスの頻度。Defaults to "M".
+
+    Returns:
+        BacktestPanel: バックテスト用のパネル。
+    """
+    tickers = list(dict.fromkeys(normalize_ticker(t) for t in ticker_list))
+    panel = get_price_panel(tickers, period)
+    return prepare_panel(panel.frame()[panel.available_tickers], rebalance)
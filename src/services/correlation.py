@@ -0,0 +1,352 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from services.metrics import span
+from services.price_cache import PriceCache
+from services.price_panel import get_price_panel
+
+load_dotenv()
+
+# 相関・共分散の結果キャッシュのメモリ上限 (バイト)
+CORRELATION_CACHE_MAX_BYTES = int(
+    os.getenv("CORRELATION_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+# 1回のバッチ行列積で計算する要素数の目安 (日数 × ティッカー数²)
+CHUNK_ELEMENTS = 1_000_000
+# 全期間の相関を出すのに必要な、両方の銘柄にリターンがある日数
+MIN_PERIODS = 3
+# ローリング行列を保持する日数の上限 (超える場合は週末・月末の日だけを残す)
+MAX_SNAPSHOTS = int(os.getenv("CORRELATION_MAX_SNAPSHOTS", "500"))
+
+# ペアごとの集計値: (n, Σx, Σx², Σxy)。Σx[i, j] は i と j の両方に値がある日の x_i の和
+Sums = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def log_returns(close: pd.DataFrame) -> pd.DataFrame:
+    """
+    日付×ティッカーの終値から対数リターンを計算する。
+
+    取引所の休場日は前日の終値で埋める (リターン 0) ため、上場前以外は欠損しない。
+
+    Args:
+        close (pd.DataFrame): index が日付、列がティッカーの終値。
+
+    Returns:
+        pd.DataFrame: 2日目以降の対数リターン。
+    """
+    filled = close.sort_index().ffill().astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.log(filled).diff()
+    return returns.iloc[1:].replace([np.inf, -np.inf], np.nan)
+
+
+def _total_sums(x: np.ndarray, mask: np.ndarray) -> Sums:
+    """全行の集計値を行列積でまとめて計算する"""
+    return (mask.T @ mask, x.T @ mask, (x * x).T @ mask, x.T @ x)
+
+
+def _from_sums(sums: Sums, min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    集計値から共分散と相関を計算する (両方に値がある日だけを使うペアごとの計算)。
+
+    sums の各要素は (..., N, N) で、先頭の軸はそのまま残す。
+    """
+    n, sx, sxx, sxy = sums
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sx_t = np.swapaxes(sx, -1, -2)
+        cov = (sxy - sx * sx_t / n) / (n - 1)
+        var = np.maximum((sxx - sx * sx / n) / (n - 1), 0.0)
+        corr = cov / np.sqrt(var * np.swapaxes(var, -1, -2))
+    invalid = n < min_periods
+    cov = np.where(invalid, np.nan, cov)
+    corr = np.where(invalid, np.nan, np.clip(corr, -1.0, 1.0))
+    return cov, corr
+
+
+def correlation_matrices(returns: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    全期間の共分散行列と相関行列を、行列積1回ずつで計算する。
+
+    Args:
+        returns (pd.DataFrame): 日付×ティッカーのリターン。
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: (共分散, 相関)。
+    """
+    values = returns.to_numpy(np.float64)
+    mask = (~np.isnan(values)).astype(np.float64)
+    cov, corr = _from_sums(
+        _total_sums(np.nan_to_num(values), mask), min_periods=MIN_PERIODS
+    )
+    tickers = returns.columns
+    return (
+        pd.DataFrame(cov, index=tickers, columns=tickers),
+        pd.DataFrame(corr, index=tickers, columns=tickers),
+    )
+
+
+@dataclass
+class RollingMatrices:
+    """
+    ローリングウィンドウの共分散・相関行列 (ウィンドウの最終日ごと)。
+
+    続きの足が追加されたときに追加分だけを計算できるよう、最後のウィンドウの行を持つ。
+    """
+
+    tickers: List[str]
+    window: int
+    dates: pd.Index
+    cov: np.ndarray
+    corr: np.ndarray
+    tail: np.ndarray
+    # 残す日の間引き方 (`_snapshot_freq`)
+    freq: str | None = None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.cov.nbytes + self.corr.nbytes + self.tail.nbytes)
+
+    def at(self, date) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """date を最終日とするウィンドウの (共分散, 相関) を返す"""
+        i = self.dates.get_loc(date)
+        return (
+            pd.DataFrame(self.cov[i], index=self.tickers, columns=self.tickers),
+            pd.DataFrame(self.corr[i], index=self.tickers, columns=self.tickers),
+        )
+
+
+def _rolling_window_matrices(
+    rows: np.ndarray, window: int, tail: np.ndarray, targets: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    targets の各行を最終日とするウィンドウの (共分散, 相関) を計算する。
+
+    ウィンドウは tail (直前の window 行) と rows をつないだ配列のスライディング
+    ビューで作り、集計値はチャンクごとのバッチ行列積でまとめて計算する。
+    """
+    n_tickers = rows.shape[1]
+    combined = np.concatenate([tail, rows])
+    values = np.nan_to_num(combined)
+    mask = (~np.isnan(combined)).astype(np.float64)
+    # (行数, N, window) のビュー。行 i のウィンドウは combined[i + 1 : i + 1 + window]
+    x_all = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)[1:]
+    m_all = np.lib.stride_tricks.sliding_window_view(mask, window, axis=0)[1:]
+
+    cov = np.empty((len(targets), n_tickers, n_tickers), dtype=np.float32)
+    corr = np.empty_like(cov)
+    chunk = max(1, CHUNK_ELEMENTS // max(1, n_tickers * n_tickers))
+    for start in range(0, len(targets), chunk):
+        part = slice(start, start + chunk)
+        x, m = x_all[targets[part]], m_all[targets[part]]
+        sxy = x @ np.swapaxes(x, -1, -2)
+        if m.all():
+            # 欠損のないウィンドウは、ペアごとの集計をせずに和だけで計算できる
+            cov[part], corr[part] = _from_complete_sums(x.sum(axis=-1), sxy, window)
+            continue
+        m_t = np.swapaxes(m, -1, -2)
+        sums = (m @ m_t, x @ m_t, (x * x) @ m_t, sxy)
+        cov[part], corr[part] = _from_sums(sums, min_periods=window)
+    return cov, corr
+
+
+def _snapshot_freq(n_dates: int) -> str | None:
+    """
+    ローリング行列を残す日の間引き方。全体の日数が多い場合は週末 ("W")、
+    さらに多ければ月末 ("M") の日だけを残す (None はすべての日を残す)。
+    """
+    if n_dates <= MAX_SNAPSHOTS:
+        return None
+    return "W" if n_dates <= MAX_SNAPSHOTS * 5 else "M"
+
+
+def _snapshot_mask(dates: pd.Index, freq: str | None) -> np.ndarray:
+    """
+    ローリング行列を残す日。freq の期間の最後の日と最終日だけを残し、
+    保持する行列の数を MAX_SNAPSHOTS 程度に抑える。
+    """
+    if freq is None or not len(dates):
+        return np.ones(len(dates), dtype=bool)
+    periods = pd.DatetimeIndex(dates).to_period(freq)
+    return np.append(periods[1:] != periods[:-1], True)
+
+
+def _from_complete_sums(
+    sx: np.ndarray, sxy: np.ndarray, n: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """欠損のない n 日分の Σx (..., N) と Σxy (..., N, N) から共分散と相関を計算する"""
+    cov = sxy
+    cov -= sx[..., :, None] * sx[..., None, :] / n
+    cov /= n - 1
+    std = np.sqrt(np.maximum(np.diagonal(cov, axis1=-2, axis2=-1), 0.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = cov / (std[..., :, None] * std[..., None, :])
+    np.clip(corr, -1.0, 1.0, out=corr)
+    return cov, corr
+
+
+def rolling_matrices(
+    returns: pd.DataFrame, window: int, previous: RollingMatrices | None = None
+) -> RollingMatrices:
+    """
+    ローリングウィンドウの共分散・相関行列を計算する。
+
+    previous が渡された場合は、previous の最終日より後の行だけを追加で計算する
+    (`can_extend(previous, returns, window)` が True であること)。
+    日数が多い場合は `_snapshot_mask` で選んだ日の行列だけを残す。
+
+    Args:
+        returns (pd.DataFrame): 日付×ティッカーのリターン。
+        window (int): ウィンドウの日数。
+        previous (RollingMatrices | None, optional): 前回の計算結果。
+
+    Returns:
+        RollingMatrices: ウィンドウの日数がそろった日以降の行列。
+    """
+    values = returns.to_numpy(np.float64)
+    if previous is None:
+        new_rows = values
+        tail = np.full((window, values.shape[1]), np.nan)
+    else:
+        n_old = returns.index.get_loc(previous.dates[-1]) + 1
+        new_rows, tail = values[n_old:], previous.tail
+    new_dates = returns.index[len(returns) - len(new_rows) :]
+
+    # ウィンドウの日数がそろった日のうち、行列を残す日だけを計算する
+    first_full = returns.index[window - 1] if len(returns) >= window else None
+    old_dates = previous.dates if previous is not None else returns.index[:0]
+    dates = old_dates.append(new_dates)
+    # previous の dates は間引き済みなので、間引き方が同じ場合だけ延長できる
+    freq = _snapshot_freq(len(returns) - window + 1)
+    keep = _snapshot_mask(dates, freq)
+    keep &= np.asarray(dates >= first_full) if first_full is not None else False
+    targets = np.flatnonzero(keep[len(old_dates) :])
+
+    cov, corr = _rolling_window_matrices(new_rows, window, tail, targets)
+    if previous is not None:
+        old_keep = keep[: len(old_dates)]
+        cov = np.concatenate([previous.cov[old_keep], cov])
+        corr = np.concatenate([previous.corr[old_keep], corr])
+    return RollingMatrices(
+        tickers=list(returns.columns),
+        window=window,
+        dates=dates[keep],
+        cov=cov,
+        corr=corr,
+        tail=np.concatenate([tail, new_rows])[-window:],
+        freq=freq,
+    )
+
+
+def can_extend(previous: RollingMatrices, returns: pd.DataFrame, window: int) -> bool:
+    """
+    returns が previous の計算に使った行に新しい行を追加しただけで、
+    行列を残す日の間引き方も変わらないかどうか。
+    """
+    if previous.window != window or previous.tickers != list(returns.columns):
+        return False
+    if previous.freq != _snapshot_freq(len(returns) - window + 1):
+        return False
+    if not len(previous.dates) or previous.dates[-1] not in returns.index:
+        return False
+    n_old = returns.index.get_loc(previous.dates[-1]) + 1
+    if n_old < window:
+        return False
+    rows = returns.to_numpy(np.float64)[n_old - window : n_old]
+    return np.array_equal(rows, previous.tail, equal_nan=True)
+
+
+_cache = PriceCache(max_bytes=CORRELATION_CACHE_MAX_BYTES)
+_cache_lock = threading.Lock()
+
+
+def get_correlation_cache() -> PriceCache:
+    """相関・共分散の結果キャッシュを返す"""
+    return _cache
+
+
+def watchlist_returns(ticker_list: List[str], period: str) -> pd.DataFrame:
+    """共有の価格ストアから、ティッカーの並び順どおりの対数リターンを返す"""
+    panel = get_price_panel(ticker_list, period)
+    tickers = panel.available_tickers
+    return log_returns(panel.frame()[tickers]) if tickers else pd.DataFrame()
+
+
+def get_correlation(
+    ticker_list: List[str], period: str = "1y"
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    全期間の (共分散, 相関) 行列を返す。入力のリターンが変わらない限りキャッシュを使う。
+
+    Args:
+        ticker_list (List[str]): ティッカーシンボルのリスト。
+        period (str, optional): yfinance の period 表記。Defaults to "1y".
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: (共分散, 相関)。
+    """
+    returns = watchlist_returns(ticker_list, period)
+    key = (tuple(returns.columns), period, None)
+    fingerprint = _fingerprint(returns)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1], cached[2]
+
+    with span("correlation", kind="full", tickers=_size_label(returns)):
+        cov, corr = correlation_matrices(returns)
+    _cache.set(key, (fingerprint, cov, corr), float("inf"))
+    return cov, corr
+
+
+def get_rolling_correlation(
+    ticker_list: List[str], period: str = "1y", window: int = 60
+) -> RollingMatrices:
+    """
+    ローリングウィンドウの行列を返す。
+
+    前回の結果に新しい足が追加されただけなら、追加分だけを計算して延長する。
+
+    Args:
+        ticker_list (List[str]): ティッカーシンボルのリスト。
+        period (str, optional): yfinance の period 表記。Defaults to "1y".
+        window (int, optional): ウィンドウの日数。Defaults to 60.
+
+    Returns:
+        RollingMatrices: ウィンドウの最終日ごとの行列。
+    """
+    returns = watchlist_returns(ticker_list, period)
+    key = (tuple(returns.columns), period, window)
+    with _cache_lock:
+        previous = _cache.get(key)
+        if previous is not None and not can_extend(previous, returns, window):
+            previous = None
+        if (
+            previous is not None
+            and previous.dates[-1] == returns.index[-1]
+            and previous.dates[0] >= returns.index[window - 1]
+        ):
+            return previous
+
+        kind = "rolling" if previous is None else "rolling_incremental"
+        with span("correlation", kind=kind, tickers=_size_label(returns)):
+            result = rolling_matrices(returns, window, previous)
+        _cache.set(key, result, float("inf"))
+        return result
+
+
+def _fingerprint(returns: pd.DataFrame) -> tuple:
+    if returns.empty:
+        return (0,)
+    last = returns.iloc[-1].to_numpy()
+    return (len(returns), returns.index[0], returns.index[-1], last.tobytes())
+
+
+def _size_label(returns: pd.DataFrame) -> str:
+    """メトリクスのラベル用に銘柄数をまとめる"""
+    n = returns.shape[1]
+    return "<=10" if n <= 10 else "<=100" if n <= 100 else ">100"
@@ -0,0 +1,163 @@
+import os
+import re
+from dataclasses import dataclass
+from datetime import date
+from itertools import chain
+from typing import IO, Dict
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from services.dataset_store import (
+    DATE_COLUMN,
+    VALUE_COLUMNS,
+    dataset_path,
+    normalize_dataset,
+)
+
+# {ファイルダウンロード日}_{カテゴリー}_{証券コード}.csv
+UPLOAD_FILE_NAME_PATTERN = re.compile(
+    r"^(?P<date>\d{4}-?\d{2}-?\d{2})_(?P<category>[^_]+)_(?P<ticker_code>[^_]+)\.csv$"
+)
+REQUIRED_COLUMNS = [DATE_COLUMN, "Close"]
+CHUNK_SIZE = 100_000
+
+
+class UploadValidationError(ValueError):
+    """アップロードされたファイルが取り込みの条件を満たさない場合の例外"""
+
+
+@dataclass
+class IngestResult:
+    file_path: str
+    category: str
+    ticker_code: str
+    row_count: int
+    start_date: date | None
+    end_date: date | None
+
+
+def parse_upload_file_name(file_name: str) -> dict:
+    """
+    ファイル名が `{date}_{category}_{ticker}.csv` の規則に沿っているか確認し、各部分を返す。
+
+    Raises:
+        UploadValidationError: 命名規則に沿っていない場合。
+    """
+    match = UPLOAD_FILE_NAME_PATTERN.match(os.path.basename(file_name))
+    if match is None:
+        raise UploadValidationError(
+            f"ファイル名が命名規則 ({{日付}}_{{カテゴリー}}_{{証券コード}}.csv) に沿っていません: {file_name}"
+        )
+    return match.groupdict()
+
+
+def _validate_schema(chunk: pd.DataFrame) -> None:
+    missing = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise UploadValidationError(f"必要な列がありません: {', '.join(missing)}")
+
+
+def _extra_column_dtypes(chunk: pd.DataFrame) -> Dict[str, str]:
+    """
+    Date・価格列以外の列の型を、最初の chunk から決める。
+
+    chunk ごとに型を推定すると、最初の chunk では空だった列や整数だった列が
+    後の chunk で別の型になり、Parquet のスキーマと合わなくなる。そのため、
+    最初の chunk で値のある数値の列は float64、それ以外は文字列に固定する。
+    """
+    dtypes = {}
+    for col in chunk.columns:
+        if col == DATE_COLUMN or col in VALUE_COLUMNS:
+            continue
+        values = chunk[col]
+        numeric = pd.api.types.is_numeric_dtype(values) and values.notna().any()
+        dtypes[col] = "float64" if numeric else "string"
+    return dtypes
+
+
+def _coerce_extra_columns(chunk: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """Date・価格列以外の列を、最初の chunk で決めた型に揃える"""
+    for col, dtype in dtypes.items():
+        if dtype == "float64":
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype("float64")
+        else:
+            chunk[col] = chunk[col].astype("string")
+    return chunk
+
+
+def ingest_csv(
+    uploaded_file: IO, data_dir: str, file_name: str, chunksize: int = CHUNK_SIZE
+) -> IngestResult:
+    """
+    アップロードされた CSV を chunk ごとに読み込み、Parquet に書き出しながら取り込む。
+
+    ファイル名は中身を読む前に確認し、列の構成と型は最初の chunk で決める。
+    ファイル全体をメモリに載せないため、大きなファイルでもメモリ使用量は chunk 分で済む。
+
+    Args:
+        uploaded_file (IO): アップロードされた CSV ファイル。
+        data_dir (str): 保存先のディレクトリ。
+        file_name (str): アップロードされたファイル名。
+        chunksize (int, optional): 1回に読み込む行数。
+
+    Returns:
+        IngestResult: 保存先のパスと、行数・日付の範囲などの情報。
+
+    Raises:
+        UploadValidationError: ファイル名または列の構成が条件を満たさない場合。
+    """
+    parts = parse_upload_file_name(file_name)
+
+    reader = pd.read_csv(uploaded_file, encoding="utf-8", chunksize=chunksize)
+    try:
+        first_chunk = next(reader)
+    except StopIteration:
+        raise UploadValidationError("ファイルにデータがありません。")
+    _validate_schema(first_chunk)
+
+    extra_dtypes = _extra_column_dtypes(first_chunk)
+
+    path = dataset_path(data_dir, file_name)
+    tmp_path = f"{path}.tmp"
+    writer: pq.ParquetWriter | None = None
+    row_count = 0
+    start_date = end_date = None
+
+    try:
+        for chunk in chain([first_chunk], reader):
+            chunk = _coerce_extra_columns(normalize_dataset(chunk), extra_dtypes)
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(
+                    chunk, schema=writer.schema, preserve_index=False
+                )
+            writer.write_table(table)
+
+            row_count += len(chunk)
+            dates = chunk[DATE_COLUMN].dropna()
+            if not dates.empty:
+                chunk_start, chunk_end = dates.min().date(), dates.max().date()
+                start_date = min(start_date or chunk_start, chunk_start)
+                end_date = max(end_date or chunk_end, chunk_end)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    writer.close()
+    os.replace(tmp_path, path)
+
+    return IngestResult(
+        file_path=path,
+        category=parts["category"],
+        ticker_code=parts["ticker_code"],
+        row_count=row_count,
+        start_date=start_date,
+        end_date=end_date,
+    )
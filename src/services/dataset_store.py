@@ -0,0 +1,69 @@
+import io
+import os
+from typing import List
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+# アップロードされるデータの型付きの列
+DATE_COLUMN = "Date"
+VALUE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def normalize_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """Date を日付型、価格列を数値型に揃える"""
+    df = df.copy()
+    if DATE_COLUMN in df.columns:
+        # 日足のデータなので、UTC オフセットを落として現地日付だけを残す
+        local_dates = (
+            df[DATE_COLUMN]
+            .astype(str)
+            .str.replace(r"(Z|[+-]\d{2}:?\d{2})$", "", regex=True)
+        )
+        df[DATE_COLUMN] = pd.to_datetime(local_dates, format="mixed").dt.normalize()
+    for col in VALUE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+def dataset_path(data_dir: str, file_name: str) -> str:
+    """アップロードされた CSV のファイル名から保存先 (Parquet) のパスを作る"""
+    stem, _ = os.path.splitext(os.path.basename(file_name))
+    return os.path.join(data_dir, f"{stem}.parquet")
+
+
+def load_dataset(path: str, columns: List[str] | None = None) -> pd.DataFrame:
+    """
+    保存済みのデータセットから必要な列だけを読み込む。
+
+    Parquet はメモリマップで読み込む。移行前に保存された CSV もそのまま読める。
+
+    Args:
+        path (str): データセットのパス。
+        columns (List[str] | None, optional): 読み込む列。None の場合はすべての列。
+
+    Returns:
+        pd.DataFrame: 読み込んだデータ。
+    """
+    if path.endswith(".parquet"):
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+    return pd.read_csv(path, usecols=columns)
+
+
+def dataset_to_csv_bytes(path: str) -> bytes:
+    """ダウンロード用に保存済みのデータセットを CSV に変換する"""
+    df = load_dataset(path)
+    if DATE_COLUMN in df.columns and pd.api.types.is_datetime64_any_dtype(
+        df[DATE_COLUMN]
+    ):
+        df[DATE_COLUMN] = df[DATE_COLUMN].dt.date
+    csv_buffer = io.StringIO()
+    df.to_csv(csv_buffer, index=False)
+    return csv_buffer.getvalue().encode("utf-8")
+
+
+def csv_file_name(file_name: str) -> str:
+    """ダウンロード用の CSV ファイル名"""
+    stem, _ = os.path.splitext(os.path.basename(file_name))
+    return f"{stem}.csv"
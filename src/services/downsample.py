@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# グラフの横幅 1px あたりに描画する点の数
+POINTS_PER_PIXEL = float(os.getenv("CHART_POINTS_PER_PIXEL", "1.5"))
+
+
+def point_budget(width: int) -> int:
+    """グラフの横幅から1系列あたりの最大点数を決める"""
+    return max(3, int(width * POINTS_PER_PIXEL))
+
+
+def _as_numeric(x: np.ndarray) -> np.ndarray:
+    """x 軸の値を面積計算用の数値に変換する (日付以外の文字列は位置を使う)"""
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    if np.issubdtype(x.dtype, np.number):
+        return x.astype(np.float64)
+    return np.arange(len(x), dtype=np.float64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets で残す点のインデックスを返す。
+
+    各バケットの中の点は NumPy でまとめて計算し、Python のループは
+    バケット数 (= 出力点数) 回だけ回す。
+
+    Args:
+        x (np.ndarray): x 軸の値 (昇順)。
+        y (np.ndarray): y 軸の値 (欠損値を含まないこと)。
+        n_out (int): 出力する点の数。
+
+    Returns:
+        np.ndarray: 残す点のインデックス (昇順)。
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_numeric(np.asarray(x))
+    y = np.asarray(y, dtype=np.float64)
+
+    # 最初と最後の点を除いた点を n_out - 2 個のバケットに分ける
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # 各バケットの平均 (次のバケットの代表点として使う)
+    counts = np.diff(edges)
+    x_means = np.add.reduceat(x[: n - 1], edges[:-1]) / counts
+    y_means = np.add.reduceat(y[: n - 1], edges[:-1]) / counts
+    x_means = np.append(x_means, x[-1])
+    y_means = np.append(y_means, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 前回選んだ点・このバケットの点・次のバケットの平均で作る三角形の面積
+        area = np.abs(
+            (x[a] - x_means[i + 1]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (y_means[i + 1] - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def _downsample_arrays(
+    x_values: np.ndarray, y_values: np.ndarray, max_points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    # 欠損値は描画されないので先に落としておく
+    valid = ~np.isnan(y_values)
+    x_values, y_values = x_values[valid], y_values[valid]
+
+    indices = lttb_indices(x_values, y_values, max_points)
+    return x_values[indices], y_values[indices]
+
+
+def downsample_series(
+    x: pd.Series | pd.Index, y: pd.Series, max_points: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    グラフ描画用に系列の形を保ったまま点数を減らす。結果は系列ごとにキャッシュする。
+
+    Args:
+        x (pd.Series | pd.Index): x 軸の値。
+        y (pd.Series): y 軸の値。
+        max_points (int): 残す点の最大数。
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: 間引いた x と y。
+    """
+    x = pd.Series(x)
+    if isinstance(x.dtype, pd.DatetimeTZDtype):
+        # キャッシュのキーにできるよう、現地時刻の datetime64 に揃える
+        x = x.dt.tz_localize(None)
+    x_values = x.to_numpy()
+    y_values = pd.Series(y).to_numpy(dtype=np.float64)
+    return _downsample_arrays(x_values, y_values, max_points)
@@ -0,0 +1,292 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, Iterable
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import toml
+from dotenv import load_dotenv
+
+from services.metrics import span
+from services.price_panel import PricePanel
+
+load_dotenv()
+
+# 形式ごとの (拡張子, MIME タイプ)
+FRAME_FORMATS: Dict[str, tuple[str, str]] = {
+    "csv": ("csv", "text/csv"),
+    "csv.gz": ("csv.gz", "application/gzip"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+MAPPING_FORMATS: Dict[str, tuple[str, str]] = {
+    "toml": ("toml", "application/toml"),
+    "json": ("json", "application/json"),
+}
+# 一度に書き出す行数 (全体を文字列にしてから書き出さない)
+CHUNK_ROWS = 50_000
+# 作成済みのエクスポートを残しておく合計サイズ (バイト)
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(512 * 1024**2)))
+# ダウンロードボタンで渡すエクスポートのサイズの上限 (バイト)。ダウンロードボタンは
+# 再実行のたびにファイル全体を読み込んでメモリに載せるため、大きなものは渡さない
+DOWNLOAD_MAX_BYTES = int(os.getenv("EXPORT_DOWNLOAD_MAX_BYTES", str(64 * 1024**2)))
+
+_lock = threading.Lock()
+
+
+def _default_export_dir() -> str:
+    """エクスポートの保存先ディレクトリを返す"""
+    export_dir = os.getenv("EXPORT_CACHE_PATH")
+    if export_dir:
+        return export_dir
+    data_path = os.getenv("DATA_PATH") or "data"
+    return os.path.join(os.path.dirname(__file__), "..", "..", data_path, "exports")
+
+
+@dataclass(frozen=True)
+class ExportFile:
+    """
+    作成済みのエクスポート。
+
+    Args:
+        path (str): 保存先のパス。
+        file_name (str): ダウンロード時のファイル名。
+        mime (str): MIME タイプ。
+        digest (str): 内容と形式から決まるハッシュ。
+    """
+
+    path: str
+    file_name: str
+    mime: str
+    digest: str
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    def open(self) -> BinaryIO:
+        return open(self.path, "rb")
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """DataFrame の内容 (index・列名を含む) から決まるハッシュ"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
+    digest.update(json.dumps([str(t) for t in df.dtypes]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()[:24]
+
+
+def mapping_digest(data: dict) -> str:
+    """dict の内容から決まるハッシュ"""
+    payload = json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:24]
+
+
+def _prune(export_dir: str, keep: str) -> None:
+    """合計サイズが上限を超えたら、古いエクスポートから削除する"""
+    entries = []
+    for name in os.listdir(export_dir):
+        path = os.path.join(export_dir, name)
+        if name.endswith(".tmp") or not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        entries.append((stat.st_atime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= EXPORT_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _build(
+    digest: str,
+    extension: str,
+    mime: str,
+    file_name: str,
+    write: Callable[[BinaryIO], None],
+    kind: str,
+) -> ExportFile:
+    export_dir = _default_export_dir()
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"{digest}.{extension}")
+    export = ExportFile(path=path, file_name=file_name, mime=mime, digest=digest)
+
+    with _lock:
+        if os.path.exists(path):
+            # 最近使ったものとして残す
+            os.utime(path)
+            return export
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with span("export", format=kind):
+            try:
+                with open(tmp_path, "wb") as f:
+                    write(f)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        _prune(export_dir, keep=path)
+    return export
+
+
+def _write_csv(df: pd.DataFrame, f: BinaryIO, compress: bool) -> None:
+    stream = gzip.GzipFile(fileobj=f, mode="wb", mtime=0) if compress else f
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        for start in range(0, max(len(df), 1), CHUNK_ROWS):
+            df.iloc[start : start + CHUNK_ROWS].to_csv(
+                text, index=False, header=start == 0
+            )
+        text.flush()
+    finally:
+        text.detach()
+        if compress:
+            stream.close()
+
+
+def _write_parquet(df: pd.DataFrame, f: BinaryIO) -> None:
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(f, schema, compression="zstd") as writer:
+        for start in range(0, max(len(df), 1), CHUNK_ROWS):
+            chunk = df.iloc[start : start + CHUNK_ROWS]
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+
+
+def export_frame(
+    df: pd.DataFrame,
+    fmt: str,
+    stem: str,
+    digest: str | None = None,
+    prepare: Callable[[pd.DataFrame], pd.DataFrame] | None = None,
+) -> ExportFile:
+    """
+    DataFrame を指定の形式で書き出す。同じ内容と形式のエクスポートは作り直さない。
+
+    CSV・Parquet とも行を分けて少しずつファイルに書き出すため、大きな
+    データでも全体をメモリ上の文字列にしない。
+
+    Args:
+        df (pd.DataFrame): 書き出すデータ (index は書き出さない)。
+        fmt (str): `FRAME_FORMATS` の形式。
+        stem (str): ダウンロード時のファイル名 (拡張子を除く)。
+        digest (str | None, optional): 計算済みの `frame_digest(df)`。
+        prepare (Callable | None, optional): 書き出す直前に df に適用する変換。
+            作成済みのエクスポートがある場合は呼ばない。
+
+    Returns:
+        ExportFile: 作成済みのエクスポート。
+    """
+    if fmt not in FRAME_FORMATS:
+        raise ValueError(f"Invalid format: {fmt}")
+    extension, mime = FRAME_FORMATS[fmt]
+    digest = hashlib.sha256(
+        f"{digest or frame_digest(df)}:{fmt}".encode("utf-8")
+    ).hexdigest()[:24]
+
+    def write(f: BinaryIO) -> None:
+        frame = prepare(df) if prepare is not None else df
+        if fmt == "parquet":
+            _write_parquet(frame, f)
+        else:
+            _write_csv(frame, f, compress=fmt == "csv.gz")
+
+    return _build(digest, extension, mime, f"{stem}.{extension}", write, fmt)
+
+
+def export_panel(panel: PricePanel, fmt: str, stem: str) -> ExportFile:
+    """
+    価格パネルを Date・Ticker・OHLCV の縦長の形式で書き出す。
+
+    Args:
+        panel (PricePanel): 書き出す価格パネル。
+        fmt (str): `FRAME_FORMATS` の形式。
+        stem (str): ダウンロード時のファイル名 (拡張子を除く)。
+
+    Returns:
+        ExportFile: 作成済みのエクスポート。
+    """
+    return export_frame(
+        panel.frame(), fmt, stem, digest=panel.digest(), prepare=lambda _: panel.long()
+    )
+
+
+def export_mapping(data: dict, fmt: str, stem: str) -> ExportFile:
+    """
+    dict を TOML または JSON で書き出す。同じ内容と形式のエクスポートは作り直さない。
+
+    Args:
+        data (dict): 書き出すデータ。
+        fmt (str): `MAPPING_FORMATS` の形式。
+        stem (str): ダウンロード時のファイル名 (拡張子を除く)。
+
+    Returns:
+        ExportFile: 作成済みのエクスポート。
+    """
+    if fmt not in MAPPING_FORMATS:
+        raise ValueError(f"Invalid format: {fmt}")
+    extension, mime = MAPPING_FORMATS[fmt]
+    digest = hashlib.sha256(
+        f"{mapping_digest(data)}:{fmt}".encode("utf-8")
+    ).hexdigest()[:24]
+
+    def write(f: BinaryIO) -> None:
+        text = toml.dumps(data) if fmt == "toml" else json.dumps(data, indent=4)
+        f.write(text.encode("utf-8"))
+
+    return _build(digest, extension, mime, f"{stem}.{extension}", write, fmt)
+
+
+def export_archive(
+    entries: Iterable[tuple[str, bytes]], digest: str, stem: str
+) -> ExportFile:
+    """
+    (ZIP 内のファイル名, 内容) を順に ZIP に書き出す。同じ digest の ZIP は作り直さない。
+
+    entries はイテレータでもよく、受け取ったものから順に書き出すため、
+    全体をメモリに溜めない。PNG などの圧縮済みのデータを想定し、ZIP では圧縮しない。
+
+    Args:
+        entries (Iterable[tuple[str, bytes]]): ZIP 内のファイル名と内容。
+            作成済みの ZIP がある場合は読み出さない。
+        digest (str): 内容から決まるハッシュ。
+        stem (str): ダウンロード時のファイル名 (拡張子を除く)。
+
+    Returns:
+        ExportFile: 作成済みのエクスポート。
+    """
+    digest = hashlib.sha256(f"{digest}:zip".encode("utf-8")).hexdigest()[:24]
+
+    def write(f: BinaryIO) -> None:
+        with zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as zf:
+            for name, data in entries:
+                zf.writestr(name, data)
+
+    return _build(digest, "zip", "application/zip", f"{stem}.zip", write, "zip")
+
+
+def price_export_frame(hist: pd.DataFrame) -> pd.DataFrame:
+    """価格履歴を、日付列と OHLCV 列 (と配当・分割) の DataFrame にする"""
+    df = hist.reset_index()
+    date_column = df.columns[0]
+    dates = pd.to_datetime(df[date_column])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    df[date_column] = dates.dt.date
+    return df.rename(columns={date_column: "Date"})
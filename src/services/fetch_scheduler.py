@@ -0,0 +1,253 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from enum import IntEnum
+from typing import Any, Callable, Dict, Hashable, List
+
+from dotenv import load_dotenv
+from yfinance.exceptions import YFRateLimitError
+
+from services.metrics import observe, span
+
+load_dotenv()
+
+
+class Priority(IntEnum):
+    """値が小さいほど先に実行される"""
+
+    INTERACTIVE = 0
+    PREFETCH = 10
+
+
+class TokenBucket:
+    """一定のレートでトークンが貯まるバケット。リクエスト前にトークンを消費する"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """トークンが貯まるまで待ってから消費する"""
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self) -> None:
+        """レートリミットに達した場合に、貯まっているトークンを捨てる"""
+        with self._lock:
+            self._tokens = 0
+            self._updated = time.monotonic()
+
+
+@dataclass
+class _TaskState:
+    """キューに入れ直した同じジョブの間で共有する状態"""
+
+    priority: int
+    started: bool = False
+
+
+@dataclass(order=True)
+class _Task:
+    priority: int
+    seq: int
+    keys: List[Hashable] = field(compare=False)
+    fn: Callable[[List[Hashable]], Dict[Hashable, Any]] = field(compare=False)
+    futures: Dict[Hashable, Future] = field(compare=False)
+    state: _TaskState = field(compare=False)
+
+
+class FetchScheduler:
+    """
+    プロセス全体で共有する取得スケジューラ。
+
+    - トークンバケットで Yahoo Finance へのリクエストレートを制限する
+    - 優先度付きキューで、画面表示のための取得を先読みより先に実行する
+    - 同じキーの取得が実行中または待機中なら、新たに取得せず結果を共有する。
+      待機中のジョブにより高い優先度で合流した場合は、その優先度で入れ直す
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        rate: float = 2.0,
+        burst: float = 10.0,
+        retries: int = 3,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self._queue: "queue.PriorityQueue[_Task]" = queue.PriorityQueue()
+        self._inflight: Dict[Hashable, Future] = {}
+        # 待機中 (未実行) のキーと、そのジョブ
+        self._queued: Dict[Hashable, _Task] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"fetch-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit_batch(
+        self,
+        keys: List[Hashable],
+        fn: Callable[[List[Hashable]], Dict[Hashable, Any]],
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> Dict[Hashable, Future]:
+        """
+        複数のキーをまとめて取得するジョブを投入する。
+
+        実行中・待機中のキーは既存の Future を返し、残りのキーだけを
+        1つのジョブとして `fn(keys)` で取得する。待機中のジョブが priority より
+        低い優先度なら、priority で入れ直して先に実行されるようにする。
+
+        Args:
+            keys (List[Hashable]): 取得するキー。
+            fn (Callable): キーのリストを受け取り、キーをキーとした結果の辞書を返す関数。
+            priority (Priority, optional): 優先度。
+
+        Returns:
+            Dict[Hashable, Future]: キーごとの Future。
+        """
+        futures: Dict[Hashable, Future] = {}
+        new_futures: Dict[Hashable, Future] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                future = self._inflight.get(key)
+                if future is None:
+                    future = Future()
+                    self._inflight[key] = future
+                    new_futures[key] = future
+                else:
+                    self._boost(self._queued.get(key), priority)
+                futures[key] = future
+
+            if new_futures:
+                task = _Task(
+                    priority=int(priority),
+                    seq=next(self._seq),
+                    keys=list(new_futures),
+                    fn=fn,
+                    futures=new_futures,
+                    state=_TaskState(priority=int(priority)),
+                )
+                for key in task.keys:
+                    self._queued[key] = task
+                self._queue.put(task)
+        return futures
+
+    def _boost(self, task: _Task | None, priority: Priority) -> None:
+        """
+        待機中のジョブを高い優先度で入れ直す (ロックを取った状態で呼ぶ)。
+
+        PriorityQueue の要素の優先度は変えられないため、状態を共有する複製を
+        入れ直し、先に取り出された方だけを実行する。
+        """
+        if task is None or task.state.started or priority >= task.state.priority:
+            return
+        task.state.priority = int(priority)
+        self._queue.put(replace(task, priority=int(priority), seq=next(self._seq)))
+
+    def submit(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> Future:
+        """1つのキーを取得するジョブを投入する"""
+        return self.submit_batch([key], lambda keys: {keys[0]: fn()}, priority)[key]
+
+    def run_batch(
+        self,
+        keys: List[Hashable],
+        fn: Callable[[List[Hashable]], Dict[Hashable, Any]],
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> Dict[Hashable, Any]:
+        """`submit_batch` して結果を待つ"""
+        futures = self.submit_batch(keys, fn, priority)
+        return {key: future.result() for key, future in futures.items()}
+
+    def pending(self) -> int:
+        """待機中・実行中のキーの数"""
+        with self._lock:
+            return len(self._inflight)
+
+    def _run(self, task: _Task) -> Dict[Hashable, Any]:
+        delay = 1
+        for i in range(self.retries):
+            with span("fetch_rate_limit_wait"):
+                self.bucket.acquire(len(task.keys))
+            try:
+                return task.fn(task.keys)
+            except YFRateLimitError:
+                if i == self.retries - 1:
+                    raise
+                observe("fetch_rate_limited", delay)
+                self.bucket.drain()
+                time.sleep(delay)
+                delay *= 2
+
+    def _worker(self) -> None:
+        while True:
+            task = self._queue.get()
+            with self._lock:
+                # 入れ直したジョブの片方が実行済みなら、もう片方は捨てる
+                skip = task.state.started
+                if not skip:
+                    task.state.started = True
+                    for key in task.keys:
+                        self._queued.pop(key, None)
+            if skip:
+                self._queue.task_done()
+                continue
+            try:
+                results = self._run(task)
+                for key, future in task.futures.items():
+                    future.set_result(results.get(key))
+            except BaseException as e:
+                for future in task.futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                with self._lock:
+                    for key in task.keys:
+                        self._inflight.pop(key, None)
+                self._queue.task_done()
+
+
+_scheduler: FetchScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_fetch_scheduler() -> FetchScheduler:
+    """プロセス内で共有する FetchScheduler を返す"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FetchScheduler(
+                max_workers=int(os.getenv("FETCH_MAX_CONCURRENCY", "4")),
+                rate=float(os.getenv("FETCH_RATE_PER_SEC", "2")),
+                burst=float(os.getenv("FETCH_BURST", "10")),
+            )
+        return _scheduler
@@ -0,0 +1,154 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from services.forecast_engine import get_forecast_engine
+from services.forecast_jobs import (
+    get_forecast_error,
+    get_forecast_frame,
+    get_forecast_status,
+    submit_forecast,
+    to_prophet_frame,
+)
+from services.market_data import normalize_ticker
+from services.price_panel import get_price_panel
+
+BATCH_COLUMNS = [
+    "status",
+    "last_date",
+    "last_close",
+    "forecast_close",
+    "forecast_lower",
+    "forecast_upper",
+    "expected_return",
+]
+
+
+@dataclass
+class BatchForecast:
+    """
+    ウォッチリスト全体の予測ジョブ。
+
+    Args:
+        periods (int): 予測する日数。
+        engine (str): 予測エンジンの名前 ("fast" / "prophet")。
+        jobs (Dict[str, str]): ティッカーとジョブID (Prophet)。
+        forecasts (Dict[str, pd.DataFrame]): ティッカーと予測結果 (高速エンジン)。
+        last_close (Dict[str, float]): 学習データの最後の終値。
+        last_date (Dict[str, pd.Timestamp]): 学習データの最後の日付。
+        skipped (List[str]): 価格を取得できずに予測しなかったティッカー。
+    """
+
+    periods: int
+    engine: str = "prophet"
+    jobs: Dict[str, str] = field(default_factory=dict)
+    forecasts: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    last_close: Dict[str, float] = field(default_factory=dict)
+    last_date: Dict[str, pd.Timestamp] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+
+
+def submit_batch(
+    ticker_list: List[str],
+    period: str = "1y",
+    periods: int = 60,
+    engine: str = "prophet",
+) -> BatchForecast:
+    """
+    ウォッチリストの全銘柄を予測する。
+
+    Prophet の場合は予測ジョブをワーカープロセスに投入する。ジョブは単一銘柄の
+    予測と同じプールで実行され、同じ (ティッカー, 学習データ, 予測期間) のジョブは
+    セッションをまたいで共有される。高速エンジンの場合は全銘柄を1回の呼び出しで
+    その場で予測する。
+
+    Args:
+        ticker_list (List[str]): ティッカーまたは証券コードのリスト。
+        period (str, optional): 学習に使う yfinance の period 表記。Defaults to "1y".
+        periods (int, optional): 予測する日数。Defaults to 60.
+        engine (str, optional): 予測エンジンの名前。Defaults to "prophet".
+
+    Returns:
+        BatchForecast: 投入したジョブ。
+    """
+    tickers = list(dict.fromkeys(normalize_ticker(t) for t in ticker_list))
+    panel = get_price_panel(tickers, period)
+    available = set(panel.available_tickers)
+
+    batch = BatchForecast(periods=periods, engine=engine)
+    histories = {}
+    for ticker in tickers:
+        if ticker not in available:
+            batch.skipped.append(ticker)
+            continue
+        history = to_prophet_frame(panel.dates, panel.series(ticker))
+        if len(history) < 2:
+            batch.skipped.append(ticker)
+            continue
+        histories[ticker] = history
+        batch.last_close[ticker] = float(history["y"].iloc[-1])
+        batch.last_date[ticker] = history["ds"].iloc[-1]
+
+    if engine == "prophet":
+        for ticker, history in histories.items():
+            batch.jobs[ticker] = submit_forecast(ticker, history, periods=periods)
+    else:
+        batch.forecasts = get_forecast_engine(engine).forecast_many(
+            histories, periods, include_history=False
+        )
+    return batch
+
+
+def batch_progress(batch: BatchForecast) -> tuple[int, int]:
+    """(終わったジョブの数, 全ジョブの数) を返す (失敗したジョブも終わったものに数える)"""
+    statuses = [get_forecast_status(job_id) for job_id in batch.jobs.values()]
+    finished = sum(status in ("done", "error", "unknown") for status in statuses)
+    return finished + len(batch.forecasts), len(statuses) + len(batch.forecasts)
+
+
+def batch_table(batch: BatchForecast) -> pd.DataFrame:
+    """
+    銘柄ごとの予測の要約を、予測期間のリターンの高い順に返す。
+
+    予測期間の最後の日の予測値 (yhat) と、学習データの最後の終値を比べる。
+    未完了・失敗した銘柄の値は NaN。
+
+    Args:
+        batch (BatchForecast): `submit_batch` が返したジョブ。
+
+    Returns:
+        pd.DataFrame: index がティッカー、列が `BATCH_COLUMNS` の DataFrame。
+    """
+    rows = {}
+    for ticker in batch.last_close:
+        job_id = batch.jobs.get(ticker)
+        status = "done" if job_id is None else get_forecast_status(job_id)
+        row = {
+            "status": status,
+            "last_date": batch.last_date[ticker],
+            "last_close": batch.last_close[ticker],
+            "forecast_close": np.nan,
+            "forecast_lower": np.nan,
+            "forecast_upper": np.nan,
+            "expected_return": np.nan,
+        }
+        if job_id is None:
+            forecast = batch.forecasts.get(ticker)
+        else:
+            forecast = get_forecast_frame(job_id) if status == "done" else None
+        if forecast is not None and len(forecast):
+            last = forecast.iloc[-1]
+            row["forecast_close"] = float(last["yhat"])
+            row["forecast_lower"] = float(last["yhat_lower"])
+            row["forecast_upper"] = float(last["yhat_upper"])
+            if row["last_close"]:
+                row["expected_return"] = row["forecast_close"] / row["last_close"] - 1
+        elif status == "error":
+            row["status"] = f"error: {get_forecast_error(job_id)}"
+        rows[ticker] = row
+
+    table = pd.DataFrame.from_dict(rows, orient="index", columns=BATCH_COLUMNS)
+    table.index.name = "Ticker"
+    return table.sort_values("expected_return", ascending=False, na_position="last")
@@ -0,0 +1,266 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from services.forecast_models import ForecastModelStore, settings_key
+from services.metrics import observe
+
+load_dotenv()
+
+# 保持しておく完了済みジョブの数
+MAX_FINISHED_JOBS = 256
+# ワーカーの異常終了で失敗したジョブを投入し直す回数
+MAX_JOB_RESUBMITS = 1
+
+_executor: ProcessPoolExecutor | None = None
+_jobs: "OrderedDict[str, Future]" = OrderedDict()
+# ジョブの引数と、投入し直した回数
+_job_args: Dict[str, Tuple[tuple, int]] = {}
+# 完了済みの Future のコールバックは登録したスレッドですぐに呼ばれるため、
+# ロックを取ったまま登録できるように再入可能にする
+_lock = threading.RLock()
+
+
+@dataclass
+class ForecastResult:
+    forecast: pd.DataFrame
+    model: Any
+
+
+def to_prophet_frame(dates: pd.Series | pd.Index, values: pd.Series) -> pd.DataFrame:
+    """日付と値から Prophet 用の ds / y の DataFrame を作る"""
+    ds = pd.Series(dates)
+    if not pd.api.types.is_datetime64_any_dtype(ds):
+        ds = pd.to_datetime(ds, format="mixed")
+    if ds.dt.tz is not None:
+        ds = ds.dt.tz_localize(None)
+    y = pd.Series(values).to_numpy(dtype=np.float64)
+    history = pd.DataFrame({"ds": ds.to_numpy(), "y": y})
+    return history.dropna().reset_index(drop=True)
+
+
+def _fit_and_predict(
+    ticker: str,
+    history: pd.DataFrame,
+    periods: int,
+    settings: Dict[str, Any] | None = None,
+) -> dict:
+    """ワーカープロセスで Prophet を学習し、予測結果とモデルを返す"""
+    from prophet.serialize import model_to_json
+
+    start = time.perf_counter()
+    model = ForecastModelStore().fit(ticker, history, settings)
+    fitted = time.perf_counter()
+
+    # 学習データに基づいて未来を予測
+    future = model.make_future_dataframe(periods=periods)
+    forecast = model.predict(future)
+    # ワーカープロセスのメトリクスは親プロセスから見えないため、計測値を返す
+    timings = {
+        "prophet_fit": fitted - start,
+        "prophet_predict": time.perf_counter() - fitted,
+    }
+    return {
+        "forecast": forecast,
+        "model_json": model_to_json(model),
+        "timings": timings,
+    }
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # 一括予測ではコアごとに1銘柄ずつ学習する
+        max_workers = int(os.getenv("FORECAST_WORKERS", str(os.cpu_count() or 2)))
+        # Streamlit のサーバースレッドを fork しないように spawn で起動する
+        _executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _submit_to_pool(args: tuple) -> Future:
+    """
+    ワーカープロセスにジョブを投入する (ロックを取った状態で呼ぶ)。
+
+    ワーカーが異常終了する (メモリ不足で kill されるなど) とプールは壊れ、
+    以降の投入がすべて失敗するため、プールを作り直して投入し直す。
+    """
+    global _executor
+    try:
+        return _get_executor().submit(_fit_and_predict, *args)
+    except BrokenProcessPool:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        return _get_executor().submit(_fit_and_predict, *args)
+
+
+def make_job_id(
+    ticker: str,
+    history: pd.DataFrame,
+    periods: int,
+    settings: Dict[str, Any] | None = None,
+) -> str:
+    """(ティッカー, 学習データ, 予測期間, 設定) から決まるジョブID"""
+    digest = hashlib.sha256()
+    digest.update(f"{ticker}:{periods}:{settings_key(settings)}:".encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(history, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _record_job_metrics(future: Future, submitted: float) -> None:
+    """ジョブの所要時間と、ワーカーで計測した学習・予測の時間を記録する"""
+    failed = future.cancelled() or future.exception() is not None
+    observe(
+        "forecast_job",
+        time.perf_counter() - submitted,
+        status="error" if failed else "ok",
+    )
+    if not failed:
+        for name, seconds in future.result().get("timings", {}).items():
+            observe(name, seconds)
+
+
+def _evict_finished_jobs() -> None:
+    finished = [job_id for job_id, future in _jobs.items() if future.done()]
+    for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+        _job_args.pop(job_id, None)
+
+
+def _submit_job(job_id: str, args: tuple, attempt: int = 0) -> Future:
+    """ジョブを投入して登録する (ロックを取った状態で呼ぶ)"""
+    submitted = time.perf_counter()
+    future = _submit_to_pool(args)
+    _jobs[job_id] = future
+    _job_args[job_id] = (args, attempt)
+    future.add_done_callback(lambda f: _record_job_metrics(f, submitted))
+    # 待っている人がいなくても、プールが壊れて失敗したら投入し直す
+    future.add_done_callback(lambda f: _get_job(job_id))
+    return future
+
+
+def _get_job(job_id: str) -> Future | None:
+    """
+    ジョブの Future を返す。
+
+    プールが壊れて失敗したジョブは、作り直したプールに `MAX_JOB_RESUBMITS` 回まで
+    投入し直し、新しい Future を返す。
+    """
+    with _lock:
+        future = _jobs.get(job_id)
+        if future is None or not future.done() or future.cancelled():
+            return future
+        args, attempt = _job_args.get(job_id, ((), MAX_JOB_RESUBMITS))
+        broken = isinstance(future.exception(), BrokenProcessPool)
+        if broken and attempt < MAX_JOB_RESUBMITS:
+            future = _submit_job(job_id, args, attempt + 1)
+        return future
+
+
+def submit_forecast(
+    ticker: str,
+    history: pd.DataFrame,
+    periods: int = 60,
+    settings: Dict[str, Any] | None = None,
+) -> str:
+    """
+    予測ジョブをワーカープロセスに投入し、ジョブIDを返す。
+
+    同じ (ティッカー, 学習データ, 予測期間) のジョブが既にあれば、
+    セッションをまたいでそのジョブを共有する。
+
+    Args:
+        ticker (str): ティッカーシンボル。
+        history (pd.DataFrame): Prophet 用の ds / y の DataFrame。
+        periods (int, optional): 予測する日数。Defaults to 60.
+        settings (Dict[str, Any] | None, optional): `Prophet()` に渡す設定。
+
+    Returns:
+        str: ジョブID。
+    """
+    job_id = make_job_id(ticker, history, periods, settings)
+    with _lock:
+        future = _jobs.get(job_id)
+        failed = future is not None and (
+            future.cancelled() or (future.done() and future.exception() is not None)
+        )
+        if future is None or failed:
+            _submit_job(job_id, (ticker, history, periods, settings))
+            _evict_finished_jobs()
+        else:
+            _jobs.move_to_end(job_id)
+    return job_id
+
+
+def get_forecast_status(job_id: str) -> str:
+    """ジョブの状態を "pending" / "running" / "done" / "error" / "unknown" で返す"""
+    future = _get_job(job_id)
+    if future is None:
+        return "unknown"
+    if future.cancelled():
+        return "error"
+    if future.running():
+        return "running"
+    if not future.done():
+        return "pending"
+    return "error" if future.exception() is not None else "done"
+
+
+def get_forecast_error(job_id: str) -> BaseException | None:
+    """失敗したジョブの例外を返す"""
+    future = _get_job(job_id)
+    if future is None or not future.done() or future.cancelled():
+        return None
+    return future.exception()
+
+
+def wait_forecast(job_id: str, timeout: float | None = None) -> None:
+    """ジョブが終わるまで待つ (失敗したジョブの例外はそのまま送出する)"""
+    future = _get_job(job_id)
+    if future is None:
+        raise KeyError(f"Unknown forecast job: {job_id}")
+    while True:
+        try:
+            future.result(timeout=timeout)
+            return
+        except BrokenProcessPool:
+            # 投入し直した場合は、新しいジョブを待つ
+            resubmitted = _get_job(job_id)
+            if resubmitted is future:
+                raise
+            future = resubmitted
+
+
+def get_forecast_frame(job_id: str) -> pd.DataFrame | None:
+    """完了したジョブの予測の DataFrame だけを返す (モデルは復元しない)"""
+    future = _get_job(job_id)
+    if future is None or get_forecast_status(job_id) != "done":
+        return None
+    return future.result()["forecast"]
+
+
+def get_forecast_result(job_id: str) -> ForecastResult | None:
+    """完了したジョブの予測結果を返す (未完了なら None)"""
+    from prophet.serialize import model_from_json
+
+    future = _get_job(job_id)
+    if future is None or get_forecast_status(job_id) != "done":
+        return None
+
+    result = future.result()
+    return ForecastResult(
+        forecast=result["forecast"], model=model_from_json(result["model_json"])
+    )
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ティッカー×設定ごとに残しておくモデルの数
+MAX_MODELS_PER_KEY = 3
+
+
+def _default_model_dir() -> str:
+    """学習済みモデルの保存先ディレクトリを返す"""
+    model_dir = os.getenv("FORECAST_MODEL_PATH")
+    if model_dir:
+        return model_dir
+    data_path = os.getenv("DATA_PATH") or "data"
+    return os.path.join(os.path.dirname(__file__), "..", "..", data_path, "models")
+
+
+def data_fingerprint(history: pd.DataFrame) -> str:
+    """学習データ (ds / y) のハッシュ"""
+    hashed = pd.util.hash_pandas_object(history[["ds", "y"]], index=False)
+    return hashlib.sha256(hashed.values.tobytes()).hexdigest()[:16]
+
+
+def settings_key(settings: Dict[str, Any] | None) -> str:
+    """Prophet の設定のハッシュ"""
+    encoded = json.dumps(settings or {}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:12]
+
+
+def stan_init(model) -> Dict[str, Any]:
+    """学習済みモデルのパラメータを、次の学習の初期値として取り出す"""
+    init = {}
+    for pname in ["k", "m", "sigma_obs"]:
+        init[pname] = model.params[pname][0][0]
+    for pname in ["delta", "beta"]:
+        init[pname] = model.params[pname][0]
+    return init
+
+
+class ForecastModelStore:
+    """
+    学習済みの Prophet モデルを (ティッカー, データ, 設定) ごとにディスクへ保存するストア。
+
+    データが変わっていなければ保存済みのモデルをそのまま使い、
+    新しい足が追加された場合は前回のパラメータを初期値にして再学習する。
+    """
+
+    def __init__(self, model_dir: str | None = None):
+        self.model_dir = model_dir or _default_model_dir()
+
+    def _key_dir(self, ticker: str, settings: Dict[str, Any] | None) -> str:
+        safe_name = ticker.replace("/", "_").replace("^", "_")
+        return os.path.join(self.model_dir, safe_name, settings_key(settings))
+
+    def _load(self, path: str):
+        from prophet.serialize import model_from_json
+
+        with open(path, encoding="utf-8") as f:
+            return model_from_json(f.read())
+
+    def _save(self, key_dir: str, fingerprint: str, model) -> None:
+        from prophet.serialize import model_to_json
+
+        os.makedirs(key_dir, exist_ok=True)
+        path = os.path.join(key_dir, f"{fingerprint}.json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(model_to_json(model))
+        os.replace(tmp_path, path)
+        self._prune(key_dir)
+
+    def _prune(self, key_dir: str) -> None:
+        """古いモデルを削除する"""
+        paths = self._model_paths(key_dir)
+        for path in paths[MAX_MODELS_PER_KEY:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _model_paths(key_dir: str) -> list[str]:
+        """新しい順のモデルファイルのパス"""
+        if not os.path.isdir(key_dir):
+            return []
+        paths = [
+            os.path.join(key_dir, name)
+            for name in os.listdir(key_dir)
+            if name.endswith(".json")
+        ]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def fit(
+        self,
+        ticker: str,
+        history: pd.DataFrame,
+        settings: Dict[str, Any] | None = None,
+    ):
+        """
+        学習済みモデルを返す。必要な場合だけ学習する。
+
+        Args:
+            ticker (str): ティッカーシンボル。
+            history (pd.DataFrame): Prophet 用の ds / y の DataFrame。
+            settings (Dict[str, Any] | None, optional): `Prophet()` に渡す設定。
+
+        Returns:
+            Prophet: 学習済みモデル。
+        """
+        from prophet import Prophet
+
+        key_dir = self._key_dir(ticker, settings)
+        fingerprint = data_fingerprint(history)
+        path = os.path.join(key_dir, f"{fingerprint}.json")
+
+        # 同じデータで学習済みなら再学習しない
+        if os.path.exists(path):
+            return self._load(path)
+
+        model = None
+        previous_paths = self._model_paths(key_dir)
+        if previous_paths:
+            try:
+                init = stan_init(self._load(previous_paths[0]))
+                model = Prophet(**(settings or {})).fit(history, init=init)
+            except Exception:
+                # 季節性の数が変わった場合などは初期値を使わずに学習する
+                model = None
+
+        if model is None:
+            model = Prophet(**(settings or {})).fit(history)
+
+        self._save(key_dir, fingerprint, model)
+        return model
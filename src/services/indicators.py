@@ -0,0 +1,404 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from services.metrics import span
+
+load_dotenv()
+
+# キャッシュする (ティッカー, インジケーター, パラメータ) の数
+MAX_INDICATOR_ENTRIES = int(os.getenv("INDICATOR_CACHE_MAX_ENTRIES", "512"))
+
+# 各インジケーターが使う列
+PRICE_COLUMNS = ("Close", "High", "Low")
+
+# 計算の途中状態。葉は最後の軸がティッカーの np.ndarray
+State = Any
+Arrays = Dict[str, np.ndarray]
+
+
+# --------------------------------------------------
+# kernels: 入力は (足の数, ティッカー数) の配列。先頭の NaN は「まだ足がない」扱い
+# --------------------------------------------------
+def rolling_mean_std(x: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """累積和で移動平均と移動標準偏差 (母標準偏差) を計算する"""
+    valid = ~np.isnan(x)
+    values = np.where(valid, x, 0.0)
+    zeros = np.zeros((1, x.shape[1]))
+    sums = np.concatenate([zeros, np.cumsum(values, axis=0)])
+    squares = np.concatenate([zeros, np.cumsum(values**2, axis=0)])
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+
+    window_sum = sums[window:] - sums[:-window]
+    window_squares = squares[window:] - squares[:-window]
+    window_counts = counts[window:] - counts[:-window]
+
+    head = np.full((min(window - 1, len(x)), x.shape[1]), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = window_sum / window
+        var = np.maximum(window_squares / window - mean**2, 0.0)
+    full = window_counts == window
+    mean = np.concatenate([head, np.where(full, mean, np.nan)])
+    std = np.concatenate([head, np.where(full, np.sqrt(var), np.nan)])
+    return mean, std
+
+
+def ema(
+    x: np.ndarray, alpha: float, min_periods: int, state: State = None
+) -> Tuple[np.ndarray, State]:
+    """
+    指数移動平均 (最初の値を初期値にする、pandas の adjust=False と同じ)。
+
+    Args:
+        x (np.ndarray): (足の数, ティッカー数) の配列。
+        alpha (float): 平滑化係数。
+        min_periods (int): 値を出すのに必要な足の数。
+        state (State, optional): 前回の計算の続きから計算する場合の状態。
+
+    Returns:
+        Tuple[np.ndarray, State]: 計算結果と、続きを計算するための状態。
+    """
+    if state is None:
+        # 全期間の計算は pandas の C 実装にまとめて任せる
+        raw = pd.DataFrame(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+        counts = np.cumsum(~np.isnan(x), axis=0)
+        out = np.where(counts >= min_periods, raw, np.nan)
+        if len(x) == 0:
+            empty = np.full(x.shape[1], np.nan)
+            return out, (empty, np.zeros(x.shape[1], np.int64))
+        return out, (raw[-1].copy(), counts[-1].copy())
+
+    # 追加された足だけを、ティッカー方向にまとめて1本ずつ更新する
+    value, count = state[0].copy(), state[1].copy()
+    out = np.empty_like(x)
+    for i, xi in enumerate(x):
+        valid = ~np.isnan(xi)
+        seed = valid & np.isnan(value)
+        step = np.where(valid, value + alpha * (xi - value), value)
+        value = np.where(seed, xi, step)
+        count = count + valid
+        out[i] = np.where(count >= min_periods, value, np.nan)
+    return out, (value, count)
+
+
+def _with_previous(x: np.ndarray, previous: np.ndarray | None) -> np.ndarray:
+    """1本前の値の配列 (最初の足は前回の状態、なければ NaN)"""
+    if len(x) == 0:
+        return x.copy()
+    first = previous if previous is not None else np.full(x.shape[1], np.nan)
+    return np.concatenate([first[None, :], x[:-1]])
+
+
+# --------------------------------------------------
+# indicators: (入力, 状態, パラメータ) -> (出力の列, 新しい状態)
+# --------------------------------------------------
+def _windowed(
+    compute: Callable[[np.ndarray], Arrays], window: int
+) -> Callable[[Arrays, State], Tuple[Arrays, State]]:
+    """直近 window - 1 本を状態として持ち、追加分だけを計算するようにする"""
+
+    def indicator(data: Arrays, state: State) -> Tuple[Arrays, State]:
+        close = data["Close"]
+        n_new = len(close)
+        if state is not None:
+            close = np.concatenate([state, close])
+        outputs = {name: values[-n_new:] for name, values in compute(close).items()}
+        return outputs, close[-(window - 1):] if window > 1 else close[:0]
+
+    return indicator
+
+
+def sma(data: Arrays, state: State, window: int = 25) -> Tuple[Arrays, State]:
+    return _windowed(
+        lambda close: {f"SMA_{window}": rolling_mean_std(close, window)[0]}, window
+    )(data, state)
+
+
+def bollinger(
+    data: Arrays, state: State, window: int = 20, k: float = 2.0
+) -> Tuple[Arrays, State]:
+    def compute(close: np.ndarray) -> Arrays:
+        mean, std = rolling_mean_std(close, window)
+        return {
+            "BB_middle": mean,
+            "BB_upper": mean + k * std,
+            "BB_lower": mean - k * std,
+        }
+
+    return _windowed(compute, window)(data, state)
+
+
+def ema_indicator(data: Arrays, state: State, span: int = 20) -> Tuple[Arrays, State]:
+    values, state = ema(data["Close"], 2 / (span + 1), span, state)
+    return {f"EMA_{span}": values}, state
+
+
+def rsi(data: Arrays, state: State, period: int = 14) -> Tuple[Arrays, State]:
+    close = data["Close"]
+    prev_close, gain_state, loss_state = state if state is not None else (None,) * 3
+    delta = close - _with_previous(close, prev_close)
+    gain, loss = np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+    # Wilder の平滑化 (alpha = 1 / period)
+    avg_gain, gain_state = ema(gain, 1 / period, period, gain_state)
+    avg_loss, loss_state = ema(loss, 1 / period, period, loss_state)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        values = np.where(
+            avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        )
+    values = np.where(np.isnan(avg_gain) | np.isnan(avg_loss), np.nan, values)
+    last_close = _last_valid(close, prev_close)
+    return {f"RSI_{period}": values}, (last_close, gain_state, loss_state)
+
+
+def macd(
+    data: Arrays, state: State, fast: int = 12, slow: int = 26, signal: int = 9
+) -> Tuple[Arrays, State]:
+    fast_state, slow_state, signal_state = state if state is not None else (None,) * 3
+    close = data["Close"]
+    fast_ema, fast_state = ema(close, 2 / (fast + 1), fast, fast_state)
+    slow_ema, slow_state = ema(close, 2 / (slow + 1), slow, slow_state)
+    line = fast_ema - slow_ema
+    signal_line, signal_state = ema(line, 2 / (signal + 1), signal, signal_state)
+    outputs = {
+        "MACD": line,
+        "MACD_signal": signal_line,
+        "MACD_hist": line - signal_line,
+    }
+    return outputs, (fast_state, slow_state, signal_state)
+
+
+def atr(data: Arrays, state: State, period: int = 14) -> Tuple[Arrays, State]:
+    close, high, low = data["Close"], data["High"], data["Low"]
+    prev_close, atr_state = state if state is not None else (None, None)
+    previous = _with_previous(close, prev_close)
+    true_range = np.fmax(
+        high - low, np.fmax(np.abs(high - previous), np.abs(low - previous))
+    )
+    values, atr_state = ema(true_range, 1 / period, period, atr_state)
+    return {f"ATR_{period}": values}, (_last_valid(close, prev_close), atr_state)
+
+
+def _last_valid(x: np.ndarray, previous: np.ndarray | None) -> np.ndarray:
+    """各ティッカーの最後の有効な値"""
+    last = previous.copy() if previous is not None else np.full(x.shape[1], np.nan)
+    valid = ~np.isnan(x)
+    has_value = valid.any(axis=0)
+    last_index = len(x) - 1 - np.argmax(valid[::-1], axis=0)
+    last[has_value] = x[last_index[has_value], np.nonzero(has_value)[0]]
+    return last
+
+
+INDICATORS: Dict[str, Callable[..., Tuple[Arrays, State]]] = {
+    "SMA": sma,
+    "EMA": ema_indicator,
+    "RSI": rsi,
+    "MACD": macd,
+    "Bollinger": bollinger,
+    "ATR": atr,
+}
+# 価格と同じ軸に重ねるインジケーター (それ以外は別のパネルに描く)
+OVERLAY_INDICATORS = ("SMA", "EMA", "Bollinger")
+
+
+# --------------------------------------------------
+# state helpers: 状態をティッカーごとに分けたり、まとめたりする
+# --------------------------------------------------
+def _split_state(state: State, j: int) -> State:
+    if state is None:
+        return None
+    if isinstance(state, tuple):
+        return tuple(_split_state(leaf, j) for leaf in state)
+    return state[..., j : j + 1].copy()
+
+
+def _stack_states(states: List[State]) -> State:
+    if states[0] is None:
+        return None
+    if isinstance(states[0], tuple):
+        return tuple(_stack_states(list(leaves)) for leaves in zip(*states))
+    return np.concatenate(states, axis=-1)
+
+
+def _price_bars(hist: pd.DataFrame) -> Tuple[pd.Index, np.ndarray]:
+    """履歴から index と (足の数, 列の数) の価格の配列を取り出す (欠損のある足は除く)"""
+    bars = np.empty((len(hist), len(PRICE_COLUMNS)))
+    for i, column in enumerate(PRICE_COLUMNS):
+        bars[:, i] = hist[column].to_numpy(np.float64) if column in hist else np.nan
+    present = [c in hist for c in PRICE_COLUMNS]
+    valid = ~np.isnan(bars[:, present]).any(axis=1)
+    if valid.all():
+        return hist.index, bars
+    return hist.index[valid], bars[valid]
+
+
+def _stack_bars(bars_list: List[np.ndarray]) -> Arrays:
+    """長さの異なる履歴を右 (最新の足) で揃えて (足の数, ティッカー数) に並べる"""
+    length = max(len(bars) for bars in bars_list)
+    stacked = np.full((length, len(bars_list), len(PRICE_COLUMNS)), np.nan)
+    for j, bars in enumerate(bars_list):
+        stacked[length - len(bars) :, j] = bars
+    return {column: stacked[:, :, i] for i, column in enumerate(PRICE_COLUMNS)}
+
+
+@dataclass
+class _Entry:
+    index: pd.Index
+    last_bar: np.ndarray
+    values: Arrays
+    state: State
+
+
+class IndicatorEngine:
+    """
+    複数ティッカーのインジケーターをまとめて計算し、
+    (ティッカー, インジケーター, パラメータ) ごとに結果と計算途中の状態をキャッシュする。
+
+    前回計算した足がそのまま残り、新しい足が追加されただけの場合は、
+    追加分だけを計算して結果を延長する。
+    """
+
+    def __init__(self, max_entries: int = MAX_INDICATOR_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(ticker: str, name: str, params: Dict[str, Any]) -> Hashable:
+        return (ticker, name, tuple(sorted(params.items())))
+
+    def _get(self, key: Hashable) -> _Entry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key: Hashable, entry: _Entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _appended_rows(entry: _Entry, index: pd.Index, bars: np.ndarray) -> int | None:
+        """前回の足に新しい足が追加されただけなら追加された本数、違えば None"""
+        n_old = len(entry.index)
+        if len(index) < n_old or n_old == 0:
+            return None
+        if index[0] != entry.index[0] or index[n_old - 1] != entry.index[-1]:
+            return None
+        # 当日の足が更新された場合は最初から計算し直す
+        if not np.array_equal(bars[n_old - 1], entry.last_bar, equal_nan=True):
+            return None
+        return len(index) - n_old
+
+    def compute(
+        self, histories: Dict[str, pd.DataFrame], name: str, **params
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        複数ティッカーのインジケーターを計算する。
+
+        Args:
+            histories (Dict[str, pd.DataFrame]): ティッカーをキーとした OHLCV の辞書。
+            name (str): インジケーター名 (`INDICATORS` のキー)。
+            **params: インジケーターのパラメータ (window, span, period など)。
+
+        Returns:
+            Dict[str, pd.DataFrame]: ティッカーをキーとした、欠損のない足の index の結果。
+        """
+        indicator = INDICATORS[name]
+        prices = {ticker: _price_bars(hist) for ticker, hist in histories.items()}
+
+        results: Dict[str, Arrays] = {}
+        full: List[str] = []
+        appended: Dict[int, List[Tuple[str, _Entry]]] = {}
+        for ticker, (index, bars) in prices.items():
+            entry = self._get(self._key(ticker, name, params))
+            n_new = None if entry is None else self._appended_rows(entry, index, bars)
+            if n_new is None:
+                full.append(ticker)
+            elif n_new == 0:
+                results[ticker] = entry.values
+            else:
+                appended.setdefault(n_new, []).append((ticker, entry))
+
+        with span("indicator_compute", indicator=name):
+            if full:
+                bars_list = [prices[ticker][1] for ticker in full]
+                outputs, state = indicator(_stack_bars(bars_list), None, **params)
+                for j, ticker in enumerate(full):
+                    n = len(bars_list[j])
+                    values = {
+                        col: arr[len(arr) - n :, j].copy()
+                        for col, arr in outputs.items()
+                    }
+                    self._store(ticker, name, params, prices[ticker], values, state, j)
+                    results[ticker] = values
+
+            # 追加された本数が同じティッカーをまとめて、追加分だけ計算する
+            for n_new, group in appended.items():
+                bars_list = [prices[ticker][1][-n_new:] for ticker, _ in group]
+                states = _stack_states([entry.state for _, entry in group])
+                outputs, state = indicator(_stack_bars(bars_list), states, **params)
+                for j, (ticker, entry) in enumerate(group):
+                    values = {
+                        col: np.concatenate([entry.values[col], arr[:, j]])
+                        for col, arr in outputs.items()
+                    }
+                    self._store(ticker, name, params, prices[ticker], values, state, j)
+                    results[ticker] = values
+
+        return {
+            ticker: pd.DataFrame(results[ticker], index=prices[ticker][0])
+            for ticker in histories
+        }
+
+    def _store(
+        self,
+        ticker: str,
+        name: str,
+        params: Dict[str, Any],
+        price: Tuple[pd.Index, np.ndarray],
+        values: Arrays,
+        state: State,
+        j: int,
+    ) -> None:
+        index, bars = price
+        entry = _Entry(
+            index=index,
+            last_bar=bars[-1].copy() if len(bars) else np.array([]),
+            values=values,
+            state=_split_state(state, j),
+        )
+        self._set(self._key(ticker, name, params), entry)
+
+
+_engine: IndicatorEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_indicator_engine() -> IndicatorEngine:
+    """プロセス内で共有する IndicatorEngine を返す"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = IndicatorEngine()
+        return _engine
+
+
+def compute_indicator(
+    hist: pd.DataFrame, ticker: str, name: str, **params
+) -> pd.DataFrame:
+    """1ティッカーのインジケーターを共有のエンジンで計算する"""
+    return get_indicator_engine().compute({ticker: hist}, name, **params)[ticker]
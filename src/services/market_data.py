@@ -0,0 +1,268 @@
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import jaconv
+import pandas as pd
+import requests
+import yfinance as yf
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from yfinance.exceptions import YFRateLimitError
+
+load_dotenv()
+
+# yfinance の period 表記と、最終足からさかのぼる期間の対応
+PERIOD_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+# "1d", "5d" は営業日数で数える
+PERIOD_TRADING_DAYS = {"1d": 1, "5d": 5}
+# 東証の証券コード ("7203", "130A" など)
+_JP_CODE = re.compile(r"^[0-9][0-9A-Z]{3}$")
+# yf.download がティッカーごとに記録するエラーのうち、レートリミットを表すもの
+_RATE_LIMIT_MARKERS = ("YFRateLimitError", "Too Many Requests", "Rate limited")
+# yf.download は結果とエラーをモジュール全体の変数に書くため、同時に呼ばない
+_download_lock = threading.Lock()
+
+
+def normalize_ticker(ticker: str) -> str:
+    """証券コード ("7203" など) は東証のティッカー ("7203.T") にする"""
+    ticker = jaconv.z2h(ticker.strip(), digit=True, ascii=True).upper()
+    return f"{ticker}.T" if _JP_CODE.match(ticker) else ticker
+
+
+def period_start(period: str, last_date: pd.Timestamp) -> pd.Timestamp | None:
+    """
+    period が要求する最初の日付を返す。
+
+    Args:
+        period (str): yfinance の period 表記 ("1mo", "1y", "ytd", "max" など)。
+        last_date (pd.Timestamp): 基準となる最終日。
+
+    Returns:
+        pd.Timestamp | None: 期間の開始日。"max" の場合は None。
+    """
+    if period == "max":
+        return None
+    if period == "ytd":
+        return last_date.normalize().replace(month=1, day=1)
+    if period in PERIOD_TRADING_DAYS:
+        # 営業日ベースの期間は週末をまたいでも足りるように余裕を持たせる
+        return last_date.normalize() - pd.Timedelta(
+            days=PERIOD_TRADING_DAYS[period] * 2 + 4
+        )
+    if period in PERIOD_OFFSETS:
+        return last_date.normalize() - PERIOD_OFFSETS[period]
+    raise ValueError(f"Invalid period: {period}")
+
+
+def slice_period(hist: pd.DataFrame, period: str) -> pd.DataFrame:
+    """履歴から period 分の足だけを切り出す"""
+    if hist.empty or period == "max":
+        return hist
+    if period in PERIOD_TRADING_DAYS:
+        return hist.tail(PERIOD_TRADING_DAYS[period])
+    start = period_start(period, hist.index[-1])
+    return hist[hist.index >= start]
+
+
+def close_matrix(histories: Dict[str, pd.DataFrame], column: str = "Close") -> pd.DataFrame:
+    """
+    ティッカーごとの履歴を 日付×ティッカー の1つの DataFrame に揃える。
+
+    取引所ごとにタイムゾーンが異なるため、各市場の現地日付で揃える。
+
+    Args:
+        histories (Dict[str, pd.DataFrame]): ティッカーをキーとした OHLCV の辞書。
+        column (str, optional): 取り出す列。Defaults to "Close".
+
+    Returns:
+        pd.DataFrame: index が Date、列がティッカーの DataFrame。
+    """
+    series = {}
+    for ticker, hist in histories.items():
+        if hist.empty:
+            continue
+        values = hist[column]
+        if values.index.tz is not None:
+            values = values.tz_localize(None)
+        series[ticker] = values.groupby(values.index.normalize()).last()
+
+    if not series:
+        return pd.DataFrame()
+    matrix = pd.concat(series, axis=1).sort_index()
+    matrix.index.name = "Date"
+    return matrix
+
+
+class MarketDataProvider(ABC):
+    """株価データ取得元のインターフェース"""
+
+    max_workers: int = 8
+
+    @abstractmethod
+    def history(self, ticker: str, **kwargs) -> pd.DataFrame:
+        """
+        1銘柄の OHLCV を取得する。
+
+        Args:
+            ticker (str): ティッカーシンボル。
+            **kwargs: yfinance の history と同じ period / start / end。
+
+        Returns:
+            pd.DataFrame: OHLCV の DataFrame (取得できない場合は空)。
+        """
+
+    def bulk_history(self, tickers: List[str], **kwargs) -> Dict[str, pd.DataFrame]:
+        """複数銘柄をスレッドプールで並列に取得する"""
+        if not tickers:
+            return {}
+        workers = min(self.max_workers, len(tickers))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(lambda t: self.history(t, **kwargs), tickers)
+            return dict(zip(tickers, results))
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    yfinance から取得するプロバイダ。
+
+    全リクエストでコネクションプール付きの Session を共有し、複数銘柄は
+    `yf.download` の一括リクエストで取得する。レートリミットに達した場合は
+    1銘柄・複数銘柄とも `YFRateLimitError` を送出する。
+    """
+
+    def __init__(self, max_workers: int = 8, use_bulk_download: bool = True):
+        self.max_workers = max_workers
+        self.use_bulk_download = use_bulk_download
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def history(self, ticker: str, **kwargs) -> pd.DataFrame:
+        return yf.Ticker(ticker, session=self.session).history(**kwargs)
+
+    def bulk_history(self, tickers: List[str], **kwargs) -> Dict[str, pd.DataFrame]:
+        if len(tickers) <= 1 or not self.use_bulk_download:
+            return super().bulk_history(tickers, **kwargs)
+
+        # Ticker.history と同じ列・タイムゾーンで返るように揃える
+        with _download_lock:
+            data = yf.download(
+                tickers,
+                group_by="ticker",
+                auto_adjust=True,
+                actions=True,
+                ignore_tz=False,
+                threads=self.max_workers,
+                progress=False,
+                session=self.session,
+                **kwargs,
+            )
+            errors = dict(yf.shared._ERRORS)
+        # yf.download はレートリミットを例外にせず空の列を返すため、取得スケジューラが
+        # 待ってから取り直せるように例外にする
+        if any(
+            marker in str(errors.get(ticker.upper(), ""))
+            for ticker in tickers
+            for marker in _RATE_LIMIT_MARKERS
+        ):
+            raise YFRateLimitError()
+        histories = {}
+        for ticker in tickers:
+            if data.empty or ticker not in data.columns.get_level_values(0):
+                histories[ticker] = pd.DataFrame()
+                continue
+            hist = data[ticker].dropna(how="all")
+            hist.index.name = "Date"
+            histories[ticker] = hist
+        return histories
+
+
+class LocalFileProvider(MarketDataProvider):
+    """
+    `{root}/{ticker}.parquet` または `{root}/{ticker}.csv` から読み込むプロバイダ。
+
+    ネットワークなしでアプリやベンチマークを動かすための代替プロバイダ。
+    """
+
+    def __init__(self, root: str, max_workers: int = 8):
+        self.root = root
+        self.max_workers = max_workers
+
+    def _read(self, ticker: str) -> pd.DataFrame:
+        safe_name = ticker.replace("/", "_").replace("^", "_")
+        parquet_path = os.path.join(self.root, f"{safe_name}.parquet")
+        csv_path = os.path.join(self.root, f"{safe_name}.csv")
+
+        if os.path.exists(parquet_path):
+            return pd.read_parquet(parquet_path)
+        if os.path.exists(csv_path):
+            hist = pd.read_csv(csv_path, index_col="Date")
+            hist.index = pd.to_datetime(hist.index, utc=True)
+            return hist
+        return pd.DataFrame()
+
+    def history(self, ticker: str, **kwargs) -> pd.DataFrame:
+        hist = self._read(ticker)
+        if hist.empty:
+            return hist
+
+        start = kwargs.get("start")
+        end = kwargs.get("end")
+        if start is not None:
+            hist = hist[hist.index >= pd.Timestamp(start, tz=hist.index.tz)]
+        if end is not None:
+            hist = hist[hist.index < pd.Timestamp(end, tz=hist.index.tz)]
+        if start is None and end is None:
+            hist = slice_period(hist, kwargs.get("period", "1mo"))
+        return hist
+
+
+class OfflineProvider(MarketDataProvider):
+    """
+    何も取得しないプロバイダ。
+
+    価格ストアに保存済み (スナップショットから読み込んだものなど) の足だけで
+    アプリを動かすオフライン用。
+    """
+
+    def history(self, ticker: str, **kwargs) -> pd.DataFrame:
+        return pd.DataFrame()
+
+    def bulk_history(self, tickers: List[str], **kwargs) -> Dict[str, pd.DataFrame]:
+        return {}
+
+
+def get_provider() -> MarketDataProvider:
+    """
+    環境変数から利用するプロバイダを決める。
+
+    - MARKET_DATA_PROVIDER: "yfinance" (デフォルト)、"local" または "offline"
+    - MARKET_DATA_PATH: "local" の場合の読み込み元ディレクトリ
+    - MARKET_DATA_MAX_WORKERS: 同時接続数
+    """
+    provider_name = os.getenv("MARKET_DATA_PROVIDER", "yfinance")
+    max_workers = int(os.getenv("MARKET_DATA_MAX_WORKERS", "8"))
+
+    if provider_name == "local":
+        root = os.getenv("MARKET_DATA_PATH")
+        if not root:
+            raise ValueError("MARKET_DATA_PATH is not set in .env file.")
+        return LocalFileProvider(root, max_workers=max_workers)
+    if provider_name == "offline":
+        return OfflineProvider()
+    if provider_name == "yfinance":
+        return YFinanceProvider(max_workers=max_workers)
+    raise ValueError(f"Invalid MARKET_DATA_PROVIDER: {provider_name}")
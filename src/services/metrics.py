@@ -0,0 +1,233 @@
+import bisect
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 無効の場合、span / timed はほぼ何もしない
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+# Prometheus のテキスト形式で書き出すファイル (未設定なら書き出さない)
+METRICS_PATH = os.getenv("METRICS_PATH")
+# /metrics を返す HTTP サーバーのポート (未設定なら起動しない)
+METRICS_PORT = os.getenv("METRICS_PORT")
+# ファイルに書き出す最短間隔 (秒)
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "5"))
+# この時間を超えた span はログに出す (秒)
+SLOW_SPAN_SECONDS = float(os.getenv("METRICS_SLOW_SPAN_SECONDS", "2"))
+
+METRIC_NAME = "stockprice_span_duration_seconds"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Prometheus の histogram と同じ累積バケットを持つ計測値の集計"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """各バケットの上限以下の件数 (最後は +Inf)"""
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class MetricsRegistry:
+    """ラベルごとのヒストグラムを保持し、Prometheus のテキスト形式で出力する"""
+
+    def __init__(self):
+        self._histograms: Dict[LabelKey, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, labels: Dict[str, str]) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {METRIC_NAME} Duration of instrumented spans.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            snapshots = [
+                (key, h.buckets, h.cumulative(), h.sum, h.count) for key, h in items
+            ]
+
+        for key, buckets, cumulative, total, count in snapshots:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            for bound, value in zip([*map(str, buckets), "+Inf"], cumulative):
+                le = f'le="{bound}"'
+                lines.append(f"{METRIC_NAME}_bucket{{{labels},{le}}} {value}")
+            lines.append(f"{METRIC_NAME}_sum{{{labels}}} {total}")
+            lines.append(f"{METRIC_NAME}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+_last_export = 0.0
+_export_lock = threading.Lock()
+_server_started = False
+
+
+def observe(name: str, seconds: float, /, **labels) -> None:
+    """
+    計測済みの時間を記録する (別プロセスで計測した時間など)。
+
+    Args:
+        name (str): span の名前。
+        seconds (float): 経過時間 (秒)。
+        **labels: 追加のラベル ("span" は name で上書きする)。
+    """
+    if not METRICS_ENABLED:
+        return
+    registry.observe(seconds, {**labels, "span": name})
+    if seconds >= SLOW_SPAN_SECONDS:
+        logger.warning("slow span %s %s: %.3fs", name, labels, seconds)
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        seconds = time.perf_counter() - self.start
+        status = "ok" if exc_type is None else "error"
+        # 呼び出し側が status ラベルを渡しても、span の結果で上書きする
+        observe(self.name, seconds, **{**self.labels, "status": status})
+
+
+_NOOP_SPAN = nullcontext()
+
+
+def span(name: str, /, **labels):
+    """
+    with 文で囲んだ処理の時間を計測する。
+
+    Args:
+        name (str): span の名前 ("page_render", "fetch" など)。
+        **labels: 追加のラベル (値の種類が増えすぎないものにすること)。
+            "status" は処理の結果 ("ok" / "error") で上書きする。
+    """
+    if not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(name, labels)
+
+
+def timed(name: str, /, **labels) -> Callable:
+    """関数の実行時間を計測するデコレータ。無効の場合は関数をそのまま返す"""
+
+    def decorator(fn: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name, {"op": fn.__name__, **labels}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def export_metrics(force: bool = False) -> None:
+    """METRICS_PATH にメトリクスを書き出す (METRICS_EXPORT_INTERVAL ごとに1回まで)"""
+    global _last_export
+    if not METRICS_ENABLED or not METRICS_PATH:
+        return
+    now = time.monotonic()
+    with _export_lock:
+        if not force and now - _last_export < METRICS_EXPORT_INTERVAL:
+            return
+        _last_export = now
+
+    directory = os.path.dirname(os.path.abspath(METRICS_PATH))
+    os.makedirs(directory, exist_ok=True)
+    # 読み取り側が書きかけのファイルを見ないように置き換える
+    tmp_path = f"{METRICS_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(registry.render())
+        os.replace(tmp_path, METRICS_PATH)
+    except OSError:
+        logger.exception("Failed to export metrics to %s", METRICS_PATH)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format, *args)
+
+
+def start_metrics_server() -> None:
+    """METRICS_PORT が設定されていれば /metrics を返すサーバーを1度だけ起動する"""
+    global _server_started
+    if not METRICS_ENABLED or not METRICS_PORT:
+        return
+    with _export_lock:
+        if _server_started:
+            return
+        _server_started = True
+        try:
+            server = ThreadingHTTPServer(
+                ("127.0.0.1", int(METRICS_PORT)), _MetricsHandler
+            )
+        except OSError:
+            logger.exception("Failed to start metrics server on port %s", METRICS_PORT)
+            return
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    logger.info("Metrics server listening on 127.0.0.1:%s/metrics", METRICS_PORT)
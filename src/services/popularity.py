@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 人気度が半分になるまでの時間 (秒)
+POPULARITY_HALF_LIFE = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "24")) * 3600
+# クッキーに保存されたウォッチリストの銘柄に加える人気度 (セッションごとに1回)
+WATCHLIST_WEIGHT = 5.0
+# 記録しておくティッカーの最大数 (人気度の低いものから忘れる)
+POPULARITY_MAX_TICKERS = int(os.getenv("POPULARITY_MAX_TICKERS", "1000"))
+
+
+class PopularityTracker:
+    """
+    ティッカーと期間の人気度を、時間とともに減衰するスコアで記録する。
+
+    スコアは記録するたびに weight だけ増え、`half_life` 秒ごとに半分になる。
+    最近よく見られているものほど高くなる。
+    """
+
+    def __init__(
+        self,
+        half_life: float = POPULARITY_HALF_LIFE,
+        max_tickers: int = POPULARITY_MAX_TICKERS,
+    ):
+        self.half_life = half_life
+        self.max_tickers = max_tickers
+        # キー -> (最後に記録した時点のスコア, 最後に記録した時刻)
+        self._tickers: Dict[str, tuple[float, float]] = {}
+        self._periods: Dict[str, tuple[float, float]] = {}
+        self._listeners: List[Callable[[List[str], str | None], None]] = []
+        self._lock = threading.Lock()
+
+    def _decayed(self, entry: tuple[float, float], now: float) -> float:
+        score, updated = entry
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def _add(self, scores: dict, key: str, weight: float, now: float) -> None:
+        entry = scores.get(key)
+        scores[key] = ((self._decayed(entry, now) if entry else 0.0) + weight, now)
+
+    def _prune(self, now: float) -> None:
+        """上限を超えたら、人気度の低いティッカーから忘れる"""
+        if len(self._tickers) <= self.max_tickers:
+            return
+        ranked = sorted(
+            self._tickers, key=lambda t: self._decayed(self._tickers[t], now)
+        )
+        for ticker in ranked[: len(self._tickers) - self.max_tickers]:
+            del self._tickers[ticker]
+
+    def subscribe(self, listener: Callable[[List[str], str | None], None]) -> None:
+        """記録されるたびに (ティッカー, 期間) で呼ばれる関数を登録する"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def record(
+        self, tickers: Iterable[str], period: str | None = None, weight: float = 1.0
+    ) -> None:
+        """
+        ティッカー (と期間) が要求されたことを記録する。
+
+        Args:
+            tickers (Iterable[str]): 要求されたティッカー。
+            period (str | None, optional): 要求された期間。
+            weight (float, optional): スコアに加える値。Defaults to 1.0.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        now = time.time()
+        with self._lock:
+            for ticker in tickers:
+                self._add(self._tickers, ticker, weight, now)
+            if period is not None:
+                self._add(self._periods, period, weight, now)
+            self._prune(now)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(tickers, period)
+
+    def score(self, ticker: str) -> float:
+        """ティッカーの現在の人気度"""
+        with self._lock:
+            entry = self._tickers.get(ticker)
+            return self._decayed(entry, time.time()) if entry else 0.0
+
+    def top_tickers(
+        self, n: int, where: Callable[[str], bool] | None = None
+    ) -> List[str]:
+        """人気度の高い順に最大 n 個のティッカーを返す"""
+        now = time.time()
+        with self._lock:
+            ranked = sorted(
+                self._tickers.items(),
+                key=lambda item: self._decayed(item[1], now),
+                reverse=True,
+            )
+        tickers = [ticker for ticker, _ in ranked if where is None or where(ticker)]
+        return tickers[:n]
+
+    def top_periods(self, n: int) -> List[str]:
+        """人気度の高い順に最大 n 個の期間を返す"""
+        now = time.time()
+        with self._lock:
+            ranked = sorted(
+                self._periods.items(),
+                key=lambda item: self._decayed(item[1], now),
+                reverse=True,
+            )
+        return [period for period, _ in ranked[:n]]
+
+
+_tracker: PopularityTracker | None = None
+_tracker_lock = threading.Lock()
+
+
+def get_popularity_tracker() -> PopularityTracker:
+    """プロセス内で共有する PopularityTracker を返す"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PopularityTracker()
+        return _tracker
@@ -0,0 +1,234 @@
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from services.fetch_scheduler import Priority, get_fetch_scheduler
+from services.market_data import period_start
+from services.metrics import span
+from services.popularity import get_popularity_tracker
+from services.price_cache import NYSE, TSE, exchange_for, next_market_close
+from services.price_store import get_price_histories, warm_price_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 先読みを有効にするかどうか
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+# 表示中の期間と一緒に先読みしておく期間 (人気の期間も加える)
+PREFETCH_PERIODS = [
+    p.strip()
+    for p in os.getenv("PREFETCH_PERIODS", "1mo,6mo,1y,5y").split(",")
+    if p.strip()
+]
+# 先読みが同時に使う取得スケジューラのワーカーの数 (残りは画面表示の取得に空けておく)
+PREFETCH_MAX_CONCURRENCY = int(os.getenv("PREFETCH_MAX_CONCURRENCY", "1"))
+# 1回の取得にまとめるティッカーの数 (画面表示の取得を長く待たせない)
+PREFETCH_BATCH_SIZE = int(os.getenv("PREFETCH_BATCH_SIZE", "20"))
+# 同じティッカーを先読みし直すまでの間隔 (秒)
+PREFETCH_MIN_INTERVAL = float(os.getenv("PREFETCH_MIN_INTERVAL", "900"))
+# 取引終了後に最新の足を取り直すティッカーの数 (人気の高い順)
+PREFETCH_REFRESH_TOP = int(os.getenv("PREFETCH_REFRESH_TOP", "100"))
+# 取引終了から取り直すまでの待ち時間 (秒)。終値が確定するのを待つ
+PREFETCH_CLOSE_DELAY = float(os.getenv("PREFETCH_CLOSE_DELAY", "1200"))
+# 先読みの前に、画面表示の取得が終わるのを待つ最大時間 (秒)
+IDLE_WAIT_SECONDS = 5.0
+
+EXCHANGES = (TSE, NYSE)
+
+
+@dataclass
+class PrefetchJob:
+    """
+    先読みのジョブ。
+
+    Args:
+        tickers (List[str]): 取得するティッカー。
+        periods (List[str]): キャッシュに載せる期間。最も長い期間だけを取得し、
+            残りは価格ストアから切り出す。
+        refresh (bool): キャッシュにあっても取り直すかどうか。
+    """
+
+    tickers: List[str]
+    periods: List[str]
+    refresh: bool = False
+
+
+def widest_period(periods: List[str]) -> str:
+    """最も長い期間 (開始日が最も古いもの) を返す"""
+    now = pd.Timestamp.now()
+
+    def start(period: str) -> pd.Timestamp:
+        return period_start(period, now) or pd.Timestamp.min
+
+    return min(periods, key=start)
+
+
+class Prefetcher:
+    """
+    人気のティッカーを先読みするバックグラウンドワーカー。
+
+    - 画面表示のための取得があると、同じティッカーの他の期間を先読みする
+    - 取引所の取引終了後に、その取引所の人気のティッカーの最新の足を取り直す
+    - 取得は取得スケジューラに先読みの優先度で投入し、同時に使うワーカーの数を
+      `max_concurrency` に抑える。画面表示の取得が待っている間は始めない
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = PREFETCH_MAX_CONCURRENCY,
+        batch_size: int = PREFETCH_BATCH_SIZE,
+        min_interval: float = PREFETCH_MIN_INTERVAL,
+    ):
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self._queue: "queue.Queue[PrefetchJob]" = queue.Queue()
+        self._recent: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"prefetch-{i}", daemon=True)
+            for i in range(max(max_concurrency, 1))
+        ]
+        self._threads.append(
+            threading.Thread(
+                target=self._refresh_after_close, name="prefetch-close", daemon=True
+            )
+        )
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def pending(self) -> int:
+        """待機中のジョブの数"""
+        return self._queue.qsize()
+
+    def on_request(self, tickers: List[str], period: str | None) -> None:
+        """
+        画面表示のための取得を受けて、同じティッカーの他の期間の先読みを投入する。
+
+        人気度の記録のたびに呼ばれるため、キューに入れるだけですぐに戻る。
+        最近先読みしたティッカーは投入しない。
+        """
+        if period is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                t
+                for t in tickers
+                if now - self._recent.get(t, float("-inf")) >= self.min_interval
+            ]
+            for ticker in due:
+                self._recent[ticker] = now
+            if len(self._recent) > 10_000:
+                self._recent = {
+                    t: seen
+                    for t, seen in self._recent.items()
+                    if now - seen < self.min_interval
+                }
+        if not due:
+            return
+
+        popular = get_popularity_tracker().top_periods(3)
+        periods = [p for p in dict.fromkeys(PREFETCH_PERIODS + popular) if p != period]
+        if periods:
+            self._queue.put(PrefetchJob(due, periods))
+
+    def _wait_idle(self) -> None:
+        """画面表示の取得が待っている間は、先読みを始めずに待つ"""
+        scheduler = get_fetch_scheduler()
+        deadline = time.monotonic() + IDLE_WAIT_SECONDS
+        while scheduler.pending() and time.monotonic() < deadline:
+            if self._stop.wait(0.1):
+                return
+
+    def run_job(self, job: PrefetchJob) -> None:
+        """ジョブを小分けにして実行する"""
+        widest = widest_period(job.periods)
+        others = [period for period in job.periods if period != widest]
+        kind = "refresh" if job.refresh else "periods"
+        for start in range(0, len(job.tickers), self.batch_size):
+            if self._stop.is_set():
+                return
+            chunk = job.tickers[start : start + self.batch_size]
+            self._wait_idle()
+            with span("prefetch", kind=kind):
+                get_price_histories(
+                    chunk, widest, Priority.PREFETCH, refresh=job.refresh
+                )
+                warm_price_cache(chunk, others)
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self.run_job(job)
+            except Exception:
+                logger.exception("Prefetch failed: %s", job)
+            finally:
+                self._queue.task_done()
+
+    def _refresh_after_close(self) -> None:
+        delay = timedelta(seconds=PREFETCH_CLOSE_DELAY)
+        while not self._stop.is_set():
+            now = datetime.now(timezone.utc)
+            # 取引終了から待ち時間が過ぎる前なら、その日の取引終了を対象にする
+            schedule = {
+                exchange.name: next_market_close(exchange, now - delay) + delay
+                for exchange in EXCHANGES
+            }
+            exchange_name, refresh_at = min(schedule.items(), key=lambda item: item[1])
+            if self._stop.wait(max((refresh_at - now).total_seconds(), 0)):
+                return
+
+            tracker = get_popularity_tracker()
+            tickers = tracker.top_tickers(
+                PREFETCH_REFRESH_TOP,
+                where=lambda t: exchange_for(t).name == exchange_name,
+            )
+            if tickers:
+                periods = tracker.top_periods(3) or ["1y"]
+                self._queue.put(PrefetchJob(tickers, periods, refresh=True))
+
+
+_prefetcher: Prefetcher | None = None
+_prefetcher_lock = threading.Lock()
+
+
+def start_prefetcher() -> Prefetcher | None:
+    """
+    プロセスで1度だけ先読みのワーカーを起動する。PREFETCH_ENABLED=false で無効にできる。
+
+    起動前に記録された人気のティッカーも、最も人気の期間以外を先読みする。
+    """
+    global _prefetcher
+    if not PREFETCH_ENABLED:
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+            tracker = get_popularity_tracker()
+            tracker.subscribe(_prefetcher.on_request)
+            _prefetcher.start()
+            # 起動前 (最初の描画中) に要求されたティッカーも先読みする
+            for period in tracker.top_periods(1):
+                _prefetcher.on_request(
+                    tracker.top_tickers(PREFETCH_BATCH_SIZE), period
+                )
+        return _prefetcher
@@ -0,0 +1,231 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from typing import Any, Callable, Hashable, List, Tuple
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+from dotenv import load_dotenv
+
+try:
+    import holidays
+except ImportError:  # 祝日が分からない場合は土日だけを休場日として扱う
+    holidays = None
+
+load_dotenv()
+
+# 取引時間中のキャッシュの有効期限 (秒)
+OPEN_MARKET_TTL = int(os.getenv("PRICE_CACHE_OPEN_TTL", "60"))
+# 空の履歴 (取得の失敗・レート制限) のキャッシュの有効期限 (秒)
+EMPTY_PRICE_TTL = int(os.getenv("PRICE_CACHE_EMPTY_TTL", "30"))
+# キャッシュ全体のメモリ上限 (バイト)
+MAX_CACHE_BYTES = int(os.getenv("PRICE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+@dataclass(frozen=True)
+class Exchange:
+    name: str
+    timezone: str
+    sessions: Tuple[Tuple[dtime, dtime], ...]
+
+    @property
+    def tz(self) -> ZoneInfo:
+        return ZoneInfo(self.timezone)
+
+
+TSE = Exchange(
+    name="TSE",
+    timezone="Asia/Tokyo",
+    sessions=((dtime(9, 0), dtime(11, 30)), (dtime(12, 30), dtime(15, 30))),
+)
+NYSE = Exchange(
+    name="NYSE",
+    timezone="America/New_York",
+    sessions=((dtime(9, 30), dtime(16, 0)),),
+)
+
+
+def exchange_for(ticker: str) -> Exchange:
+    """ティッカーの取引所 (".T" は東証、それ以外は NYSE として扱う)"""
+    return TSE if ticker.upper().endswith(".T") else NYSE
+
+
+@lru_cache(maxsize=32)
+def _holidays(exchange_name: str, year: int) -> frozenset:
+    if holidays is None:
+        return frozenset()
+    if exchange_name == "TSE":
+        days = set(holidays.JP(years=year))
+        # 東証は年末年始 (12/31 ～ 1/3) も休場
+        days |= {date(year, 1, 2), date(year, 1, 3), date(year, 12, 31)}
+        return frozenset(days)
+    return frozenset(holidays.NYSE(years=year))
+
+
+def is_trading_day(exchange: Exchange, day: date) -> bool:
+    return day.weekday() < 5 and day not in _holidays(exchange.name, day.year)
+
+
+def is_market_open(exchange: Exchange, now: datetime | None = None) -> bool:
+    """取引時間中かどうか"""
+    local_now = (now or datetime.now(exchange.tz)).astimezone(exchange.tz)
+    if not is_trading_day(exchange, local_now.date()):
+        return False
+    current = local_now.time()
+    return any(start <= current < end for start, end in exchange.sessions)
+
+
+def next_market_open(exchange: Exchange, now: datetime | None = None) -> datetime:
+    """次に取引が始まる時刻 (取引時間中なら現在時刻)"""
+    local_now = (now or datetime.now(exchange.tz)).astimezone(exchange.tz)
+    if is_market_open(exchange, local_now):
+        return local_now
+
+    day = local_now.date()
+    for _ in range(30):
+        if is_trading_day(exchange, day):
+            for start, _end in exchange.sessions:
+                candidate = datetime.combine(day, start, tzinfo=exchange.tz)
+                if candidate > local_now:
+                    return candidate
+        day += timedelta(days=1)
+    raise RuntimeError(f"No trading day found for {exchange.name}")
+
+
+def next_market_close(exchange: Exchange, now: datetime | None = None) -> datetime:
+    """次に取引が終わる (その日の最後のセッションが閉まる) 時刻"""
+    local_now = (now or datetime.now(exchange.tz)).astimezone(exchange.tz)
+    day = local_now.date()
+    for _ in range(30):
+        if is_trading_day(exchange, day):
+            close = exchange.sessions[-1][1]
+            candidate = datetime.combine(day, close, tzinfo=exchange.tz)
+            if candidate > local_now:
+                return candidate
+        day += timedelta(days=1)
+    raise RuntimeError(f"No trading day found for {exchange.name}")
+
+
+def price_ttl(ticker_list: List[str], now: datetime | None = None) -> float:
+    """
+    ティッカーの取引所のセッションに応じたキャッシュの有効期限 (秒)。
+
+    取引時間中は短く、閉まっている間は次の取引開始までとする。
+    複数の取引所にまたがる場合は最も短いものを使う。
+    """
+    ttls = []
+    for exchange in {exchange_for(ticker) for ticker in ticker_list}:
+        local_now = (now or datetime.now(exchange.tz)).astimezone(exchange.tz)
+        if is_market_open(exchange, local_now):
+            ttls.append(OPEN_MARKET_TTL)
+        else:
+            seconds = (next_market_open(exchange, local_now) - local_now).total_seconds()
+            ttls.append(max(OPEN_MARKET_TTL, seconds))
+    return min(ttls) if ttls else OPEN_MARKET_TTL
+
+
+def estimate_size(value: Any) -> int:
+    """キャッシュする値のおおよそのメモリ使用量 (バイト)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values())
+    if isinstance(value, tuple):
+        return sum(estimate_size(v) for v in value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class PriceCache:
+    """
+    有効期限付き・メモリ上限付きの LRU キャッシュ。
+
+    上限を超えた場合は最後に使われてから最も時間が経ったエントリから削除する。
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple[Any, int, float]]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, _, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def get_or_load(
+        self, key: Hashable, loader: Callable[[], Any], ttl: float
+    ) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        """ヒット・ミス・削除の回数と使用量"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_price_cache = PriceCache()
+
+
+def get_price_cache() -> PriceCache:
+    """プロセス内で共有する PriceCache を返す"""
+    return _price_cache
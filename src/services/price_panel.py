@@ -0,0 +1,397 @@
+import copy
+import hashlib
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from services.fetch_scheduler import Priority
+from services.price_cache import PriceCache
+from services.price_store import get_price_histories
+
+load_dotenv()
+
+PRICE_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+# 出来高は float32 では 2**24 を超える値を正確に表せないため float64 で持つ
+FIELD_DTYPES = {field: np.float32 for field in PRICE_FIELDS} | {"Volume": np.float64}
+# 共有するパネル全体のメモリ上限 (バイト)
+PRICE_PANEL_CACHE_MAX_BYTES = int(
+    os.getenv("PRICE_PANEL_CACHE_MAX_BYTES", str(128 * 1024**2))
+)
+# 空きがなくなったときに確保し直す行数の最小値
+MIN_CAPACITY = 64
+
+
+def _local_dates(index: pd.DatetimeIndex) -> np.ndarray:
+    """各市場の現地日付 (tz なしの 0 時) にそろえる"""
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.normalize().values.astype("datetime64[ns]")
+
+
+def _aligned(
+    histories: Dict[str, pd.DataFrame], tickers: List[str]
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """ティッカーごとの履歴を、日付の和集合の行にそろえた配列にする"""
+    dates_by_ticker = {}
+    for ticker in tickers:
+        hist = histories.get(ticker)
+        if hist is not None and not hist.empty:
+            dates_by_ticker[ticker] = _local_dates(hist.index)
+
+    if dates_by_ticker:
+        dates = np.unique(np.concatenate(list(dates_by_ticker.values())))
+    else:
+        dates = np.array([], dtype="datetime64[ns]")
+
+    values = {
+        field: np.full((len(dates), len(tickers)), np.nan, dtype=FIELD_DTYPES[field])
+        for field in PRICE_FIELDS
+    }
+    for col, ticker in enumerate(tickers):
+        local = dates_by_ticker.get(ticker)
+        if local is None:
+            continue
+        hist = histories[ticker]
+        # 同じ日付の足が複数ある場合は最後の足を使う
+        last = np.r_[local[1:] != local[:-1], True]
+        rows = np.searchsorted(dates, local[last])
+        for field in PRICE_FIELDS:
+            if field in hist.columns:
+                values[field][rows, col] = hist[field].to_numpy()[last]
+    return dates, values
+
+
+def _tail_from(hist: pd.DataFrame, date: np.datetime64) -> pd.DataFrame:
+    """現地日付が date 以降の足を返す (末尾から必要な分だけ日付を変換する)"""
+    size = MIN_CAPACITY
+    while True:
+        tail = hist.iloc[-size:]
+        local = _local_dates(tail.index)
+        if size >= len(hist) or (len(local) and local[0] < date):
+            return tail.iloc[np.searchsorted(local, date) :]
+        size *= 2
+
+
+class PricePanel:
+    """
+    日付×ティッカーの OHLCV を型付きの配列で持つ、セッション間で共有する価格パネル。
+
+    値は項目ごとに (行数, 銘柄数) の連続した配列 (価格は float32) に持ち、
+    行は余裕を持って確保するため、新しい日付の追加は償却 O(1) で行える。
+    共有されたパネルの内容は変わらない (`update` は新しいパネルを返す)。
+    `frame` などが返す DataFrame は配列のビューなので、呼び出し側で変更しないこと。
+
+    Args:
+        tickers (List[str]): 列のティッカー。
+        dates (np.ndarray): 行の日付 (datetime64[ns]、昇順)。
+        values (Dict[str, np.ndarray]): 項目ごとの (行数, 銘柄数) の配列。
+    """
+
+    def __init__(
+        self, tickers: List[str], dates: np.ndarray, values: Dict[str, np.ndarray]
+    ):
+        self.tickers = pd.CategoricalIndex(tickers, categories=tickers, name="Ticker")
+        length = len(dates)
+        capacity = max(MIN_CAPACITY, length)
+        self._dates = np.empty(capacity, dtype="datetime64[ns]")
+        self._dates[:length] = dates
+        self._values = {}
+        for field in PRICE_FIELDS:
+            buffer = np.full(
+                (capacity, len(tickers)), np.nan, dtype=FIELD_DTYPES[field]
+            )
+            buffer[:length] = values[field]
+            self._values[field] = buffer
+        # 表示の対象の行の範囲 (開始, 終了)
+        self._view = (0, length)
+        self._digest: Tuple[Tuple[int, int], str] | None = None
+        # 表示の対象より後ろの空き行に追加してよいか (配列を共有する新しいパネルを
+        # 作った後は、そのパネルが空き行を使うため False になる)
+        self._appendable = True
+
+    @classmethod
+    def from_histories(
+        cls, histories: Dict[str, pd.DataFrame], tickers: List[str] | None = None
+    ) -> "PricePanel":
+        """ティッカーごとの OHLCV の履歴からパネルを作る"""
+        tickers = list(dict.fromkeys(tickers if tickers is not None else histories))
+        dates, values = _aligned(histories, tickers)
+        return cls(tickers, dates, values)
+
+    def __len__(self) -> int:
+        start, end = self._view
+        return end - start
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0 or len(self.tickers) == 0
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return self._dates_in(self._view)
+
+    def _dates_in(self, view: Tuple[int, int]) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self._dates[view[0] : view[1]], name="Date")
+
+    def _values_in(self, view: Tuple[int, int], field: str) -> np.ndarray:
+        return self._values[field][view[0] : view[1]]
+
+    @property
+    def available_tickers(self) -> List[str]:
+        """終値が1つ以上あるティッカー"""
+        has_value = ~np.isnan(self.values("Close")).all(axis=0)
+        return [ticker for ticker, ok in zip(self.tickers, has_value) if ok]
+
+    def digest(self) -> str:
+        """内容から決まるハッシュ (エクスポートのキャッシュのキーに使う)"""
+        view = self._view
+        cached = self._digest
+        if cached is not None and cached[0] == view:
+            return cached[1]
+        digest = hashlib.sha256(",".join(self.tickers).encode("utf-8"))
+        digest.update(self._dates[view[0] : view[1]].tobytes())
+        for field in PRICE_FIELDS:
+            digest.update(self._values_in(view, field).tobytes())
+        value = digest.hexdigest()[:24]
+        self._digest = (view, value)
+        return value
+
+    @property
+    def nbytes(self) -> int:
+        return self._dates.nbytes + sum(v.nbytes for v in self._values.values())
+
+    def values(self, field: str = "Close") -> np.ndarray:
+        """(行数, 銘柄数) の配列のビュー"""
+        return self._values_in(self._view, field)
+
+    def frame(self, field: str = "Close") -> pd.DataFrame:
+        """index が日付、列がティッカーの DataFrame (配列のビュー)"""
+        view = self._view
+        return pd.DataFrame(
+            self._values_in(view, field),
+            index=self._dates_in(view),
+            columns=self.tickers,
+            copy=False,
+        )
+
+    def series(self, ticker: str, field: str = "Close") -> pd.Series:
+        """1銘柄の系列 (配列のビュー)"""
+        view, col = self._view, self.tickers.get_loc(ticker)
+        return pd.Series(
+            self._values_in(view, field)[:, col],
+            index=self._dates_in(view),
+            name=ticker,
+            copy=False,
+        )
+
+    def history(self, ticker: str) -> pd.DataFrame:
+        """1銘柄の OHLCV (値のない日付は除く)"""
+        view, col = self._view, self.tickers.get_loc(ticker)
+        data = {field: self._values_in(view, field)[:, col] for field in PRICE_FIELDS}
+        hist = pd.DataFrame(data, index=self._dates_in(view))
+        return hist[~np.isnan(data["Close"])]
+
+    def long(self) -> pd.DataFrame:
+        """Date・Ticker (カテゴリ型)・OHLCV の縦長の DataFrame (値のない行は除く)"""
+        view, n_cols = self._view, len(self.tickers)
+        mask = ~np.isnan(self._values_in(view, "Close")).ravel()
+        codes = np.tile(np.arange(n_cols, dtype=np.int32), view[1] - view[0])[mask]
+        data = {
+            "Date": np.repeat(self._dates_in(view).values, n_cols)[mask],
+            "Ticker": pd.Categorical.from_codes(codes, categories=self.tickers),
+        }
+        for field in PRICE_FIELDS:
+            data[field] = self._values_in(view, field).ravel()[mask]
+        return pd.DataFrame(data)
+
+    # --------------------------------------------------
+    # 更新
+    # --------------------------------------------------
+    def _branch(self) -> "PricePanel":
+        """
+        配列を共有する新しいパネルを返す。
+
+        新しいパネルは表示の対象より後ろの空き行に追加するため、このパネルの
+        内容は変わらない。2つ目以降の新しいパネルは配列をコピーする。
+        """
+        panel = copy.copy(self)
+        panel._values = dict(self._values)
+        panel._digest = None
+        if not self._appendable:
+            panel._reallocate(len(self._dates))
+        self._appendable = False
+        return panel
+
+    def _reserve(self, rows: int) -> None:
+        """rows 行を追加できるように、足りなければ2倍の大きさで確保し直す"""
+        length = self._view[1]
+        if length + rows > len(self._dates):
+            self._reallocate(max(length + rows, 2 * len(self._dates)))
+
+    def _reallocate(self, capacity: int) -> None:
+        """capacity 行の配列を確保し直し、表示の対象の最後までの行をコピーする"""
+        length = self._view[1]
+        dates = np.empty(capacity, dtype="datetime64[ns]")
+        dates[:length] = self._dates[:length]
+        self._dates = dates
+        for field, buffer in self._values.items():
+            grown = np.full((capacity, buffer.shape[1]), np.nan, dtype=buffer.dtype)
+            grown[:length] = buffer[:length]
+            self._values[field] = grown
+
+    def _append(self, dates: np.ndarray, values: Dict[str, np.ndarray]) -> None:
+        """
+        最終日より後の日付の行を追加する (償却 O(1))。`_branch` したパネルに使う。
+
+        Args:
+            dates (np.ndarray): 追加する日付 (昇順)。
+            values (Dict[str, np.ndarray]): 項目ごとの (追加する行数, 銘柄数) の配列。
+        """
+        dates = np.asarray(dates, dtype="datetime64[ns]")
+        if not len(dates):
+            return
+        start, length = self._view
+        if length and dates[0] <= self._dates[length - 1]:
+            raise ValueError("最終日より後の日付だけを追加できます。")
+        self._reserve(len(dates))
+        end = length + len(dates)
+        self._dates[length:end] = dates
+        for field in PRICE_FIELDS:
+            self._values[field][length:end] = values[field]
+        self._view = (start, end)
+
+    def _trim_start(self, start: np.datetime64) -> None:
+        """start より前の行を表示の対象から外す (配列はコピーしない)"""
+        current, length = self._view
+        pos = int(np.searchsorted(self._dates[:length], start))
+        self._view = (max(current, pos), length)
+
+    def update(self, histories: Dict[str, pd.DataFrame]) -> "PricePanel | None":
+        """
+        新しい履歴のうち、最終日より後の足だけを追加したパネルを返す。
+
+        このパネルは変更せず、配列を共有する新しいパネルに追加する。
+        最終日以前の足が変わっていた場合 (配当・分割による調整や、休場日の違いで
+        最終日の行が埋まった場合など) は None を返すので、呼び出し側で作り直すこと。
+
+        Args:
+            histories (Dict[str, pd.DataFrame]): ティッカーごとの最新の履歴。
+
+        Returns:
+            PricePanel | None: 追加したパネル。追加で対応できない場合は None。
+        """
+        tickers = list(self.tickers)
+        start, length = self._view
+        if length == 0 or set(histories) != set(tickers):
+            return None
+        last = self._dates[length - 1]
+        starts = {
+            ticker: _local_dates(hist.index[:1])[0]
+            for ticker, hist in histories.items()
+            if len(hist)
+        }
+        # 先頭より前の足が増えた場合は追加では対応できない
+        if not starts or min(starts.values()) < self._dates[start]:
+            return None
+        # 配当・分割で過去の足が調整し直された場合は、先頭の足の終値が変わる
+        closes = self._values["Close"]
+        for col, ticker in enumerate(tickers):
+            if ticker not in starts or "Close" not in histories[ticker].columns:
+                continue
+            row = int(np.searchsorted(self._dates[:length], starts[ticker]))
+            if row == length or self._dates[row] != starts[ticker]:
+                continue
+            close = closes.dtype.type(histories[ticker]["Close"].iloc[0])
+            if not np.array_equal(closes[row, col], close, equal_nan=True):
+                return None
+
+        # 最終日以降の足だけをそろえる
+        tails = {ticker: _tail_from(hist, last) for ticker, hist in histories.items()}
+        dates, values = _aligned(tails, tickers)
+
+        # 最終日の行が変わっていないことを確認する
+        if not len(dates) or dates[0] != last:
+            return None
+        for field in PRICE_FIELDS:
+            current = self._values[field][length - 1]
+            if not np.array_equal(current, values[field][0], equal_nan=True):
+                return None
+
+        panel = self._branch()
+        panel._append(dates[1:], {field: v[1:] for field, v in values.items()})
+        panel._trim_start(min(starts.values()))
+        return panel
+
+
+def _source_key(hist: pd.DataFrame) -> tuple:
+    """
+    履歴の内容から決まるキー (行数と、先頭・最終の足の日付と終値)。
+
+    id() は解放されたオブジェクトのものが再利用されるため使わない。
+    最終足の更新・足の追加・過去の足の調整のいずれでも値が変わる。
+    """
+    if hist.empty:
+        return (0,)
+    close = hist["Close"].to_numpy() if "Close" in hist.columns else np.full(1, np.nan)
+    return (
+        len(hist),
+        hist.index[0],
+        hist.index[-1],
+        float(close[0]),
+        float(close[-1]),
+    )
+
+
+_cache = PriceCache(max_bytes=PRICE_PANEL_CACHE_MAX_BYTES)
+_lock = threading.Lock()
+
+
+def get_price_panel_cache() -> PriceCache:
+    """共有の価格パネルのキャッシュを返す"""
+    return _cache
+
+
+def get_price_panel(
+    ticker_list: List[str],
+    period: str = "1y",
+    priority: Priority = Priority.INTERACTIVE,
+) -> PricePanel:
+    """
+    共有の価格ストアの履歴から、(ティッカー, 期間) ごとに共有する価格パネルを返す。
+
+    履歴が更新された場合は、既存のパネルに新しい足だけを追加したパネルに置き換える。
+    既存のパネルは変更しないため、取得済みのパネルや DataFrame の内容は変わらない。
+
+    Args:
+        ticker_list (List[str]): ティッカーシンボルのリスト。
+        period (str, optional): yfinance の period 表記。Defaults to "1y".
+        priority (Priority, optional): 取得の優先度。
+
+    Returns:
+        PricePanel: 価格パネル (呼び出し側で変更しないこと)。
+    """
+    tickers = list(dict.fromkeys(ticker_list))
+    histories = get_price_histories(tickers, period, priority)
+    # 履歴の内容が変わっていない間はパネルも変わらない
+    source = tuple(_source_key(histories[ticker]) for ticker in tickers)
+    key = (tuple(tickers), period)
+
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            cached_source, panel = cached
+            if cached_source == source:
+                return panel
+            # 共有中のパネルは変更せず、新しいパネルに置き換える
+            updated = panel.update(histories)
+            if updated is None:
+                updated = PricePanel.from_histories(histories, tickers)
+            panel = updated
+        else:
+            panel = PricePanel.from_histories(histories, tickers)
+        _cache.set(key, (source, panel), float("inf"))
+    return panel
@@ -0,0 +1,365 @@
+import json
+import os
+import threading
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from services.market_data import (
+    MarketDataProvider,
+    get_provider,
+    period_start,
+    slice_period,
+)
+from services.fetch_scheduler import Priority, get_fetch_scheduler
+from services.metrics import span
+from services.popularity import get_popularity_tracker
+from services.price_cache import EMPTY_PRICE_TTL, get_price_cache, price_ttl
+
+load_dotenv()
+
+# 確定済みの足の終値がこの割合より変わっていたら、配当・分割で調整し直されたとみなす
+ADJUSTMENT_RTOL = 1e-5
+
+
+def _default_store_dir() -> str:
+    """価格ストアの保存先ディレクトリを返す"""
+    store_dir = os.getenv("PRICE_STORE_PATH")
+    if store_dir:
+        return store_dir
+    data_path = os.getenv("DATA_PATH") or "data"
+    return os.path.join(os.path.dirname(__file__), "..", "..", data_path, "prices")
+
+
+class PriceStore:
+    """
+    ティッカー×日付で OHLCV を保存するローカルの列指向 (Parquet) 価格ストア。
+
+    既に保存されている足の最終日以降だけを取得して追記するため、
+    同じ銘柄を何度要求しても全期間の再ダウンロードは発生しない。
+    ただし、配当・分割で過去の足が調整し直された銘柄は取得済み範囲を取り直す。
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(
+        self,
+        store_dir: str | None = None,
+        provider: MarketDataProvider | None = None,
+    ):
+        self.store_dir = store_dir or _default_store_dir()
+        self.provider = provider or get_provider()
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._index_path = os.path.join(self.store_dir, self.INDEX_FILE)
+        self._index_lock = threading.Lock()
+        self._ticker_locks: dict[str, threading.Lock] = {}
+        self._index = self._load_index()
+
+    # --------------------------------------------------
+    # index (取得済み範囲の管理)
+    # --------------------------------------------------
+    def _load_index(self) -> dict:
+        if not os.path.exists(self._index_path):
+            return {}
+        with open(self._index_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self) -> None:
+        tmp_path = f"{self._index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, self._index_path)
+
+    def _update_index(self, ticker: str, covered_start: str | None) -> None:
+        with self._index_lock:
+            entry = self._index.get(ticker, {})
+            if covered_start is not None:
+                entry["start"] = covered_start
+            entry["updated"] = datetime.now(timezone.utc).isoformat()
+            self._index[ticker] = entry
+            self._save_index()
+
+    def _lock_for(self, ticker: str) -> threading.Lock:
+        with self._index_lock:
+            return self._ticker_locks.setdefault(ticker, threading.Lock())
+
+    # --------------------------------------------------
+    # storage
+    # --------------------------------------------------
+    def _path_for(self, ticker: str) -> str:
+        safe_name = ticker.replace("/", "_").replace("^", "_")
+        return os.path.join(self.store_dir, f"{safe_name}.parquet")
+
+    def load(self, ticker: str) -> pd.DataFrame:
+        """保存済みの履歴を読み込む (未保存なら空の DataFrame)"""
+        path = self._path_for(ticker)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_parquet(path)
+
+    def _write(self, ticker: str, hist: pd.DataFrame) -> None:
+        path = self._path_for(ticker)
+        tmp_path = f"{path}.tmp"
+        hist.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+    def covers(self, ticker: str, hist: pd.DataFrame, period: str) -> bool:
+        """保存済みの範囲が period をカバーしているか"""
+        covered_start = self._index.get(ticker, {}).get("start")
+        if hist.empty or covered_start is None:
+            return False
+        if covered_start == "max":
+            return True
+        if period == "max":
+            return False
+        start = period_start(period, pd.Timestamp.now(tz=hist.index.tz))
+        return pd.Timestamp(covered_start, tz=hist.index.tz) <= start
+
+    def _covered_start(self, ticker: str, fetched: pd.DataFrame, period: str) -> str:
+        """period 全体を取得した後の、取得済み範囲の開始日"""
+        if period == "max":
+            return "max"
+        covered_start = period_start(period, fetched.index[-1]).strftime("%Y-%m-%d")
+        previous = self._index.get(ticker, {}).get("start")
+        if previous == "max" or (previous is not None and previous < covered_start):
+            return previous
+        return covered_start
+
+    def tickers(self) -> List[str]:
+        """保存済みのティッカー"""
+        with self._index_lock:
+            return [t for t in self._index if os.path.exists(self._path_for(t))]
+
+    def covered_start(self, ticker: str) -> str | None:
+        """取得済み範囲の開始日 ("max" は全期間)"""
+        return self._index.get(ticker, {}).get("start")
+
+    def restore(self, ticker: str, hist: pd.DataFrame, covered_start: str) -> bool:
+        """
+        スナップショットなど外部の履歴を取り込む。
+
+        保存済みの足と結合し (重複する日は保存済みの足を残す)、取得済み範囲は
+        広い方を残す。保存済みの方が新しく範囲も広い場合は何もしない。
+
+        Returns:
+            bool: ストアを更新したかどうか。
+        """
+        with self._lock_for(ticker):
+            stored = self.load(ticker)
+            previous = self.covered_start(ticker)
+            wider = previous is None or (
+                previous != "max"
+                and (covered_start == "max" or covered_start < previous)
+            )
+            newer = stored.empty or hist.index[-1] > stored.index[-1]
+            if not (wider or newer):
+                return False
+            self._write(ticker, self._merge(hist, stored))
+            self._update_index(ticker, covered_start if wider else previous)
+            return True
+
+    # --------------------------------------------------
+    # fetch
+    # --------------------------------------------------
+    @staticmethod
+    def _merge(stored: pd.DataFrame, fetched: pd.DataFrame) -> pd.DataFrame:
+        """新しく取得した足で重複日を上書きしつつ結合する"""
+        if stored.empty:
+            return fetched
+        if fetched.empty:
+            return stored
+        merged = pd.concat([stored, fetched])
+        merged = merged[~merged.index.duplicated(keep="last")]
+        return merged.sort_index()
+
+    @staticmethod
+    def _readjusted(stored: pd.DataFrame, fetched: pd.DataFrame) -> bool:
+        """
+        差分取得した足で、保存済みの確定した足 (最終足の1つ前) の終値が変わったか。
+
+        yfinance の調整後の価格は、配当・分割があると過去の足すべてが
+        調整し直されるため、保存済みの足にそのまま追記すると継ぎ目でずれる。
+        """
+        if len(stored) < 2 or fetched.empty:
+            return False
+        check_date = stored.index[-2]
+        if check_date not in fetched.index:
+            return False
+        before = float(stored.at[check_date, "Close"])
+        after = float(fetched.at[check_date, "Close"])
+        return abs(after - before) > ADJUSTMENT_RTOL * abs(before)
+
+    def get_histories(
+        self, ticker_list: List[str], period: str = "1y"
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        複数ティッカーの履歴を period 分返す。足りない足だけをまとめて取得し、ストアに追記する。
+
+        差分取得は開始日ごと、全期間取得は period ごとにまとめて
+        プロバイダの一括取得に渡す。差分取得で確定済みの足が調整し直されていた
+        銘柄は、取得済み範囲を取り直して保存済みの足を置き換える。
+
+        Args:
+            ticker_list (List[str]): ティッカーシンボルのリスト。
+            period (str, optional): yfinance の period 表記。Defaults to "1y".
+
+        Returns:
+            Dict[str, pd.DataFrame]: ティッカーをキーとした OHLCV の辞書 (index は Date)。
+        """
+        tickers = list(dict.fromkeys(ticker_list))
+
+        with ExitStack() as stack:
+            # デッドロックを避けるため常に同じ順序でロックする
+            for ticker in sorted(tickers):
+                stack.enter_context(self._lock_for(ticker))
+
+            stored = {ticker: self.load(ticker) for ticker in tickers}
+
+            delta_groups: Dict[str, List[str]] = {}
+            full_fetch: List[str] = []
+            for ticker in tickers:
+                if self.covers(ticker, stored[ticker], period):
+                    # 最終足を含めて取り直し、当日の途中足も更新する。その1つ前の
+                    # 確定済みの足も取り、調整し直されていないかを確認する
+                    start = stored[ticker].index[-2:][0].strftime("%Y-%m-%d")
+                    delta_groups.setdefault(start, []).append(ticker)
+                else:
+                    full_fetch.append(ticker)
+
+            fetched: Dict[str, pd.DataFrame] = {}
+            covered: Dict[str, str | None] = {}
+            readjusted: Dict[str, List[str]] = {}
+            provider_name = type(self.provider).__name__
+            for start, group in delta_groups.items():
+                with span("fetch", provider=provider_name, kind="delta"):
+                    delta = self.provider.bulk_history(group, start=start)
+                for ticker, hist in delta.items():
+                    fetched[ticker] = hist
+                    covered[ticker] = None
+                    if self._readjusted(stored[ticker], hist):
+                        covered_start = self.covered_start(ticker)
+                        readjusted.setdefault(covered_start, []).append(ticker)
+            replaced = set()
+            for covered_start, group in readjusted.items():
+                kwargs = (
+                    {"period": "max"}
+                    if covered_start == "max"
+                    else {"start": covered_start}
+                )
+                with span("fetch", provider=provider_name, kind="readjust"):
+                    full = self.provider.bulk_history(group, **kwargs)
+                for ticker, hist in full.items():
+                    # 取り直せなかった場合は差分を追記する
+                    if not hist.empty:
+                        fetched[ticker] = hist
+                        replaced.add(ticker)
+            if full_fetch:
+                with span("fetch", provider=provider_name, kind="full"):
+                    full = self.provider.bulk_history(full_fetch, period=period)
+                for ticker, hist in full.items():
+                    fetched[ticker] = hist
+                    if not hist.empty:
+                        covered[ticker] = self._covered_start(ticker, hist, period)
+
+            histories = {}
+            for ticker in tickers:
+                hist = fetched.get(ticker, pd.DataFrame())
+                merged = stored[ticker]
+                if not hist.empty:
+                    merged = hist if ticker in replaced else self._merge(merged, hist)
+                    self._write(ticker, merged)
+                    self._update_index(ticker, covered.get(ticker))
+                histories[ticker] = slice_period(merged, period)
+            return histories
+
+    def get_history(self, ticker: str, period: str = "1y") -> pd.DataFrame:
+        """1ティッカーの履歴を period 分返す"""
+        return self.get_histories([ticker], period)[ticker]
+
+
+_price_store: PriceStore | None = None
+_price_store_lock = threading.Lock()
+
+
+def get_price_store() -> PriceStore:
+    """プロセス内で共有する PriceStore を返す"""
+    global _price_store
+    with _price_store_lock:
+        if _price_store is None:
+            _price_store = PriceStore()
+        return _price_store
+
+
+def get_price_histories(
+    ticker_list: List[str],
+    period: str = "1y",
+    priority: Priority = Priority.INTERACTIVE,
+    refresh: bool = False,
+) -> Dict[str, pd.DataFrame]:
+    """
+    共有の価格ストア経由で複数ティッカーの履歴をまとめて取得する。
+
+    取引所のセッションに応じた有効期限のキャッシュにあるものはそのまま返し、
+    ないものだけを取得スケジューラ経由で価格ストアから取得する。同じ
+    (ティッカー, 期間) を取得中のセッションがあれば、その結果を共有する。
+    返す DataFrame はセッション間で共有されるため、呼び出し側で変更しないこと。
+    refresh=True の場合はキャッシュを使わずに取得し、キャッシュを更新する。
+    空の履歴は `EMPTY_PRICE_TTL` 秒だけキャッシュする。
+    画面表示のための取得は、先読みのために人気度として記録する。
+    """
+    if priority == Priority.INTERACTIVE:
+        get_popularity_tracker().record(ticker_list, period)
+    cache = get_price_cache()
+    histories: Dict[str, pd.DataFrame] = {}
+    missing: List[tuple] = []
+    for ticker in dict.fromkeys(ticker_list):
+        hist = None if refresh else cache.get((ticker, period))
+        if hist is None:
+            missing.append((ticker, period))
+        else:
+            histories[ticker] = hist
+
+    def fetch(keys: List[tuple]) -> Dict[tuple, pd.DataFrame]:
+        fetched = get_price_store().get_histories([key[0] for key in keys], period)
+        for ticker, hist in fetched.items():
+            # 空の履歴は一時的な取得の失敗のことがあるため、すぐに取り直せるようにする
+            ttl = EMPTY_PRICE_TTL if hist.empty else price_ttl([ticker])
+            cache.set((ticker, period), hist, ttl)
+        return {(ticker, period): hist for ticker, hist in fetched.items()}
+
+    if missing:
+        results = get_fetch_scheduler().run_batch(missing, fetch, priority)
+        for (ticker, _), hist in results.items():
+            histories[ticker] = hist if hist is not None else pd.DataFrame()
+
+    return {ticker: histories[ticker] for ticker in dict.fromkeys(ticker_list)}
+
+
+def get_price_history(ticker: str, period: str = "1y") -> pd.DataFrame:
+    """共有の価格ストア経由で履歴を取得する"""
+    return get_price_histories([ticker], period)[ticker]
+
+
+def warm_price_cache(tickers: List[str], periods: List[str]) -> int:
+    """
+    価格ストアに保存済みの足を、取得せずに価格キャッシュへ載せる。
+
+    保存済みの範囲が期間をカバーしていない (ティッカー, 期間) は載せない。
+
+    Returns:
+        int: キャッシュに載せた (ティッカー, 期間) の数。
+    """
+    store = get_price_store()
+    cache = get_price_cache()
+    warmed = 0
+    for ticker in tickers:
+        hist = store.load(ticker)
+        for period in periods:
+            if not hist.empty and store.covers(ticker, hist, period):
+                sliced = slice_period(hist, period)
+                cache.set((ticker, period), sliced, price_ttl([ticker]))
+                warmed += 1
+    return warmed
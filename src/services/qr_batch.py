@@ -0,0 +1,290 @@
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List
+
+import numpy as np
+import qrcode
+from dotenv import load_dotenv
+from PIL import Image
+
+from services.export import ExportFile, export_archive
+from services.metrics import span
+
+load_dotenv()
+
+# QRコードの周りの余白 (モジュール数)
+BORDER = 4
+# 一括生成で1つのジョブにまとめる数
+CHUNK_SIZE = 200
+# これ以上の数を生成する場合だけワーカープロセスで並列に生成する (起動の時間のため)
+QR_PARALLEL_MIN = int(os.getenv("QR_PARALLEL_MIN", "500"))
+# 一括生成に使うワーカープロセスの数
+QR_WORKERS = int(os.getenv("QR_WORKERS", str(os.cpu_count() or 2)))
+# 生成済みの画像を残しておく合計サイズ (バイト)
+QR_CACHE_MAX_BYTES = int(os.getenv("QR_CACHE_MAX_BYTES", str(256 * 1024**2)))
+# 一括生成できる最大の数
+QR_BATCH_MAX = int(os.getenv("QR_BATCH_MAX", "20000"))
+
+
+def _default_cache_dir() -> str:
+    """生成済みの QR コードの保存先ディレクトリを返す"""
+    cache_dir = os.getenv("QR_CACHE_PATH")
+    if cache_dir:
+        return cache_dir
+    data_path = os.getenv("DATA_PATH") or "data"
+    return os.path.join(os.path.dirname(__file__), "..", "..", data_path, "qrcodes")
+
+
+def qr_key(text: str, version: int, size: int) -> str:
+    """(テキスト, バージョン, サイズ) から決まる画像のハッシュ"""
+    payload = f"{version}:{size}:{BORDER}:L:{text}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def render_qr(text: str, version: int, size: int) -> bytes:
+    """
+    QR コードを size × size ピクセルの PNG にする。
+
+    1モジュールの大きさ (box_size) を size に収まる最大の整数にして描画し、
+    余りは白い余白にする。リサイズしないため、モジュールの境界がぼやけない。
+
+    Args:
+        text (str): 埋め込むテキスト。
+        version (int): QR コードのバージョン (1～40)。収まらない場合は大きくなる。
+        size (int): 画像の一辺のピクセル数。
+
+    Returns:
+        bytes: 1ビットの PNG。
+    """
+    qr = qrcode.QRCode(
+        version=version,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        border=BORDER,
+    )
+    qr.add_data(text)
+    qr.make(fit=True)
+
+    # True が白 (モード "1" の画素値)
+    pixels = ~np.array(qr.get_matrix(), dtype=bool)
+    box_size = max(size // pixels.shape[0], 1)
+    pixels = pixels.repeat(box_size, axis=0).repeat(box_size, axis=1)
+    pad = max(size - pixels.shape[0], 0)
+    before = pad // 2
+    pixels = np.pad(pixels, (before, pad - before), constant_values=True)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _cache_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, key[:2], f"{key}.png")
+
+
+def _read_cached(cache_dir: str, key: str) -> bytes | None:
+    try:
+        with open(_cache_path(cache_dir, key), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_cached(cache_dir: str, key: str, png: bytes) -> None:
+    path = _cache_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+
+
+def qr_png(text: str, version: int = 1, size: int = 480) -> bytes:
+    """
+    QR コードの PNG を返す。同じ (テキスト, バージョン, サイズ) は作り直さない。
+
+    Args:
+        text (str): 埋め込むテキスト。
+        version (int, optional): QR コードのバージョン。Defaults to 1.
+        size (int, optional): 画像の一辺のピクセル数。Defaults to 480.
+
+    Returns:
+        bytes: PNG。
+    """
+    cache_dir = _default_cache_dir()
+    key = qr_key(text, version, size)
+    png = _read_cached(cache_dir, key)
+    if png is None:
+        with span("qr_render"):
+            png = render_qr(text, version, size)
+        _write_cached(cache_dir, key, png)
+    return png
+
+
+def _render_chunk(
+    texts: List[str], version: int, size: int, cache_dir: str
+) -> List[bytes]:
+    """ワーカープロセスでまとめて生成し、キャッシュにも書き出す"""
+    results = []
+    for text in texts:
+        png = render_qr(text, version, size)
+        _write_cached(cache_dir, qr_key(text, version, size), png)
+        results.append(png)
+    return results
+
+
+def _prune(cache_dir: str) -> None:
+    """合計サイズが上限を超えたら、古い画像から削除する"""
+    entries = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if name.endswith(".png"):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_atime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= QR_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def generate_batch(
+    texts: List[str],
+    version: int = 1,
+    size: int = 480,
+    parallel: bool | None = None,
+) -> Iterator[bytes]:
+    """
+    テキストのリストの QR コードを、入力の順に1つずつ返す。
+
+    キャッシュにないものだけを生成し、数が多い場合はワーカープロセスで
+    並列に生成する。結果は生成できたものから順に返すため、全体を
+    メモリに溜めずに ZIP などへ書き出せる。
+
+    Args:
+        texts (List[str]): 埋め込むテキストのリスト。
+        version (int, optional): QR コードのバージョン。Defaults to 1.
+        size (int, optional): 画像の一辺のピクセル数。Defaults to 480.
+        parallel (bool | None, optional): 並列に生成するかどうか。
+            省略時は生成する数が `QR_PARALLEL_MIN` 以上のとき。
+
+    Yields:
+        bytes: 入力と同じ順の PNG。
+    """
+    cache_dir = _default_cache_dir()
+    cached = [_read_cached(cache_dir, qr_key(t, version, size)) for t in texts]
+    missing = [text for text, png in zip(texts, cached) if png is None]
+    if parallel is None:
+        parallel = len(missing) >= QR_PARALLEL_MIN and QR_WORKERS > 1
+    chunks = [
+        missing[start : start + CHUNK_SIZE]
+        for start in range(0, len(missing), CHUNK_SIZE)
+    ]
+
+    def rendered_chunks() -> Iterator[List[bytes]]:
+        if not parallel:
+            for chunk in chunks:
+                yield _render_chunk(chunk, version, size, cache_dir)
+            return
+        # Streamlit のサーバースレッドを fork しないように spawn で起動する
+        with ProcessPoolExecutor(
+            max_workers=min(QR_WORKERS, len(chunks)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            yield from executor.map(
+                _render_chunk,
+                chunks,
+                [version] * len(chunks),
+                [size] * len(chunks),
+                [cache_dir] * len(chunks),
+            )
+
+    rendered = (png for chunk in rendered_chunks() for png in chunk)
+    with span("qr_batch", parallel=str(parallel).lower()):
+        for png in cached:
+            yield png if png is not None else next(rendered)
+    if missing:
+        _prune(cache_dir)
+
+
+def csv_columns(data: bytes) -> List[str]:
+    """CSV の列名"""
+    reader = csv.reader(io.StringIO(data.decode("utf-8-sig")))
+    return next(reader, [])
+
+
+def read_texts(data: bytes, file_name: str, column: str | None = None) -> List[str]:
+    """
+    アップロードされた CSV またはテキストファイルから、埋め込むテキストを読み込む。
+
+    CSV は `column` の列 (省略時は最初の列) を、テキストファイルは空でない行を使う。
+    """
+    text = data.decode("utf-8-sig")
+    if not file_name.lower().endswith(".csv"):
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    rows = list(csv.DictReader(io.StringIO(text)))
+    if not rows:
+        return []
+    column = column or next(iter(rows[0]))
+    return [row[column].strip() for row in rows if (row.get(column) or "").strip()]
+
+
+def _entry_name(index: int, text: str) -> str:
+    """ZIP 内のファイル名 (番号と、テキストのファイル名に使える部分)"""
+    slug = re.sub(r"[^0-9A-Za-z._-]+", "_", text).strip("_")[:40]
+    return f"{index:05d}_{slug}.png" if slug else f"{index:05d}.png"
+
+
+def export_qr_zip(
+    texts: List[str],
+    version: int = 1,
+    size: int = 480,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> ExportFile:
+    """
+    QR コードをまとめた ZIP を作成する。同じ内容の ZIP は作り直さない。
+
+    画像は生成できたものから順に ZIP へ書き出し、番号・ファイル名・テキストの
+    対応を index.csv に書く。
+
+    Args:
+        texts (List[str]): 埋め込むテキストのリスト。
+        version (int, optional): QR コードのバージョン。Defaults to 1.
+        size (int, optional): 画像の一辺のピクセル数。Defaults to 480.
+        on_progress (Callable[[int, int], None] | None, optional):
+            (書き出した数, 全体の数) で呼ばれる関数。
+
+    Returns:
+        ExportFile: 作成済みの ZIP。
+    """
+    if len(texts) > QR_BATCH_MAX:
+        raise ValueError(f"Too many QR codes: {len(texts)} > {QR_BATCH_MAX}")
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(qr_key(text, version, size).encode("ascii"))
+
+    def entries() -> Iterator[tuple[str, bytes]]:
+        index = io.StringIO()
+        writer = csv.writer(index)
+        writer.writerow(["file", "text"])
+        for i, (text, png) in enumerate(
+            zip(texts, generate_batch(texts, version, size))
+        ):
+            name = _entry_name(i + 1, text)
+            writer.writerow([name, text])
+            yield name, png
+            if on_progress is not None:
+                on_progress(i + 1, len(texts))
+        yield "index.csv", index.getvalue().encode("utf-8")
+
+    return export_archive(entries(), digest.hexdigest()[:24], f"qrcodes_{size}px")
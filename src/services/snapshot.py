@@ -0,0 +1,264 @@
+import argparse
+import io
+import json
+import logging
+import os
+import threading
+import zipfile
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from services.fetch_scheduler import Priority
+from services.forecast_models import ForecastModelStore
+from services.market_data import OfflineProvider
+from services.metrics import span
+from services.price_store import (
+    get_price_histories,
+    get_price_store,
+    warm_price_cache,
+)
+from services.startup import snapshot_path
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+# 取り込み済みのスナップショットを記録するファイル (価格ストアのディレクトリに置く)
+IMPORTED_FILE = "snapshot.json"
+# 起動時に価格キャッシュへ載せておく期間
+SNAPSHOT_WARM_PERIODS = [
+    p.strip() for p in os.getenv("SNAPSHOT_WARM_PERIODS", "1y").split(",") if p.strip()
+]
+# 起動後にスナップショットの銘柄の最新の足をバックグラウンドで取得するかどうか
+SNAPSHOT_REFRESH = os.getenv("SNAPSHOT_REFRESH", "true").lower() in ("1", "true", "yes")
+
+_startup_loaded = False
+_startup_lock = threading.Lock()
+
+
+@dataclass
+class SnapshotManifest:
+    """
+    スナップショットの内容。
+
+    Args:
+        created_at (str): 作成日時 (UTC, ISO 8601)。
+        tickers (Dict[str, dict]): ティッカーと、取得済み範囲の開始日 ("start")・
+            最後の足の日付 ("last")・ZIP 内のパス ("path")。
+        models (List[str]): 予測モデルの保存先からの相対パス。
+        version (int): 形式のバージョン。
+    """
+
+    created_at: str
+    tickers: Dict[str, dict] = field(default_factory=dict)
+    models: List[str] = field(default_factory=list)
+    version: int = SNAPSHOT_VERSION
+
+
+def _model_files(model_dir: str) -> List[str]:
+    """予測モデルの保存先にあるモデルファイルの相対パス"""
+    if not os.path.isdir(model_dir):
+        return []
+    paths = []
+    for root, _, names in os.walk(model_dir):
+        for name in names:
+            if name.endswith(".json"):
+                full_path = os.path.join(root, name)
+                paths.append(os.path.relpath(full_path, model_dir).replace(os.sep, "/"))
+    return sorted(paths)
+
+
+def export_snapshot(path: str | None = None, tickers: List[str] | None = None) -> str:
+    """
+    価格ストアと学習済みの予測モデルをスナップショットに書き出す。
+
+    一時ファイルに書いてから置き換えるため、読み込み中のプロセスが
+    書きかけのファイルを読むことはない。
+
+    Args:
+        path (str | None, optional): 書き出し先。省略時は `SNAPSHOT_PATH`。
+        tickers (List[str] | None, optional): 含めるティッカー。省略時は保存済みの全銘柄。
+
+    Returns:
+        str: 書き出したスナップショットのパス。
+    """
+    path = path or snapshot_path()
+    store = get_price_store()
+    model_dir = ForecastModelStore().model_dir
+    manifest = SnapshotManifest(created_at=datetime.now(timezone.utc).isoformat())
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with span("snapshot", kind="export"):
+        try:
+            with zipfile.ZipFile(tmp_path, "w") as zf:
+                for ticker in tickers or store.tickers():
+                    hist = store.load(ticker)
+                    covered_start = store.covered_start(ticker)
+                    if hist.empty or covered_start is None:
+                        continue
+                    arcname = f"prices/{len(manifest.tickers)}.parquet"
+                    # Parquet は圧縮済みのため、ZIP では圧縮しない
+                    zf.writestr(arcname, hist.to_parquet(), zipfile.ZIP_STORED)
+                    manifest.tickers[ticker] = {
+                        "start": covered_start,
+                        "last": hist.index[-1].strftime("%Y-%m-%d"),
+                        "path": arcname,
+                    }
+                for relpath in _model_files(model_dir):
+                    zf.write(
+                        os.path.join(model_dir, relpath),
+                        f"models/{relpath}",
+                        zipfile.ZIP_DEFLATED,
+                    )
+                    manifest.models.append(relpath)
+                zf.writestr(MANIFEST_FILE, json.dumps(asdict(manifest), indent=2))
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return path
+
+
+def read_manifest(path: str) -> SnapshotManifest:
+    """スナップショットの内容を読み込む"""
+    with zipfile.ZipFile(path) as zf:
+        data = json.loads(zf.read(MANIFEST_FILE))
+    if data.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {data.get('version')}")
+    return SnapshotManifest(**data)
+
+
+def _snapshot_id(path: str) -> str:
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def import_snapshot(path: str | None = None, force: bool = False) -> SnapshotManifest:
+    """
+    スナップショットを価格ストアと予測モデルの保存先に取り込む。
+
+    価格はティッカーごとに保存済みの足と結合し、保存済みの方が新しい銘柄は
+    そのまま残す。予測モデルはまだないものだけを書き出す。同じファイルを
+    取り込み済みなら (force=True でない限り) 何もしない。
+
+    Args:
+        path (str | None, optional): スナップショットのパス。省略時は `SNAPSHOT_PATH`。
+        force (bool, optional): 取り込み済みでも取り込み直すかどうか。
+
+    Returns:
+        SnapshotManifest: スナップショットの内容。
+    """
+    path = path or snapshot_path()
+    store = get_price_store()
+    marker_path = os.path.join(store.store_dir, IMPORTED_FILE)
+    snapshot_id = _snapshot_id(path)
+    manifest = read_manifest(path)
+    if not force and os.path.exists(marker_path):
+        with open(marker_path, encoding="utf-8") as f:
+            if json.load(f).get("id") == snapshot_id:
+                return manifest
+
+    model_dir = os.path.abspath(ForecastModelStore().model_dir)
+    restored = 0
+    with span("snapshot", kind="import"), zipfile.ZipFile(path) as zf:
+        for ticker, entry in manifest.tickers.items():
+            hist = pd.read_parquet(io.BytesIO(zf.read(entry["path"])))
+            restored += store.restore(ticker, hist, entry["start"])
+        for relpath in manifest.models:
+            target = os.path.abspath(os.path.join(model_dir, relpath))
+            # ZIP 内のパスで保存先の外に書き出さない
+            if os.path.commonpath([model_dir, target]) != model_dir:
+                continue
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as f:
+                    f.write(zf.read(f"models/{relpath}"))
+
+    with open(marker_path, "w", encoding="utf-8") as f:
+        json.dump({"id": snapshot_id, "created_at": manifest.created_at}, f)
+    logger.info(
+        "Snapshot imported: %s (%d/%d tickers updated)",
+        path,
+        restored,
+        len(manifest.tickers),
+    )
+    return manifest
+
+
+def _refresh(tickers: List[str], periods: List[str]) -> None:
+    for period in periods:
+        try:
+            get_price_histories(tickers, period, Priority.PREFETCH, refresh=True)
+        except Exception:
+            logger.exception("Failed to refresh snapshot prices: %s", period)
+
+
+def load_startup_snapshot() -> None:
+    """
+    プロセスで1度だけ、スナップショットがあれば取り込んで価格キャッシュを温める。
+
+    取り込みが終わるまで他のセッションも待つため、最初のセッションから
+    スナップショットの価格を返せる。その後、オフラインでなければ
+    スナップショットの銘柄の最新の足をバックグラウンドで (対話的な取得より
+    低い優先度で) 取得する。
+    """
+    global _startup_loaded
+    with _startup_lock:
+        if _startup_loaded:
+            return
+        _startup_loaded = True
+
+        path = snapshot_path()
+        if not os.path.exists(path):
+            return
+        try:
+            manifest = import_snapshot(path)
+        except Exception:
+            logger.exception("Failed to import snapshot: %s", path)
+            return
+        tickers = list(manifest.tickers)
+        warm_price_cache(tickers, SNAPSHOT_WARM_PERIODS)
+
+    if SNAPSHOT_REFRESH and not isinstance(get_price_store().provider, OfflineProvider):
+        threading.Thread(
+            target=_refresh,
+            args=(tickers, SNAPSHOT_WARM_PERIODS),
+            name="snapshot-refresh",
+            daemon=True,
+        ).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Price/forecast snapshot bundles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("path", nargs="?")
+    export_parser.add_argument(
+        "--tickers", help="comma-separated tickers to fetch before exporting"
+    )
+    export_parser.add_argument("--period", default="max")
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("path", nargs="?")
+    import_parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        tickers = None
+        if args.tickers:
+            tickers = [t.strip() for t in args.tickers.split(",") if t.strip()]
+            get_price_histories(tickers, args.period)
+        print(export_snapshot(args.path, tickers))
+    else:
+        manifest = import_snapshot(args.path, force=args.force)
+        print(f"{len(manifest.tickers)} tickers, {len(manifest.models)} models")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+
+# このモジュールは app.py から毎回読み込まれるため、pandas・yfinance などの
+# 重いモジュールは使う時まで読み込まない
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_background_started = False
+_background_lock = threading.Lock()
+
+
+def snapshot_path() -> str:
+    """スナップショットのパスを返す"""
+    path = os.getenv("SNAPSHOT_PATH")
+    if path:
+        return path
+    data_path = os.getenv("DATA_PATH") or "data"
+    return os.path.join(
+        os.path.dirname(__file__), "..", "..", data_path, "snapshot.zip"
+    )
+
+
+def load_startup_snapshot() -> None:
+    """
+    スナップショットがあれば、最初の描画の前に取り込む。
+
+    スナップショットがない場合は、取り込みに使うモジュールを読み込まない。
+    """
+    if not os.path.exists(snapshot_path()):
+        return
+    from services.snapshot import load_startup_snapshot as load
+
+    load()
+
+
+def _start_background() -> None:
+    from services.prefetch import start_prefetcher
+    from services.submit_form import start_contact_outbox
+
+    for start in (start_prefetcher, start_contact_outbox):
+        try:
+            start()
+        except Exception:
+            logger.exception("Failed to start background service: %s", start.__name__)
+
+
+def start_background_services() -> None:
+    """
+    先読みのワーカーと問い合わせの送信ワーカーを、バックグラウンドで1度だけ起動する。
+
+    どちらも読み込みに時間がかかるため、最初のページを描画した後に呼ぶ。
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    threading.Thread(
+        target=_start_background, name="background-start", daemon=True
+    ).start()
@@ -1,20 +1,79 @@
-import streamlit as st
-import requests
+import logging
 import os
-from typing import Dict, Any
+import random
+import threading
+import time
+from typing import Any, Dict
+
+import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from database.database import (
+    claim_due_contacts,
+    enqueue_contact,
+    mark_contact_failed,
+    mark_contact_sent,
+    next_contact_due,
+)
+from services.metrics import span
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 問い合わせの送信先
+CONTACT_API_ENDPOINT = os.getenv("CONTACT_API_ENDPOINT")
+# 送信の (接続, 応答) のタイムアウト (秒)
+CONTACT_TIMEOUT = (
+    float(os.getenv("CONTACT_CONNECT_TIMEOUT", "3")),
+    float(os.getenv("CONTACT_READ_TIMEOUT", "10")),
+)
+# 再送をあきらめるまでの送信回数
+CONTACT_MAX_ATTEMPTS = int(os.getenv("CONTACT_MAX_ATTEMPTS", "8"))
+# 再送の待ち時間 (秒)。失敗するたびに倍にし、CONTACT_RETRY_MAX で頭打ちにする
+CONTACT_RETRY_BASE = float(os.getenv("CONTACT_RETRY_BASE_SECONDS", "5"))
+CONTACT_RETRY_MAX = float(os.getenv("CONTACT_RETRY_MAX_SECONDS", "3600"))
+# 送信待ちがないときに送信待ちを確認し直す間隔 (秒)
+IDLE_POLL_SECONDS = 60.0
+# 送信できた場合に API が返すメッセージ
+CONTACT_SUCCESS_MESSAGE = "success!"
+# 再送しても結果が変わらない応答 (タイムアウト・レート制限以外のクライアントエラー)
+PERMANENT_STATUS = set(range(400, 500)) - {408, 425, 429}
+
+
+class ContactSendError(Exception):
+    """問い合わせの送信に失敗した (permanent なら再送しない)"""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def _new_session() -> requests.Session:
+    """コネクションを使い回すセッションを作成する"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
 def submit_contact_form_data(
-    name: str, email: str, body: str, from_site: str = "streamlit"
+    name: str,
+    email: str,
+    body: str,
+    from_site: str = "streamlit",
+    endpoint: str | None = None,
+    session: requests.Session | None = None,
 ) -> Dict[str, Any]:
     """
     Submits a contact form by sending the provided data to an API endpoint.
 
-    This function reads the API endpoint from an environment variable,
-    constructs a data payload using the provided arguments, and sends
-    the data using an HTTP POST request. It handles the response and
-    returns a parsed JSON object or an error message.
+    This function constructs a data payload using the provided arguments and
+    sends it with an HTTP POST request (with `CONTACT_TIMEOUT`). It handles
+    the response and returns a parsed JSON object, or raises
+    `ContactSendError` when the submission should be retried or dropped.
 
     Args:
         name (str): The name of the person submitting the form.
@@ -22,24 +81,155 @@ def submit_contact_form_data(
         body (str): The message or content of the form submission.
         from_site (str, optional): Identifies the source of the submission.
                                    Defaults to "streamlit".
+        endpoint (str | None, optional): The API endpoint.
+                                         Defaults to `CONTACT_API_ENDPOINT`.
+        session (requests.Session | None, optional): The session to send with.
 
     Returns:
-        Dict[str, Any]: A dictionary containing the API's response. If the
-                        request is successful, the parsed JSON response is
-                        returned. Otherwise, a dictionary with an error
-                        message is returned.
+        Dict[str, Any]: The parsed JSON response of the API.
+
+    Raises:
+        ContactSendError: If the request fails or the API does not return
+                          the `CONTACT_SUCCESS_MESSAGE` message.
     """
-    # Read env. file
-    load_dotenv()
-    CONTACT_API_ENDPOINT = os.getenv("CONTACT_API_ENDPOINT")
+    endpoint = endpoint or CONTACT_API_ENDPOINT
+    if not endpoint:
+        raise ContactSendError("CONTACT_API_ENDPOINT is not set")
 
     data = {"name": name, "email": email, "body": body, "from_site": from_site}
 
     # HTTP POST method
-    response = requests.post(CONTACT_API_ENDPOINT, data=data)
+    try:
+        response = (session or requests).post(
+            endpoint, data=data, timeout=CONTACT_TIMEOUT
+        )
+    except requests.RequestException as e:
+        raise ContactSendError(f"{type(e).__name__}: {e}") from e
 
     # response message
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return {"message": "An error occurred."}
+    if response.status_code != 200:
+        raise ContactSendError(
+            f"HTTP {response.status_code}",
+            permanent=response.status_code in PERMANENT_STATUS,
+        )
+    try:
+        result = response.json()
+    except ValueError as e:
+        raise ContactSendError(f"Invalid response: {e}") from e
+    message = result.get("message") if isinstance(result, dict) else None
+    if message != CONTACT_SUCCESS_MESSAGE:
+        raise ContactSendError(f"Unexpected response: {message!r}")
+    return result
+
+
+def retry_delay(attempts: int) -> float:
+    """attempts 回失敗した後の再送までの待ち時間 (揺らぎつき)"""
+    delay = min(CONTACT_RETRY_BASE * 2 ** (attempts - 1), CONTACT_RETRY_MAX)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class ContactOutbox:
+    """
+    問い合わせを SQLite の送信待ちに保存し、バックグラウンドで送信する。
+
+    - `enqueue` は保存するだけですぐに戻るため、送信先が遅くても画面は止まらない
+    - 送信に失敗したものは、待ち時間を倍にしながら `max_attempts` 回まで再送する
+    - 送信待ちは DB に残るため、再起動しても失われない
+    """
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        session: requests.Session | None = None,
+        max_attempts: int = CONTACT_MAX_ATTEMPTS,
+    ):
+        self.endpoint = endpoint or CONTACT_API_ENDPOINT
+        self.session = session or _new_session()
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._worker, name="contact-outbox", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def enqueue(
+        self, name: str, email: str, body: str, from_site: str = "streamlit"
+    ) -> int:
+        """
+        問い合わせを送信待ちに保存し、ワーカーを起こす。
+
+        Returns:
+            int: 送信待ちの ID。
+        """
+        entry = {"name": name, "email": email, "body": body, "from_site": from_site}
+        record_id = enqueue_contact(entry, time.time())
+        self._wake.set()
+        return record_id
+
+    def send_due(self) -> int:
+        """送信してよいものをすべて送信し、送信できた数を返す"""
+        # 送信の最大時間が過ぎるまでは、他のワーカーに取り出されない
+        lease = sum(CONTACT_TIMEOUT) + 30
+        sent = 0
+        while not self._stop.is_set():
+            rows = claim_due_contacts(time.time(), lease)
+            if not rows:
+                return sent
+            for row in rows:
+                sent += self._send(row)
+        return sent
+
+    def _send(self, row: dict) -> bool:
+        try:
+            with span("contact_send"):
+                submit_contact_form_data(
+                    row["name"],
+                    row["email"],
+                    row["body"],
+                    row["from_site"],
+                    endpoint=self.endpoint,
+                    session=self.session,
+                )
+        except ContactSendError as e:
+            attempts = row["attempts"] + 1
+            give_up = e.permanent or attempts >= self.max_attempts
+            next_attempt_at = None if give_up else time.time() + retry_delay(attempts)
+            mark_contact_failed(row["id"], str(e), next_attempt_at)
+            log = logger.error if give_up else logger.warning
+            log("Contact %s failed (attempt %d): %s", row["id"], attempts, e)
+            return False
+        mark_contact_sent(row["id"], time.time())
+        return True
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.send_due()
+                due = next_contact_due()
+            except Exception:
+                logger.exception("Contact outbox failed")
+                due = None
+            wait = IDLE_POLL_SECONDS if due is None else due - time.time()
+            self._wake.wait(min(max(wait, 0.0), IDLE_POLL_SECONDS))
+
+
+_outbox: ContactOutbox | None = None
+_outbox_lock = threading.Lock()
+
+
+def start_contact_outbox() -> ContactOutbox:
+    """プロセスで1度だけ送信待ちのワーカーを起動する"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = ContactOutbox()
+            _outbox.start()
+        return _outbox
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# 変化量を計算する期間 (営業日数ではなくカレンダー上の期間でさかのぼる)
+LOOKBACKS = {
+    "weekly": pd.DateOffset(weeks=1),
+    "monthly": pd.DateOffset(months=1),
+    "yearly": pd.DateOffset(years=1),
+}
+# 期間の開始日が休場日などでデータの先頭より前になった場合に許容する日数
+LOOKBACK_TOLERANCE = pd.Timedelta(days=7)
+
+VOLATILITY_COLUMNS = [
+    f"{name}_{kind}" for name in LOOKBACKS for kind in ("change_value", "change_percent")
+]
+
+
+def compute_volatility_table(close: pd.DataFrame) -> pd.DataFrame:
+    """
+    日付×ティッカーの終値から、全ティッカーの変化量と変化率を一括で計算する。
+
+    各ティッカーの最新の足を基準に、1週間・1か月・1年前の時点で
+    最後に付いた終値と比較する。
+
+    Args:
+        close (pd.DataFrame): index が日付、列がティッカーの終値。
+
+    Returns:
+        pd.DataFrame: index がティッカー、列が `StockVolatility` のフィールドの DataFrame。
+                      計算できない値は NaN。
+    """
+    if close.empty:
+        return pd.DataFrame(columns=VOLATILITY_COLUMNS, dtype=float)
+
+    close = close.sort_index()
+    dates = close.index
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    values = close.to_numpy(dtype=float)
+    filled = close.ffill().to_numpy(dtype=float)
+    n_rows, n_cols = values.shape
+    cols = np.arange(n_cols)
+
+    # ティッカーごとの最新の足の位置
+    has_value = ~np.isnan(values)
+    last_pos = n_rows - 1 - np.argmax(has_value[::-1], axis=0)
+    has_any = has_value.any(axis=0)
+    latest = np.where(has_any, filled[last_pos, cols], np.nan)
+    last_dates = dates[last_pos]
+
+    result = {}
+    for name, offset in LOOKBACKS.items():
+        targets = last_dates - offset
+        pos = np.searchsorted(dates.values, targets.values, side="right") - 1
+        in_range = (targets >= dates[0] - LOOKBACK_TOLERANCE) & has_any
+        old = np.where(in_range, filled[np.clip(pos, 0, None), cols], np.nan)
+        # 基準値が 0 の場合も計算しない
+        old = np.where(old == 0, np.nan, old)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            change = latest - old
+            change_percent = change / old * 100
+        result[f"{name}_change_value"] = np.round(change, 2)
+        result[f"{name}_change_percent"] = np.round(change_percent, 2)
+
+    table = pd.DataFrame(result, index=close.columns)
+    table.index.name = "Ticker"
+    return table
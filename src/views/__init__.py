@@ -1,11 +1,6 @@
-from .us_stock_page import us_stock_page
-from .japan_stock_page import japan_stock_page
-from .login_page import login_page
-from .custom_stock_list_page import custom_stock_list_page
-from .data_viewer_page import data_viewer_page
-from .qrcode_page import qrcode_page
-from .contact_me_page import contact_me_page
+import importlib
 
+# ページは初めて参照されたときに読み込む (起動時に全ページの依存を読み込まない)
 __all__ = [
     "us_stock_page",
     "japan_stock_page",
@@ -15,3 +10,13 @@ __all__ = [
     "qrcode_page",
     "contact_me_page",
 ]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        module = importlib.import_module(f".{name}", __name__)
+        page = getattr(module, name)
+        # import でサブモジュールが属性に入るため、以前と同じく関数で上書きする
+        globals()[name] = page
+        return page
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,9 +1,7 @@
 import streamlit as st
-import time
-from typing import Dict, Any
 from email_validator import validate_email, EmailNotValidError
 
-from services.submit_form import submit_contact_form_data
+from services.submit_form import start_contact_outbox
 
 
 def contact_me_page() -> None:
@@ -30,16 +28,11 @@ def contact_me_page() -> None:
                 st.error("Please fill out all required fields.")
             else:
                 try:
-                    valid = validate_email(email, check_deliverability=True)
-                    response: Dict[str, Any] = submit_contact_form_data(
-                        name, email, body
-                    )
-
-                    if response["message"] == "success!":
-                        st.toast("""success!""", icon="✅")
-                        time.sleep(2)
-                    else:
-                        st.error("Some error has occurred.")
-
+                    # 書式だけを確認する (DNS の問い合わせで画面を待たせない)
+                    valid = validate_email(email, check_deliverability=False)
                 except EmailNotValidError as e:
                     st.error(f"Invalid email address. {e}")
+                else:
+                    # 送信待ちに保存して、送信はバックグラウンドで行う
+                    start_contact_outbox().enqueue(name, valid.normalized, body)
+                    st.toast("""success!""", icon="✅")
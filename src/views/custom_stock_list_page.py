@@ -1,42 +1,15 @@
 import streamlit as st
 import time
-import toml
-import json
+
+from components.backtest_view import backtest_component
+from components.export_button import export_component
+from components.forecast_batch import forecast_batch_component
+from services.export import export_mapping, mapping_digest
 
 
 def custom_stock_list_page() -> None:
     """Renders a Create a list of stock prices in a Streamlit application."""
 
-    def generate_download_file(
-        file_type: str, tick_list_dict: dict
-    ) -> tuple[str, bytes, str]:
-        """
-        指定されたファイルタイプのダウンロード用データを生成する。
-
-        Args:
-            file_type (str): 生成するファイルの種類 ("toml" または "json")。
-
-        Returns:
-            tuple[str, bytes, str]:
-                - `filename` (str): Unixタイムスタンプ付きのファイル名（例: "1708175623_ticker_list.toml"）。
-                - `data` (bytes): ダウンロードするファイルのバイナリデータ。
-                - `mime` (str): ファイルのMIMEタイプ（"application/toml" または "application/json"）。
-        """
-
-        timestamp = int(time.time())
-        filename = f"{timestamp}_ticker_list.{file_type}"
-
-        if file_type == "toml":
-            toml_str = toml.dumps(tick_list_dict)
-            toml_bytes = toml_str.encode("utf-8")
-            return filename, toml_bytes, "application/toml"
-        elif file_type == "json":
-            json_str = json.dumps(tick_list_dict, indent=4)
-            json_bytes = json_str.encode("utf-8")
-            return filename, json_bytes, "application/json"
-        else:
-            raise ValueError(f"Invalid file_type: {file_type}")
-
     # --------------------------------------------------
     # main-component
     # --------------------------------------------------
@@ -88,34 +61,14 @@ def custom_stock_list_page() -> None:
 
         st.divider()
 
-        col1, col2 = st.columns(2)
-        with col1:
-            filename_toml, data_toml, mime_toml = generate_download_file(
-                "toml", tick_list_dict
-            )
-            st.download_button(
-                label="Download Tick List as TOML",
-                data=data_toml,
-                file_name=filename_toml,
-                mime=mime_toml,
-                key="download_toml",
-                type="secondary",
-                icon=":material/download:",
-            )
-
-        with col2:
-            filename_json, data_json, mime_json = generate_download_file(
-                "json", tick_list_dict
-            )
-            st.download_button(
-                label="Download Tick List as JSON",
-                data=data_json,
-                file_name=filename_json,
-                mime=mime_json,
-                key="download_json",
-                type="secondary",
-                icon=":material/download:",
-            )
+        export_component(
+            content_digest=mapping_digest(tick_list_dict),
+            build=lambda fmt: export_mapping(
+                tick_list_dict, fmt, f"{int(time.time())}_ticker_list"
+            ),
+            formats={"toml": "TOML", "json": "JSON"},
+            key="ticker_list",
+        )
 
         if st.button(
             "Reset List",
@@ -125,3 +78,17 @@ def custom_stock_list_page() -> None:
         ):
             st.session_state["ticker_list"] = []
             st.rerun()
+
+        st.divider()
+        st.subheader(":material/monitoring: Backtest")
+        backtest_component(st.session_state["ticker_list"])
+
+        st.divider()
+        st.subheader(":material/batch_prediction: Forecast")
+        st.caption("全銘柄を並列に予測し、60日後の予測リターンの高い順に並べます。")
+        forecast_period = st.selectbox(
+            "学習に使う期間", ["1y", "2y", "5y"], key="batch_forecast_period"
+        )
+        forecast_batch_component(
+            st.session_state["ticker_list"], forecast_period, key="list_forecast"
+        )
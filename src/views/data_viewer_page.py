@@ -1,3 +1,4 @@
+import logging
 import streamlit as st
 import pandas as pd
 import os
@@ -13,6 +14,16 @@ from database.database import (
     delete_file_data,
     clear_db,
 )
+from services.dataset_store import (
+    csv_file_name,
+    dataset_to_csv_bytes,
+    load_dataset,
+)
+from services.csv_ingest import UploadValidationError, ingest_csv
+from services.downsample import downsample_series, point_budget
+from services.metrics import span
+
+logger = logging.getLogger(__name__)
 
 
 def data_viewer_page() -> None:
@@ -22,6 +33,7 @@ def data_viewer_page() -> None:
         x_col: str,
         y_col: str,
         graph_title: str,
+        max_points: int = point_budget(950),
     ) -> go.Figure:
         """グラフを作成して返す"""
         fig: go.Figure = make_subplots(
@@ -31,15 +43,16 @@ def data_viewer_page() -> None:
         for selected_id in selected_id_list:
             query_result = get_file_data_by_id(selected_id)
             file_path_temp = query_result["file_path"]
-            df_temp: pd.DataFrame = pd.read_csv(file_path_temp)
+            # 必要な列だけを読み込む
+            df_temp: pd.DataFrame = load_dataset(file_path_temp, [x_col, y_col])
 
             # ファイル名の抽出
-            temp_name: str = os.path.basename(file_path_temp)
+            temp_name: str = query_result["file_name"]
             file_name: str = temp_name.split("_")[split_index]
+            # 横幅に合わせて点数を間引いてから描画する
+            x, y = downsample_series(df_temp[x_col], df_temp[y_col], max_points)
             fig.add_trace(
-                go.Scatter(
-                    x=df_temp[x_col], y=df_temp[y_col], name=file_name, opacity=0.6
-                ),
+                go.Scatter(x=x, y=y, name=file_name, opacity=0.6),
                 row=1,
                 col=1,
             )
@@ -98,38 +111,35 @@ def data_viewer_page() -> None:
                 icon=":material/cloud_upload:",
             ):
                 try:
-                    # file 保存関係
+                    # file 保存関係 (chunk ごとに読み込んで Parquet に書き出す)
                     uploaded_csv_file_name = uploaded_csv_file.name
-                    df = pd.read_csv(uploaded_csv_file, encoding="utf-8")
                     DATA_PATH = st.session_state["data_path"]
-                    csv_file_path = f"{DATA_PATH}/{uploaded_csv_file_name}"
-                    df.to_csv(csv_file_path, index=False)
-
-                    # DB　書き込み関係
-                    parts = uploaded_csv_file_name.split("_")
-                    category = parts[1]
-                    ticker_code = parts[2]
-
-                    # 最後の doc_id を取得して新しい id を決定
-                    last_doc_id = (
-                        max(get_all_file_data(), key=lambda x: x.doc_id)["id"]
-                        if get_all_file_data()
-                        else 0
+                    result = ingest_csv(
+                        uploaded_csv_file, DATA_PATH, uploaded_csv_file_name
                     )
-                    new_id = last_doc_id + 1
 
+                    # DB　書き込み関係 (id は DB 側で採番する)
                     new_data_dict = {
-                        "id": new_id,
                         "file_name": uploaded_csv_file_name,
-                        "category": category,
-                        "ticker_code": ticker_code,
-                        "file_path": (
-                            csv_file_path if uploaded_csv_file is not None else None
+                        "category": result.category,
+                        "ticker_code": result.ticker_code,
+                        "file_path": result.file_path,
+                        "row_count": result.row_count,
+                        "start_date": (
+                            result.start_date.isoformat() if result.start_date else None
+                        ),
+                        "end_date": (
+                            result.end_date.isoformat() if result.end_date else None
                         ),
                     }
                     create_file_data(new_data_dict)
-                    st.success("ファイルが正常に保存されました")
+                    st.success(
+                        f"ファイルが正常に保存されました ({result.row_count} 行, "
+                        f"{result.start_date} ～ {result.end_date})"
+                    )
 
+                except UploadValidationError as e:
+                    st.error(f"ファイルを取り込めませんでした: {e}")
                 except Exception as e:
                     st.error(f"ファイルの保存中にエラーが発生しました: {e}")
 
@@ -178,6 +188,43 @@ def data_viewer_page() -> None:
         if "selected_id_list" not in st.session_state:
             st.session_state.selected_id_list = []
 
+        if st.session_state.selected_id_list:
+            with st.expander(
+                "選択したデータをダウンロード (CSV)", icon=":material/download:"
+            ):
+                # 変換した CSV はセッションに残し、再実行してもボタンが消えないようにする
+                prepared_csv = {
+                    selected_id: prepared
+                    for selected_id, prepared in st.session_state.get(
+                        "prepared_csv", {}
+                    ).items()
+                    if selected_id in st.session_state.selected_id_list
+                }
+                for selected_id in st.session_state.selected_id_list:
+                    query_result = get_file_data_by_id(selected_id)
+                    if query_result is None:
+                        continue
+                    file_path = query_result["file_path"]
+                    prepared = prepared_csv.get(selected_id)
+                    if prepared is not None and prepared[0] != file_path:
+                        prepared = None
+                    if prepared is None and st.button(
+                        f"{query_result['file_name']} をCSVに変換",
+                        key=f"prepare_csv_{selected_id}",
+                    ):
+                        prepared = (file_path, dataset_to_csv_bytes(file_path))
+                        prepared_csv[selected_id] = prepared
+                    if prepared is not None:
+                        st.download_button(
+                            label=f"📥 {query_result['file_name']}",
+                            data=prepared[1],
+                            file_name=csv_file_name(query_result["file_name"]),
+                            mime="text/csv",
+                            key=f"download_csv_{selected_id}",
+                            on_click="ignore",
+                        )
+                st.session_state.prepared_csv = prepared_csv
+
         left_button, right_button = st.columns(2)
 
         if left_button.button(
@@ -195,13 +242,14 @@ def data_viewer_page() -> None:
                 y_col: str = "Close"
                 graph_title: str = "株価データの時間推移"
 
-                fig1: go.Figure = create_plotly_graph(
-                    st.session_state.selected_id_list,
-                    split_index,
-                    x_col,
-                    y_col,
-                    graph_title,
-                )
+                with span("figure_build", page="data_viewer_page"):
+                    fig1: go.Figure = create_plotly_graph(
+                        st.session_state.selected_id_list,
+                        split_index,
+                        x_col,
+                        y_col,
+                        graph_title,
+                    )
                 st.plotly_chart(fig1, use_container_width=True)
 
         if right_button.button(
@@ -221,11 +269,11 @@ def data_viewer_page() -> None:
                         file_path_temp = query_result["file_path"]
                         if os.path.exists(file_path_temp):
                             os.remove(file_path_temp)
-                            print(f"Deleted: {file_path_temp}")
+                            logger.info("Deleted: %s", file_path_temp)
                         else:
-                            print(f"File not found: {file_path_temp}")
+                            logger.warning("File not found: %s", file_path_temp)
                     except Exception as e:
-                        print(f"Error deleting file: {e}")
+                        logger.exception("Error deleting file: %s", e)
 
                     # DB
                     delete_file_data(selected_id)
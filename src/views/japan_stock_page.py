@@ -1,37 +1,80 @@
 import streamlit as st
 import pandas as pd
-import io
-import yfinance as yf
-import jaconv
 import plotly.graph_objects as go
-from prophet import Prophet
+from plotly.subplots import make_subplots
 from datetime import date
+from yfinance.exceptions import YFRateLimitError
+
+from components.chart_range import date_range_component
+from components.export_button import export_component
+from components.forecast_status import forecast_job_component
+from services.downsample import downsample_series, point_budget
+from services.export import export_frame, frame_digest, price_export_frame
+from services.forecast_engine import ENGINES, get_forecast_engine
+from services.forecast_jobs import submit_forecast, to_prophet_frame
+from services.indicators import INDICATORS, OVERLAY_INDICATORS, compute_indicator
+from services.market_data import normalize_ticker
+from services.metrics import span
+from services.price_store import get_price_history
 
 
 def japan_stock_page() -> None:
     """Renders a Japan stock prices in a Streamlit application."""
 
-    def generate_download_csv_file(
-        stock_data: pd.DataFrame, ticker: str
-    ) -> tuple[str, bytes]:
-        # filename
-        today = date.today().strftime("%Y%m%d")
-        ticker = ticker.replace(".T", "")
-        download_file_name = f"{today}_{ticker}_stockData.csv"
-
-        # data
-        stock_data = stock_data.reset_index()
-        stock_data["Date"] = pd.to_datetime(stock_data["Date"]).dt.date
-        extracted_column_list = ["Date", "Close"]
-        download_stock_data = stock_data[extracted_column_list]
+    def create_price_chart(
+        chart_data: pd.DataFrame,
+        indicator_data: dict[str, pd.DataFrame],
+        title: str,
+    ) -> go.Figure:
+        """終値とインジケーターのグラフを作成する (オシレーターは下のパネルに描く)"""
+        panels = [name for name in indicator_data if name not in OVERLAY_INDICATORS]
+        fig = make_subplots(
+            rows=1 + len(panels),
+            cols=1,
+            shared_xaxes=True,
+            vertical_spacing=0.05,
+            row_heights=[3] + [1] * len(panels),
+            subplot_titles=[""] + panels,
+        )
+        start, end = chart_data.index[0], chart_data.index[-1]
 
-        # DataFrameをCSV形式の文字列に変換
-        csv_buffer = io.StringIO()
-        download_stock_data.to_csv(csv_buffer, index=False)
-        download_stock_data_string = csv_buffer.getvalue()
-        download_csv_bytes = download_stock_data_string.encode("utf-8")
+        # 横幅に合わせて点数を間引いてから描画する
+        x, y = downsample_series(
+            chart_data.index, chart_data["Close"], point_budget(800)
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=x,
+                y=y,
+                mode="lines",
+                name="Close",
+                line={"color": "#FFA07A", "width": 2},
+            ),
+            row=1,
+            col=1,
+        )
+        for name, values in indicator_data.items():
+            row = 1 if name in OVERLAY_INDICATORS else 2 + panels.index(name)
+            values = values[(values.index >= start) & (values.index <= end)]
+            for column in values.columns:
+                x, y = downsample_series(
+                    values.index, values[column], point_budget(800)
+                )
+                fig.add_trace(
+                    go.Scatter(x=x, y=y, mode="lines", name=column, line={"width": 1}),
+                    row=row,
+                    col=1,
+                )
 
-        return download_file_name, download_csv_bytes
+        fig.update_layout(
+            title=title,
+            autosize=False,
+            width=800,
+            height=600 + 200 * len(panels),
+        )
+        fig.update_xaxes(title_text="Date", row=1 + len(panels), col=1)
+        fig.update_yaxes(title_text="Close Price", row=1, col=1)
+        return fig
 
     # --------------------------------------------------
     # main-component
@@ -42,6 +85,8 @@ def japan_stock_page() -> None:
         st.session_state["stock_data"] = None
     if "forecast_data" not in st.session_state:
         st.session_state["forecast_data"] = None
+    if "forecast_job_id" not in st.session_state:
+        st.session_state["forecast_job_id"] = None
 
     ticker = st.text_input("ティッカーコードを入力してください（例：7203）")
 
@@ -62,10 +107,15 @@ def japan_stock_page() -> None:
             return
 
         # 入力されたティッカーコードを標準化
-        ticker = jaconv.z2h(ticker, digit=True, ascii=True).upper() + ".T"
+        ticker = normalize_ticker(ticker)
 
-        stock = yf.Ticker(ticker)
-        stock_data = stock.history(period=period)
+        try:
+            stock_data = get_price_history(ticker, period)
+        except YFRateLimitError:
+            st.error(
+                "Yahoo Finance のレートリミットに達しました。後ほど再試行してください。"
+            )
+            return
 
         if not stock_data.empty:
             st.session_state["stock_data"] = stock_data
@@ -88,121 +138,154 @@ def japan_stock_page() -> None:
             "取得したデータをダウンロードしますか？", icon=":material/download:"
         ):
             st.write("ダウンロードされるファイルは、")
-            st.markdown("**`{ダウンロード日}_{証券コード}.csv`** で保存されます。")
-
-            download_file_name, download_csv_bytes = generate_download_csv_file(
-                stock_data=stock_data, ticker=ticker
+            st.markdown(
+                "**`{ダウンロード日}_{証券コード}_stockData`** で保存されます。"
+                " (日付と OHLCV の全列)"
             )
-
-            st.download_button(
-                label="📥 データをダウンロード (CSV)",
-                data=download_csv_bytes,
-                file_name=download_file_name,
-                mime="text/csv",
-                key="download_csv",
-                type="secondary",
+            stem = f"{date.today():%Y%m%d}_{ticker.replace('.T', '')}_stockData"
+            digest = frame_digest(stock_data)
+            export_component(
+                content_digest=digest,
+                build=lambda fmt: export_frame(
+                    stock_data, fmt, stem, digest=digest, prepare=price_export_frame
+                ),
+                formats={"csv": "CSV", "csv.gz": "CSV (gzip)", "parquet": "Parquet"},
+                key="jp_stock_data",
             )
 
         st.write(f"({ticker}) の過去 {period}earの株価情報")
         st.dataframe(stock_data)
 
-        fig = go.Figure()
-        fig.add_trace(
-            go.Scatter(
-                x=stock_data.index,
-                y=stock_data["Close"],
-                mode="lines",
-                name="Close",
-                line={"color": "#FFA07A", "width": 2},
-            )
-        )
-        fig.update_layout(
-            title=f"{ticker} の過去 {period}earの株価",
-            xaxis_title="Date",
-            yaxis_title="Close Price",
-            autosize=False,
-            width=800,
-            height=600,
+        selected_indicators = st.pills(
+            "インジケーター",
+            list(INDICATORS),
+            selection_mode="multi",
+            key="jp_indicators",
         )
+        indicator_params = {name: {} for name in selected_indicators}
+        if "SMA" in indicator_params or "EMA" in indicator_params:
+            col1, col2 = st.columns(2)
+            if "SMA" in indicator_params:
+                indicator_params["SMA"]["window"] = col1.number_input(
+                    "SMA の期間", min_value=2, max_value=200, value=25
+                )
+            if "EMA" in indicator_params:
+                indicator_params["EMA"]["span"] = col2.number_input(
+                    "EMA の期間", min_value=2, max_value=200, value=20
+                )
+
+        # インジケーターは取得済みの全期間で計算し、表示範囲だけを切り出す
+        chart_range = date_range_component(stock_data.index, key="jp_chart_range")
+        indicator_data = {
+            name: compute_indicator(stock_data, ticker, name, **params)
+            for name, params in indicator_params.items()
+        }
+        with span("figure_build", page="japan_stock_page"):
+            fig = create_price_chart(
+                stock_data[chart_range],
+                indicator_data,
+                title=f"{ticker} の過去 {period}earの株価",
+            )
         st.plotly_chart(fig)
 
         with st.expander("将来の株価を予測しますか？", icon=":material/thumb_up:"):
             st.write(
                 """
-                時系列の予測は"prophet"を用いて行います。
+                時系列の予測は、高速な AR モデルまたは"prophet"を用いて行います。
                 株価予測は保証されたものではなく、投資は自己責任で行ってください。
             """
             )
+            engine = st.radio(
+                "予測エンジン",
+                list(ENGINES),
+                format_func=lambda name: ENGINES[name].label,
+                horizontal=True,
+                key="forecast_engine",
+            )
             if st.button(
                 "株価を予測",
                 key="predict_by_prophet",
                 type="primary",
                 icon=":material/trending_up:",
             ):
-                # Prophet の入力データの準備
-                forecast_data = stock_data.reset_index()[["Date", "Close"]]
-                forecast_data.rename(columns={"Date": "ds", "Close": "y"}, inplace=True)
-                forecast_data["ds"] = forecast_data["ds"].dt.tz_localize(None)
-
-                model = Prophet()
-                model.fit(forecast_data)
+                # 予測の入力データの準備 (Prophet の学習はワーカープロセスで行う)
+                forecast_data = to_prophet_frame(stock_data.index, stock_data["Close"])
 
                 # 未来のデータフレームを作成（60日分の予測を行う）
-                future = model.make_future_dataframe(periods=60)
-                forecast = model.predict(future)
+                if engine == "prophet":
+                    st.session_state["forecast_job_id"] = submit_forecast(
+                        ticker, forecast_data, periods=60
+                    )
+                    st.session_state["forecast_data"] = None
+                else:
+                    st.session_state["forecast_job_id"] = None
+                    st.session_state["forecast_data"] = get_forecast_engine(
+                        engine
+                    ).forecast(forecast_data, periods=60, ticker=ticker)
 
-                st.session_state["forecast_data"] = forecast
+        if st.session_state["forecast_job_id"] is not None:
+            result = forecast_job_component(st.session_state["forecast_job_id"])
+            if result is not None:
+                st.session_state["forecast_data"] = result.forecast
+                st.session_state["forecast_job_id"] = None
 
     if st.session_state["forecast_data"] is not None:
         forecast = st.session_state["forecast_data"]
-        fig_forecast = go.Figure()
-        fig_forecast.add_trace(
-            go.Scatter(
-                x=forecast["ds"],
-                y=forecast["yhat"],
-                mode="lines",
-                name="Predicted Close",
-                line={"color": "#008080", "width": 2},
+        with span("figure_build", page="japan_stock_page", chart="forecast"):
+            forecast_x, forecast_y = downsample_series(
+                forecast["ds"], forecast["yhat"], point_budget(1200)
             )
-        )
-        fig_forecast.add_trace(
-            go.Scatter(
-                x=stock_data.index,
-                y=stock_data["Close"],
-                mode="lines",
-                name="Historical Close",
-                line={"color": "#FFA07A", "width": 2},
+            history_x, history_y = downsample_series(
+                stock_data.index, stock_data["Close"], point_budget(1200)
             )
-        )
-        fig_forecast.update_layout(
-            title={
-                "text": f"{st.session_state['ticker']} の株価予測",
-                "font": {"color": "black", "size": 24},
-            },
-            xaxis={
-                "title": {
-                    "text": "Date",
-                    "font": {"color": "black", "size": 18},
+            fig_forecast = go.Figure()
+            fig_forecast.add_trace(
+                go.Scatter(
+                    x=forecast_x,
+                    y=forecast_y,
+                    mode="lines",
+                    name="Predicted Close",
+                    line={"color": "#008080", "width": 2},
+                )
+            )
+            fig_forecast.add_trace(
+                go.Scatter(
+                    x=history_x,
+                    y=history_y,
+                    mode="lines",
+                    name="Historical Close",
+                    line={"color": "#FFA07A", "width": 2},
+                )
+            )
+            fig_forecast.update_layout(
+                title={
+                    "text": f"{st.session_state['ticker']} の株価予測",
+                    "font": {"color": "black", "size": 24},
                 },
-                "tickfont": {"color": "black", "size": 14},
-            },
-            yaxis={
-                "title": {
-                    "text": "Price",
-                    "font": {"color": "black", "size": 18},
+                xaxis={
+                    "title": {
+                        "text": "Date",
+                        "font": {"color": "black", "size": 18},
+                    },
+                    "tickfont": {"color": "black", "size": 14},
                 },
-                "tickfont": {"color": "black", "size": 14},
-            },
-            legend={
-                "font": {
-                    "size": 16,
-                    "color": "black",
-                }
-            },
-            autosize=False,
-            width=1200,
-            height=900,
-        )
+                yaxis={
+                    "title": {
+                        "text": "Price",
+                        "font": {"color": "black", "size": 18},
+                    },
+                    "tickfont": {"color": "black", "size": 14},
+                },
+                legend={
+                    "font": {
+                        "size": 16,
+                        "color": "black",
+                    }
+                },
+                autosize=False,
+                width=1200,
+                height=900,
+            )
 
         st.plotly_chart(fig_forecast)
         st.dataframe(forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]])
@@ -1,8 +1,82 @@
+import hashlib
+import json
+import os
+
 import streamlit as st
-import qrcode
-from PIL import Image
-import io
 
+from components.export_button import export_download_button
+from services.qr_batch import (
+    QR_BATCH_MAX,
+    csv_columns,
+    export_qr_zip,
+    qr_png,
+    read_texts,
+)
+
+# 生成する画像の一辺のピクセル数
+QR_SIZE = 480
+
+
+def _batch_section(version: int) -> None:
+    """CSV・テキストファイルまたは入力したリストから、QRコードをまとめて生成する"""
+    st.subheader("まとめて生成")
+    uploaded = st.file_uploader(
+        "CSV またはテキストファイル (1行に1つ)", type=["csv", "txt"], key="qr_upload"
+    )
+    if uploaded is not None:
+        data = uploaded.getvalue()
+        column = None
+        if uploaded.name.lower().endswith(".csv"):
+            columns = csv_columns(data)
+            if columns:
+                column = st.selectbox("埋め込む列", columns, key="qr_column")
+        texts = read_texts(data, uploaded.name, column)
+    else:
+        lines = st.text_area(
+            "QRコードに埋め込むテキスト (1行に1つ)", height=150, key="qr_lines"
+        )
+        texts = [line.strip() for line in lines.splitlines() if line.strip()]
+
+    st.caption(f"{len(texts)} 件 (最大 {QR_BATCH_MAX} 件)")
+
+    # 作成した ZIP はセッションに残し、再実行してもボタンが消えないようにする
+    state_key = "qr_batch_export"
+    digest = hashlib.sha256(
+        json.dumps([version, QR_SIZE, texts]).encode("utf-8")
+    ).hexdigest()
+    prepared = st.session_state.get(state_key)
+    if prepared is not None and (
+        prepared[0] != digest or not os.path.exists(prepared[1].path)
+    ):
+        prepared = None
+
+    if prepared is None:
+        if not st.button("まとめて生成", disabled=not texts, key="qr_batch_button"):
+            return
+        if len(texts) > QR_BATCH_MAX:
+            st.error(f"一度に生成できるのは {QR_BATCH_MAX} 件までです。")
+            return
+
+        progress = st.progress(0.0, text="QRコードを生成しています...")
+
+        def on_progress(done: int, total: int) -> None:
+            if done == total or done % 100 == 0:
+                progress.progress(done / total, text=f"{done} / {total}")
+
+        try:
+            archive = export_qr_zip(texts, version, QR_SIZE, on_progress=on_progress)
+        except Exception as e:
+            st.error(f"エラーが発生しました: {e}")
+            return
+        progress.empty()
+        prepared = (digest, archive)
+        st.session_state[state_key] = prepared
+
+    export_download_button(
+        prepared[1],
+        key="qr_batch_download",
+        label=f"ZIP をダウンロード ({len(texts)} 件)",
+    )
 
 def qrcode_page() -> None:
     """Renders a QR code Generator in a Streamlit application."""
@@ -22,38 +96,20 @@ def qrcode_page() -> None:
 
     if st.button("QRコードを生成", type="primary"):
         try:
-            qr = qrcode.QRCode(
-                version=version_input,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(text_input)
-            qr.make(fit=True)
-
-            img = qr.make_image(fill_color="black", back_color="white")
-
-            # Pillowでリサイズ (幅または高さを640px以下に制限)
-            max_size = 480
-            img = img.resize((max_size, max_size), Image.Resampling.LANCZOS)
-
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            buffer.seek(0)
+            # 480px に合わせたモジュールの大きさで描画する (リサイズしない)
+            png = qr_png(text_input, int(version_input), QR_SIZE)
 
             _, col, _ = st.columns([2, 2, 2])
 
-            col.image(
-                Image.open(buffer),
-                caption="生成されたQRコード",
-                use_container_width=True,
-            )
+            col.image(png, caption="生成されたQRコード", use_container_width=True)
 
             col.download_button(
                 label="QRコードをダウンロード",
-                data=buffer,
+                data=png,
                 file_name="qrcode.png",
                 mime="image/png",
             )
         except Exception as e:
             st.error(f"エラーが発生しました: {e}")
+
+    _batch_section(int(version_input))
@@ -1,14 +1,26 @@
-import pandas as pd
-import yfinance as yf
 import streamlit as st
 import time
+from datetime import date
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from streamlit_cookies_controller import CookieController
-from prophet import Prophet
-from prophet.plot import plot_plotly
 from typing import List
 
+from components.chart_range import date_range_component
+from components.correlation_heatmap import correlation_component
+from components.export_button import export_component
+from components.forecast_batch import forecast_batch_component
+from components.forecast_chart import forecast_figure
+from components.forecast_status import forecast_job_component
+from services.downsample import downsample_series, point_budget
+from services.export import export_panel
+from services.forecast_engine import ENGINES, get_forecast_engine
+from services.forecast_jobs import submit_forecast, to_prophet_frame
+from services.metrics import span
+from services.popularity import WATCHLIST_WEIGHT, get_popularity_tracker
+from services.price_panel import PricePanel, get_price_panel
+from services.StockAnalyzer import display_volatility_dashboard
+
 
 def us_stock_page() -> None:
     """Renders a USA stock prices in a Streamlit application."""
@@ -22,10 +34,9 @@ def us_stock_page() -> None:
         time.sleep(1.5)
         st.session_state["toast_flag"] = True
 
-    @st.cache_data
-    def get_stock_data(ticker_list: List[str], period: str = "1y") -> pd.DataFrame:
+    def get_stock_data(ticker_list: List[str], period: str = "1y") -> PricePanel:
         """
-        Fetches historical stock data for a list of tickers and returns a formatted DataFrame.
+        Fetches historical stock data for a list of tickers and returns a price panel.
 
         Args:
             ticker_list (List[str]): A list of stock ticker symbols to fetch data for.
@@ -34,27 +45,21 @@ def us_stock_page() -> None:
                                     "6mo", "1y", "5y", "max".
 
         Returns:
-            pd.DataFrame:A DataFrame containing the historical closing prices of the
-                      specified tickers, with tickers as row indices and dates as columns.
+            PricePanel: A date x ticker panel of the specified tickers, shared across
+                        sessions. The underlying histories are cached per ticker with
+                        a market-hours TTL.
         """
-        df = pd.DataFrame()
-        for ticker in ticker_list:
-            try:
-                tkr = yf.Ticker(ticker)
-                hist = tkr.history(period=period)
-                if hist.empty:
-                    st.warning(f"No data for {ticker}, skipping...")
-                    continue
-                hist.index = hist.index.strftime("%d %B %Y")
-                hist = hist[["Close"]]
-                hist.columns = [ticker]
-                hist = hist.T
-                hist.index.name = "Name"
-                df = pd.concat([df, hist])
-            except Exception as e:
-                st.error(f"Error retrieving data for {ticker}: {e}")
-                pass
-        return df
+        try:
+            panel = get_price_panel(ticker_list, period)
+        except Exception as e:
+            st.error(f"Error retrieving data for {ticker_list}: {e}")
+            return PricePanel.from_histories({}, [])
+
+        available = set(panel.available_tickers)
+        for ticker in panel.tickers:
+            if ticker not in available:
+                st.warning(f"No data for {ticker}, skipping...")
+        return panel
 
     with tab1:
         st.markdown("## :chart_with_upwards_trend: Chart")
@@ -101,83 +106,141 @@ def us_stock_page() -> None:
                 "TSM",
             ]
 
-        df = get_stock_data(ticker_list, period)
+        if not st.session_state.get("watchlist_recorded"):
+            # クッキーのウォッチリストを、先読みする人気のティッカーとして記録する
+            get_popularity_tracker().record(ticker_list, weight=WATCHLIST_WEIGHT)
+            st.session_state["watchlist_recorded"] = True
+
+        panel = get_stock_data(ticker_list, period)
+        available = panel.available_tickers
+        close = panel.frame()
 
         companies = st.multiselect(
             "Company Selection",
-            list(df.index),
-            ticker_list[:5],
+            available,
+            [ticker for ticker in ticker_list[:5] if ticker in available],
         )
         if not companies:
             st.error("一社は選択してください。")
         else:
-            data = df.loc[companies]
-            st.write("##### StockPrice(USD)", data)
-            df = df.T.reset_index()
+            st.write("##### StockPrice(USD)", close[companies])
             fig1 = make_subplots(rows=1, cols=1)
+            chart_df = close[date_range_component(close.index, key="us_chart_range")]
 
         ymin, ymax = st.slider(":chart_with_upwards_trend: Scale ", 0, 3000, (0, 500))
 
-        for company in companies:
-            fig1.add_trace(
-                go.Scatter(x=df["Date"], y=df[company], name=f"{company}"), row=1, col=1
-            )
-            fig1.update_yaxes(
-                title_text="StockPrice [$]",
-                title_font={"size": 20},
-                title_standoff=0,
-                range=[ymin, ymax],
-                row=1,
-                col=1,
-            )
-
-            fig1.update_layout(height=700, width=950)
-            fig1.update_layout(
-                hovermode="x",  # hervermode: x 複数参照、 closest　一番近い点
-                legend=dict(
-                    xanchor="left",
-                    yanchor="top",
-                    x=0.1,
-                    y=1.1,
-                    orientation="h",
-                    bgcolor="white",
-                    bordercolor="grey",
-                    borderwidth=1,
-                ),
-            )
+        with span("figure_build", page="us_stock_page"):
+            for company in companies:
+                # 横幅に合わせて点数を間引いてから描画する
+                x, y = downsample_series(
+                    chart_df.index, chart_df[company], point_budget(950)
+                )
+                fig1.add_trace(go.Scatter(x=x, y=y, name=f"{company}"), row=1, col=1)
+                fig1.update_yaxes(
+                    title_text="StockPrice [$]",
+                    title_font={"size": 20},
+                    title_standoff=0,
+                    range=[ymin, ymax],
+                    row=1,
+                    col=1,
+                )
+
+                fig1.update_layout(height=700, width=950)
+                fig1.update_layout(
+                    hovermode="x",  # hervermode: x 複数参照、 closest　一番近い点
+                    legend=dict(
+                        xanchor="left",
+                        yanchor="top",
+                        x=0.1,
+                        y=1.1,
+                        orientation="h",
+                        bgcolor="white",
+                        bordercolor="grey",
+                        borderwidth=1,
+                    ),
+                )
         st.plotly_chart(fig1, use_container_width=True)
 
+        if companies:
+            st.markdown("## :bar_chart: Volatility")
+            st.caption("選択した銘柄の1週間・1か月・1年間の変化")
+            display_volatility_dashboard(companies)
+
+            st.markdown("## :link: Correlation")
+            st.caption("選択した銘柄の日次対数リターンの相関・共分散")
+            correlation_component(companies, period, key="us_correlation")
+
+            with st.expander(
+                "ウォッチリストの株価をダウンロード", icon=":material/download:"
+            ):
+                st.caption("Date・Ticker・OHLCV の縦長の形式で保存されます。")
+                export_component(
+                    content_digest=panel.digest(),
+                    build=lambda fmt: export_panel(
+                        panel, fmt, f"{date.today():%Y%m%d}_watchlist_{period}"
+                    ),
+                    formats={
+                        "csv": "CSV",
+                        "csv.gz": "CSV (gzip)",
+                        "parquet": "Parquet",
+                    },
+                    key="us_watchlist",
+                )
+
         # set-cookie
         controller.set("stock_price_period", period)
 
     with tab2:
         if st.session_state["authentication_status"] == True:
             st.info("secret page")
-            predict_df = get_stock_data(ticker_list, period)
+            predict_panel = get_stock_data(ticker_list, period)
 
             st.write("#### choice target")
             predict_taeget_companies = st.selectbox(
                 "Company Selection for predict",
-                list(predict_df.index),
+                predict_panel.available_tickers,
             )
-            predict_cols = ["Date", predict_taeget_companies]
-            predict_df = df[predict_cols]
             # prophet用にcolum名を変更
-            predict_df = predict_df.reset_index().rename(
-                columns={"Date": "ds", predict_taeget_companies: "y"}
+            predict_df = to_prophet_frame(
+                predict_panel.dates, predict_panel.series(predict_taeget_companies)
             )
             st.table(predict_df.head())
 
-            st.write("#### Prophetによる予測結果")
-            # Prophetによる予測
-            model = Prophet()
-            model.fit(predict_df)
-
-            # 学習データに基づいて未来を予測
-            future = model.make_future_dataframe(periods=60)
-            forecast = model.predict(future)
-            fig = plot_plotly(model, forecast)
-            st.plotly_chart(fig)
+            engine = st.radio(
+                "予測エンジン",
+                list(ENGINES),
+                format_func=lambda name: ENGINES[name].label,
+                horizontal=True,
+                key="us_single_forecast_engine",
+            )
+            st.write(f"#### {ENGINES[engine].label}による予測結果")
+            if engine == "prophet":
+                # Prophetによる予測 (同じ銘柄・データ・期間のジョブは再実行されない)
+                job_id = submit_forecast(
+                    predict_taeget_companies, predict_df, periods=60
+                )
+                st.session_state["us_forecast_job_id"] = job_id
+
+                result = forecast_job_component(job_id)
+                if result is not None:
+                    # prophet は読み込みが重いため、予測結果を描画するときに読み込む
+                    from prophet.plot import plot_plotly
+
+                    with span("figure_build", page="us_stock_page", chart="forecast"):
+                        fig = plot_plotly(result.model, result.forecast)
+                    st.plotly_chart(fig)
+            else:
+                # 高速エンジンは再実行のたびにその場で予測する (数ミリ秒)
+                forecast = get_forecast_engine(engine).forecast(
+                    predict_df, periods=60, ticker=predict_taeget_companies
+                )
+                with span("figure_build", page="us_stock_page", chart="forecast"):
+                    fig = forecast_figure(predict_df, forecast)
+                st.plotly_chart(fig)
+
+            st.write("#### ウォッチリストの一括予測")
+            st.caption("全銘柄を並列に予測し、60日後の予測リターンの高い順に並べます。")
+            forecast_batch_component(ticker_list, period, key="us_forecast")
 
         else:
             st.info(
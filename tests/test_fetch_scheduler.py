@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from services.fetch_scheduler import FetchScheduler, Priority
+
+
+@pytest.fixture
+def scheduler():
+    # ワーカーを1つにして、実行の順序を決まったものにする
+    return FetchScheduler(max_workers=1, rate=1000.0, burst=1000.0)
+
+
+@pytest.fixture
+def blocker(scheduler):
+    """唯一のワーカーを、release されるまで止めておくジョブを投入する"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def block(keys):
+        started.set()
+        release.wait(10)
+        return {key: key for key in keys}
+
+    scheduler.submit_batch(["blocker"], block)
+    assert started.wait(10)
+    yield release
+    release.set()
+
+
+def _wait_until(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_concurrent_run_batch_fetches_a_key_once(scheduler, blocker):
+    fetched = []
+
+    def fetch(keys):
+        fetched.extend(keys)
+        return {key: f"value-{key}" for key in keys}
+
+    results = {}
+
+    def run(name, keys):
+        results[name] = scheduler.run_batch(keys, fetch)
+
+    threads = [
+        threading.Thread(target=run, args=("a", ["shared", "a_only"])),
+        threading.Thread(target=run, args=("b", ["shared", "b_only"])),
+    ]
+    for thread in threads:
+        thread.start()
+    # blocker・shared・a_only・b_only が待機中になるまで待つ
+    _wait_until(lambda: scheduler.pending() == 4)
+    blocker.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert sorted(fetched) == ["a_only", "b_only", "shared"]
+    assert results["a"] == {"shared": "value-shared", "a_only": "value-a_only"}
+    assert results["b"] == {"shared": "value-shared", "b_only": "value-b_only"}
+
+
+def test_interactive_join_boosts_a_queued_prefetch(scheduler, blocker):
+    order = []
+
+    def fetch(keys):
+        order.extend(keys)
+        return {key: key for key in keys}
+
+    scheduler.submit_batch(["prefetch_a"], fetch, Priority.PREFETCH)
+    scheduler.submit_batch(["prefetch_b"], fetch, Priority.PREFETCH)
+    futures = scheduler.submit_batch(["prefetch_b"], fetch, Priority.INTERACTIVE)
+    blocker.set()
+
+    assert futures["prefetch_b"].result(10) == "prefetch_b"
+    scheduler._queue.join()
+    # 合流したジョブが先に、1度だけ実行される
+    assert order == ["prefetch_b", "prefetch_a"]
+    assert scheduler.pending() == 0
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.market_data import MarketDataProvider, slice_period
+from services.price_store import ADJUSTMENT_RTOL, PriceStore
+
+
+def make_history(days: int, close: float = 100.0) -> pd.DataFrame:
+    dates = pd.bdate_range("2024-01-02", periods=days, tz="America/New_York")
+    closes = close + np.arange(days, dtype=float)
+    return pd.DataFrame(
+        {
+            "Open": closes,
+            "High": closes + 1,
+            "Low": closes - 1,
+            "Close": closes,
+            "Volume": np.full(days, 1000.0),
+        },
+        index=pd.DatetimeIndex(dates, name="Date"),
+    )
+
+
+class StubProvider(MarketDataProvider):
+    """histories の足を period / start で切り出して返し、一括取得の呼び出しを記録する"""
+
+    def __init__(self, histories):
+        self.histories = histories
+        self.calls = []
+
+    def history(self, ticker, **kwargs):
+        hist = self.histories.get(ticker, pd.DataFrame())
+        if hist.empty:
+            return hist
+        if "start" in kwargs:
+            return hist[hist.index >= pd.Timestamp(kwargs["start"], tz=hist.index.tz)]
+        return slice_period(hist, kwargs.get("period", "1mo"))
+
+    def bulk_history(self, tickers, **kwargs):
+        self.calls.append((sorted(tickers), kwargs))
+        return super().bulk_history(tickers, **kwargs)
+
+
+@pytest.fixture
+def store(tmp_path):
+    provider = StubProvider({"AAA": make_history(30), "BBB": make_history(30, 50.0)})
+    store = PriceStore(store_dir=str(tmp_path), provider=provider)
+    store.get_histories(["AAA", "BBB"], "max")
+    provider.calls.clear()
+    return store
+
+
+def _next_bar(hist: pd.DataFrame) -> pd.DataFrame:
+    """hist の最終足の翌営業日の足を追加する"""
+    bar = hist.iloc[[-1]].copy()
+    bar.index = pd.DatetimeIndex(
+        [hist.index[-1] + pd.offsets.BDay(1)], name=hist.index.name
+    )
+    bar["Close"] += 1
+    return pd.concat([hist, bar])
+
+
+def test_delta_appends_only_new_bars(store):
+    provider = store.provider
+    for ticker in ("AAA", "BBB"):
+        provider.histories[ticker] = _next_bar(provider.histories[ticker])
+
+    histories = store.get_histories(["AAA", "BBB"], "max")
+
+    # 最終足の1つ前の日から差分だけを1回で取得する
+    start = provider.histories["AAA"].index[-3].strftime("%Y-%m-%d")
+    assert provider.calls == [(["AAA", "BBB"], {"start": start})]
+    for ticker in ("AAA", "BBB"):
+        pd.testing.assert_frame_equal(
+            histories[ticker], provider.histories[ticker], check_freq=False
+        )
+
+
+def test_readjusted_history_refetches_the_stored_range(store):
+    provider = store.provider
+    # 配当で、新しい足より前の足がすべて調整し直された
+    adjusted = _next_bar(provider.histories["AAA"])
+    adjusted.iloc[:-1, adjusted.columns.get_loc("Close")] *= 0.98
+    provider.histories["AAA"] = adjusted
+    provider.histories["BBB"] = _next_bar(provider.histories["BBB"])
+
+    histories = store.get_histories(["AAA", "BBB"], "max")
+
+    assert provider.calls[1:] == [(["AAA"], {"period": "max"})]
+    # 継ぎ目でずれず、調整後の足で置き換わる
+    pd.testing.assert_frame_equal(histories["AAA"], adjusted, check_freq=False)
+    pd.testing.assert_frame_equal(store.load("AAA"), adjusted, check_freq=False)
+    pd.testing.assert_frame_equal(
+        histories["BBB"], provider.histories["BBB"], check_freq=False
+    )
+
+
+def test_small_close_changes_are_not_readjustments(store):
+    provider = store.provider
+    hist = _next_bar(provider.histories["AAA"])
+    hist.iloc[-3, hist.columns.get_loc("Close")] *= 1 + ADJUSTMENT_RTOL / 10
+    provider.histories["AAA"] = hist
+
+    store.get_histories(["AAA"], "max")
+
+    assert len(provider.calls) == 1
@@ -0,0 +1,119 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import select
+
+import database.database as database
+import services.submit_form as submit_form
+from services.submit_form import (
+    ContactOutbox,
+    ContactSendError,
+    submit_contact_form_data,
+)
+
+
+class StubContactServer(ThreadingHTTPServer):
+    """responses の (ステータス, メッセージ) を順に返す問い合わせ API のスタブ"""
+
+    def __init__(self, responses):
+        super().__init__(("127.0.0.1", 0), StubContactHandler)
+        self.responses = list(responses)
+        self.requests = []
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/contact"
+
+
+class StubContactHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        self.server.requests.append(self.rfile.read(length).decode())
+        status, message = self.server.responses.pop(0)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps({"message": message}).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(responses):
+        server = StubContactServer(responses)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def outbox_db(tmp_path, monkeypatch):
+    """テストごとに空の SQLite を使い、再送の待ち時間をなくす"""
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "db.sqlite3"))
+    monkeypatch.setattr(database, "DB_PATH", None)
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(submit_form, "retry_delay", lambda attempts: 0.0)
+    yield
+    database._engine.dispose()
+
+
+def _outbox_row(record_id: int):
+    table = database.contact_outbox_table
+    with database.get_engine().begin() as conn:
+        return conn.execute(select(table).where(table.c.id == record_id)).one()
+
+
+def test_outbox_retries_until_the_server_accepts(stub_server, outbox_db):
+    server = stub_server([(503, "busy"), (503, "busy"), (200, "success!")])
+    outbox = ContactOutbox(endpoint=server.endpoint)
+
+    record_id = outbox.enqueue("name", "name@example.com", "hello")
+    assert outbox.send_due() == 1
+
+    row = _outbox_row(record_id)
+    assert row.status == "sent"
+    assert row.attempts == 3
+    assert len(server.requests) == 3
+    assert "body=hello" in server.requests[-1]
+
+
+def test_outbox_gives_up_on_client_errors(stub_server, outbox_db):
+    server = stub_server([(400, "bad request")])
+    outbox = ContactOutbox(endpoint=server.endpoint)
+
+    record_id = outbox.enqueue("name", "name@example.com", "hello")
+    assert outbox.send_due() == 0
+
+    row = _outbox_row(record_id)
+    assert row.status == "failed"
+    assert row.attempts == 1
+    assert row.last_error == "HTTP 400"
+
+
+def test_submit_rejects_unexpected_message(stub_server):
+    server = stub_server([(200, "error")])
+
+    with pytest.raises(ContactSendError, match="Unexpected response"):
+        submit_contact_form_data(
+            "name", "name@example.com", "hello", endpoint=server.endpoint
+        )
+
+
+def test_submit_returns_response_on_success(stub_server):
+    server = stub_server([(200, "success!")])
+
+    response = submit_contact_form_data(
+        "name", "name@example.com", "hello", endpoint=server.endpoint
+    )
+    assert response == {"message": "success!"}